@@ -1,18 +1,109 @@
 from mesa import Agent, Model
-from mesa.time import SimultaneousActivation
-from mesa.space import MultiGrid
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.ModularVisualization import ModularServer
 import random
+from enum import IntEnum
+import numpy as np
 import networkx as nx  
+from cell_layers import LayeredMultiGrid
+from activity import ActivityScheduler
+
+
+# Códigos de la capa de celdas estáticas de la cuadrícula
+ROAD, BUILDING, PARKING, ROUNDABOUT, CLOSED = 0, 1, 2, 3, 4
+BOUNDARY_NAMES = {BUILDING: "building", PARKING: "parking", ROUNDABOUT: "roundabout", CLOSED: "closed"}
+REPAIR_LIMIT = 512  # Celdas que explora como máximo la búsqueda local de un desvío
+REPAIR_BACK = 8  # Celdas antes del cierre desde donde sale el desvío
+
+
+# Códigos enteros para el estado de los agentes (en lugar de cadenas)
+class Direction(IntEnum):
+    HORIZONTAL = 0
+    VERTICAL = 1
+
+
+class LightState(IntEnum):
+    RED = 0
+    GREEN = 1
+
+
+class Mood(IntEnum):
+    HAPPY = 0
+    ANGRY = 1
+
+
+NO_DIRECTION = 2  # Columna de green_for para "sin siguiente paso"
+
+
+class CompiledRoute:
+    """Ruta compilada en arreglos paralelos en lugar de una lista de tuplas.
+
+    nodes[i] es el id de la celda i (x * height + y), directions[i] la
+    dirección del paso i -> i + 1 y lights[i] el índice del semáforo en la
+    celda i (-1 si no hay). Avanzar es incrementar el cursor y revisar el
+    semáforo es un solo acceso a model.green_for.
+    """
+    __slots__ = ("nodes", "directions", "lights", "cursor", "height")
+
+    def __init__(self, model, route):
+        self.height = model.grid.height
+        xs = np.fromiter((pos[0] for pos in route), dtype=np.int32, count=len(route))
+        ys = np.fromiter((pos[1] for pos in route), dtype=np.int32, count=len(route))
+        self.nodes = xs * self.height + ys
+        self.directions = np.full(len(route), NO_DIRECTION, dtype=np.int8)
+        self.directions[:-1][np.diff(ys) != 0] = Direction.VERTICAL
+        self.directions[:-1][np.diff(xs) != 0] = Direction.HORIZONTAL
+        self.lights = model.light_index[xs, ys]
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __getitem__(self, i):
+        x, y = divmod(int(self.nodes[i]), self.height)
+        return (x, y)
+
+    def remaining(self):
+        """Número de celdas que faltan por recorrer."""
+        return len(self.nodes) - 1 - self.cursor
+
+    def next_pos(self):
+        return self[self.cursor + 1]
+
+    def rebind(self, template):
+        """Reusar los arreglos (de sólo lectura) de otra ruta compilada y volver al inicio."""
+        self.nodes = template.nodes
+        self.directions = template.directions
+        self.lights = template.lights
+        self.height = template.height
+        self.cursor = 0
+
+    def light_green(self, model):
+        """Si el semáforo de la celda actual deja pasar en la dirección del siguiente paso."""
+        return model.green_for[self.lights[self.cursor], self.directions[self.cursor]]
+
+
+def id_key(unique_id):
+    """Clave de orden de un unique_id: el número final se compara como entero ("car_2" < "car_10")."""
+    text = str(unique_id)
+    stem = text.rstrip("0123456789")
+    return (stem, int(text[len(stem):]) if len(stem) < len(text) else -1)
+
+
+def crosses(route, start, edges, size):
+    """Si la ruta, desde la celda start, usa alguna arista de edges (arreglo de códigos u * size + v)."""
+    nodes = route.nodes[start:].astype(np.int64)
+    return bool(np.isin(nodes[:-1] * size + nodes[1:], edges).any())
 
 
 class BoundaryAgent(Agent):
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
 
 
 class BusAgent(Agent):
+    __slots__ = ("route", "bus_stops", "current_stop_index", "stop_counter", "happiness")
+
     def __init__(self, unique_id, model, route, bus_stops):
         super().__init__(unique_id, model)
         self.route = route  
@@ -36,7 +127,7 @@ class BusAgent(Agent):
                 self.update_route()
 
         # Detenerse si está en un semáforo en rojo
-        if self.at_traffic_light() and not self.model.is_light_green(self.direction_to_next(), self.pos):
+        if not self.route.light_green(self.model):
             self.happiness -= 1  # Perder felicidad al esperar
             return  # No moverse si el semáforo está en rojo
 
@@ -49,62 +140,47 @@ class BusAgent(Agent):
         next_stop = self.bus_stops[self.current_stop_index]
         try:
             # Calcular la nueva ruta utilizando el grafo
-            self.route = nx.shortest_path(self.model.graph, source=current_pos, target=next_stop)
+            route = self.model.shortest_path(current_pos, next_stop)
         except nx.NetworkXNoPath:
             print(f"No hay camino entre {current_pos} y {next_stop}")
-            self.route = []
+            route = [current_pos]
+        self.route = CompiledRoute(self.model, route)
 
     def move_along_route(self):
         """Moverse a lo largo de la ruta calculada."""
-        if len(self.route) > 1:  # Asegurarse de que haya más pasos en la ruta
-            next_pos = self.route[1]  # Próxima posición en la ruta
-            if self.can_move(next_pos):
-                self.model.grid.move_agent(self, next_pos)
-                self.route.pop(0)  # Eliminar la posición actual de la ruta
-                self.happiness += 0.1  # Incremento leve de felicidad al moverse
+        if self.route.remaining() > 0:  # Asegurarse de que haya más pasos en la ruta
+            self.model.drive(self, 1)
         else:
             # Si la ruta está vacía, recalcular (por si hubo un problema)
             self.update_route()
 
-    def at_traffic_light(self):
-        return self.pos in self.model.traffic_light_positions
-
-    def direction_to_next(self):
-        if len(self.route) > 1:
-            next_pos = self.route[1]
-            dx = next_pos[0] - self.pos[0]
-            dy = next_pos[1] - self.pos[1]
-            if dx != 0:
-                return "horizontal"
-            elif dy != 0:
-                return "vertical"
-        return None
-
-    def can_move(self, next_pos):
-        if not self.model.grid.is_cell_empty(next_pos):
-            contents = self.model.grid.get_cell_list_contents([next_pos])
-            for obj in contents:
-                if isinstance(obj, BoundaryAgent):
-                    # Permitir moverse si es un estacionamiento
-                    if "parking" in obj.unique_id:
-                        return True
-                    return False  # No se puede mover a otros límites
-                if isinstance(obj, CarAgent) or isinstance(obj, AggressiveDriverAgent) or isinstance(obj, BusAgent):
-                    return False  # No se puede mover a celdas ocupadas por carros, conductores agresivos u otros autobuses
-        return True
+    def take(self, next_pos):
+        """Avanzar una celda de la ruta (la mueve TrafficModel.drive)."""
+        self.model.grid.move_agent(self, next_pos)
+        self.route.cursor += 1  # Avanzar el cursor de la ruta
+        self.happiness += 0.1  # Incremento leve de felicidad al moverse
 
 
 class AggressiveDriverAgent(Agent):
+    __slots__ = ("route", "happiness")
+
     def __init__(self, unique_id, model, route):
         super().__init__(unique_id, model)
-        self.route = route  # Ruta del conductor
-        self.current_step = 0  # Índice actual en la ruta
+        self.route = CompiledRoute(model, route)  # Ruta del conductor
         self.happiness = 100  # Felicidad inicial del conductor
 
+    @property
+    def current_step(self):
+        return self.route.cursor  # Índice actual en la ruta
+
     def step(self):
+        if self.route.remaining() <= 0 and self.route.lights[self.route.cursor] < 0:
+            self.model.schedule.sleep(self)  # Llegó y no hay semáforo: ya no hace nada
+            return
+
         # Comportamiento en semáforos: ignorar el 80% de las veces si están en rojo
-        if self.at_traffic_light() and not self.model.is_light_green(self.direction_to_next(), self.pos):
-            if random.random() < 0.8:  # Probabilidad del 80% de ignorar el semáforo
+        if not self.route.light_green(self.model):
+            if self.model.chance.random() < 0.8:  # Probabilidad del 80% de ignorar el semáforo
                 self.happiness += 1  # Felicidad por avanzar a pesar del semáforo
             else:
                 self.happiness -= 1  # Perder felicidad por respetar el semáforo
@@ -113,134 +189,114 @@ class AggressiveDriverAgent(Agent):
         # Moverse agresivamente a lo largo de la ruta
         self.move_aggressively()
 
-    def at_traffic_light(self):
-        """Verificar si el conductor está en un semáforo."""
-        return self.pos in self.model.traffic_light_positions
-
-    def direction_to_next(self):
-        if len(self.route) > 1:
-            next_pos = self.route[self.current_step + 1]
-            dx = next_pos[0] - self.pos[0]
-            dy = next_pos[1] - self.pos[1]
-            if dx != 0:
-                return "horizontal"
-            elif dy != 0:
-                return "vertical"
-        return None
-
     def move_aggressively(self):
         steps_to_take = 2
-        for _ in range(steps_to_take):
-            if self.current_step < len(self.route) - 1:
-                next_pos = self.route[self.current_step + 1]
-                if self.can_move(next_pos):
-                    self.model.grid.move_agent(self, next_pos)
-                    self.current_step += 1
-                    self.happiness -= 0.5  
-                else:
-                    break  # Detenerse si no puede moverse al siguiente nodo
-            else:
-                break  # Ruta completada
-
-    def can_move(self, next_pos):
-        if not self.model.grid.is_cell_empty(next_pos):
-            contents = self.model.grid.get_cell_list_contents([next_pos])
-            for obj in contents:
-                if isinstance(obj, BoundaryAgent):
-                    # Permitir moverse si es un estacionamiento
-                    if "parking" in obj.unique_id:
-                        return True
-                    return False  # No se puede mover a otros límites
-                if isinstance(obj, CarAgent) or isinstance(obj, AggressiveDriverAgent)  or isinstance(obj, BusAgent):
-                    return False  # No se puede mover a otras posiciones ocupadas por carros
-        return True
+        # Se detiene en la primera celda a la que no pueda entrar o al final de la ruta
+        self.model.drive(self, min(steps_to_take, self.route.remaining()))
+
+    def take(self, next_pos):
+        self.model.grid.move_agent(self, next_pos)
+        self.route.cursor += 1
+        self.happiness -= 0.5
 
 
 
 class CarAgent(Agent):
+    __slots__ = ("route", "_happiness", "_state", "parked_since")
+
     def __init__(self, unique_id, model, route):
         super().__init__(unique_id, model)
-        self.route = route  # List of positions that form the route
-        self.current_step = 0  # Current index in the route
-        self.happiness = 100  # Initial happiness (0-100 scale)
-        self.state = "happy"
-
-    def step(self):
-        if self.happiness > 80:
-            self.state = "happy"
-        elif self.happiness < 50:
-            self.state = "angry"
+        self.route = CompiledRoute(model, route)  # Positions that form the route
+        self._happiness = 100  # Initial happiness (0-100 scale)
+        self._state = Mood.HAPPY
+        self.parked_since = None  # Step at which it fell asleep at the end of its route
+
+    @property
+    def current_step(self):
+        return self.route.cursor  # Current index in the route
+
+    @property
+    def happiness(self):
+        self.catch_up()
+        return self._happiness
+
+    @happiness.setter
+    def happiness(self, value):
+        self._happiness = value
+
+    @property
+    def state(self):
+        self.catch_up()
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        self._state = value
+
+    def update_mood(self):
+        if self._happiness > 80:
+            self._state = Mood.HAPPY
+        elif self._happiness < 50:
+            self._state = Mood.ANGRY
 
         # Behavior based on state
-        if self.state == "happy":
-            self.happiness += 0.2  # Gain happiness slightly
-        elif self.state == "angry":
-            self.happiness -= 0.5  # Lose happiness more rapidly
-
-        # Move along the route one cell at a time
-        if self.current_step < len(self.route) - 1:
-            next_pos = self.route[self.current_step + 1]
+        if self._state == Mood.HAPPY:
+            self._happiness += 0.2  # Gain happiness slightly
+        elif self._state == Mood.ANGRY:
+            self._happiness -= 0.5  # Lose happiness more rapidly
+
+    def catch_up(self):
+        """Apply the mood updates of the steps slept while parked."""
+        if self.parked_since is None:
+            return
+        done = self.model.schedule.steps
+        for _ in range(done - self.parked_since):
+            self.update_mood()
+        self.parked_since = max(self.parked_since, done)
 
-            # Determine the direction
-            dir = self.direction(next_pos)
+    def step(self):
+        self.update_mood()
 
-            # Stop at red light
-            if self.at_traffic_light() and not self.model.is_light_green(dir, self.pos):
-                self.happiness -= 1 if self.state == "happy" else 2
+        # Move along the route one cell at a time
+        if self.route.remaining() > 0:
+            # Stop at red light (direction and light are precomputed in the route)
+            if not self.route.light_green(self.model):
+                self._happiness -= 1 if self._state == Mood.HAPPY else 2
                 return  # Stop if the light is red for this direction
 
             # Move to the next position if possible
-            if self.can_move(next_pos):
-                self.model.grid.move_agent(self, next_pos)
-                self.current_step += 1
-                self.happiness += 0.1
+            self.model.drive(self, 1)
+        elif self.model.demand is not None:
+            self.model.demand.arrive(self)  # Se retira al final del paso y vuelve al pool
         else:
-            # Optional: Remove agent or reset route
-            pass
-
-    def at_traffic_light(self):
-        return self.pos in self.model.traffic_light_positions
-
-    def direction(self, next_pos):
-        dx = next_pos[0] - self.pos[0]
-        dy = next_pos[1] - self.pos[1]
-        if dx > 0:
-            return "horizontal"
-        elif dx < 0:
-            return "horizontal"
-        elif dy > 0:
-            return "vertical"
-        elif dy < 0:
-            return "vertical"
-        else:
-            return None
+            # Parked for good: only the mood keeps changing, and catch_up()
+            # applies it when happiness or state is read
+            self.parked_since = self.model.schedule.steps + 1
+            self.model.schedule.sleep(self)
 
-    def can_move(self, next_pos):
-        # Check if next position is not a boundary or occupied
-        if not self.model.grid.is_cell_empty(next_pos):
-            contents = self.model.grid.get_cell_list_contents([next_pos])
-            for obj in contents:
-                if isinstance(obj, BoundaryAgent):
-                    # Allow movement if it's a parking lot
-                    if "parking" in obj.unique_id:
-                        return True
-                    return False  # Can't move into other boundaries
-                if isinstance(obj, CarAgent)  or isinstance(obj, BusAgent) or isinstance(obj, AggressiveDriverAgent) :
-                    return False  # Can't move into other cars
-        return True
+    def take(self, next_pos):
+        self.model.grid.move_agent(self, next_pos)
+        self.route.cursor += 1
+        self._happiness += 0.1
 
 
 class EmergencyVehicleAgent(Agent):
+    __slots__ = ("route", "happiness")
+
     def __init__(self, unique_id, model, route):
         super().__init__(unique_id, model)
-        self.route = route  # Ruta del vehículo de emergencia
-        self.current_step = 0  # Índice actual en la ruta
+        self.route = CompiledRoute(model, route)  # Ruta del vehículo de emergencia
         self.happiness = 100  # Felicidad inicial
 
+    @property
+    def current_step(self):
+        return self.route.cursor  # Índice actual en la ruta
+
     def step(self):
         # Verificar si se llegó al final de la ruta
-        if self.current_step >= len(self.route) - 1:
-            return  # No realizar ninguna acción si no hay más ruta
+        if self.route.remaining() <= 0:
+            self.model.schedule.sleep(self)  # No hay más ruta: no vuelve a hacer nada
+            return
 
         # Moverse agresivamente a lo largo de la ruta
         self.move_emergency()
@@ -248,53 +304,50 @@ class EmergencyVehicleAgent(Agent):
     def move_emergency(self):
         """Moverse a lo largo de la ruta, ignorando semáforos y límites."""
         step_size = 2  # Mayor velocidad para vehículos de emergencia
-        for _ in range(step_size):
-            if self.current_step < len(self.route) - 1:
-                next_pos = self.route[self.current_step + 1]
-                if self.can_move(next_pos):  # Verificar si puede moverse
-                    self.model.grid.move_agent(self, next_pos)
-                    self.current_step += 1
-                    self.happiness += 0.5  # Incrementar felicidad al avanzar
-                else:
-                    return  # Detenerse si no puede avanzar
-            else:
-                break  # Detener el movimiento si se llega al final de la ruta
-
-    def can_move(self, next_pos):
-        """Verificar si el vehículo de emergencia puede moverse a la siguiente posición."""
-        if not self.model.grid.is_cell_empty(next_pos):
-            contents = self.model.grid.get_cell_list_contents([next_pos])
-            for obj in contents:
-                if isinstance(obj, BoundaryAgent):
-                    # Permitir moverse si es un estacionamiento
-                    if "parking" in obj.unique_id:
-                        return True
-                    return False  # No moverse a otros límites
-                if isinstance(obj, CarAgent) or isinstance(obj, AggressiveDriverAgent) or isinstance(obj, BusAgent):
-                    return False  # No moverse a celdas ocupadas por carros, autobuses u otros conductores
-        return True
+        self.model.drive(self, min(step_size, self.route.remaining()))
+
+    def take(self, next_pos):
+        self.model.grid.move_agent(self, next_pos)
+        self.route.cursor += 1
+        self.happiness += 0.5  # Incrementar felicidad al avanzar
     
 
 # Traffic light agent class
 class TrafficLightAgent(Agent):
-    def __init__(self, unique_id, model, pos, orientation, smart=False):
+    __slots__ = ("state", "orientation", "smart", "light_interval", "step_count", "index", "hold")
+
+    def __init__(self, unique_id, model, pos, orientation, smart=False, index=None):
         super().__init__(unique_id, model)
         self.pos = pos
-        self.state = "red"
+        self.state = LightState.RED
         self.orientation = orientation
         self.smart = smart  # Indica si el semáforo es inteligente
         self.light_interval = model.light_interval
         self.step_count = 0
+        self.index = index  # Fila del semáforo en model.green_for
+        self.hold = None  # Verde reservado por GreenWave: (vehículo, ruta, índice en la ruta, desde)
 
     def turn_green(self):
-        self.state = "green"
+        self.state = LightState.GREEN
+        self.model.green_for[self.index, self.orientation] = True
 
     def turn_red(self):
-        self.state = "red"
+        self.state = LightState.RED
+        self.model.green_for[self.index, self.orientation] = False
 
     def step(self):
-        self.step_count += 1
-        if self.smart:
+        # Los semáforos existen desde el tick 0, así que su cuenta es la del
+        # modelo aunque hayan dormido entre cambios de fase
+        self.step_count = self.model.step_count
+        if self.hold is not None and self.model.green_wave.holding(self):
+            return  # Verde reservado para un vehículo de emergencia
+        # Con GreenWave los inteligentes ya no buscan ambulancias en cada tick
+        scan = self.smart and self.model.green_wave is None
+        if not scan:
+            # Dormir hasta el próximo cambio de fase
+            next_change = (self.step_count // self.light_interval + 1) * self.light_interval
+            self.model.schedule.sleep(self, next_change - self.step_count - 1)
+        if scan:
             emergency_nearby = False
             for emergency_vehicle in self.model.emergency_vehicles:
                 dist = abs(emergency_vehicle.pos[0] - self.pos[0]) + abs(emergency_vehicle.pos[1] - self.pos[1])
@@ -306,24 +359,311 @@ class TrafficLightAgent(Agent):
                 return
         # Comportamiento normal del semáforo
         if self.step_count % (2 * self.light_interval) < self.light_interval:
-            if self.orientation == "horizontal":
+            if self.orientation == Direction.HORIZONTAL:
                 self.turn_green()
             else:
                 self.turn_red()
         else:
-            if self.orientation == "vertical":
+            if self.orientation == Direction.VERTICAL:
                 self.turn_green()
             else:
                 self.turn_red()
 
+class SimultaneousMoves:
+    """Actualización en dos fases de los vehículos (TrafficModel con update="simultaneous").
+
+    Durante schedule.step() cada vehículo sólo propone cuántas celdas de su
+    ruta quiere avanzar. resolve() mueve después a todos a la vez, celda por
+    celda: las propuestas se comparan con una copia de la ocupación tomada
+    antes de mover a nadie, y si varios vehículos quieren la misma celda de
+    calle gana el de mayor prioridad (emergencia > autobús > auto); el
+    empate se rompe por unique_id (con id_key: "car_2" antes que "car_10"). Los semáforos se actualizan antes que
+    cualquier propuesta (TrafficModel.step), así que el resultado no depende
+    del orden del schedule.
+    """
+
+    PRIORITY = {EmergencyVehicleAgent: 3, BusAgent: 2, CarAgent: 1, AggressiveDriverAgent: 1}
+
+    def __init__(self, model):
+        self.model = model
+        self.vehicles = []
+        self.wanted = []
+
+    def propose(self, vehicle, cells):
+        self.vehicles.append(vehicle)
+        self.wanted.append(cells)
+
+    def resolve(self):
+        """Resolver los conflictos y aplicar todas las propuestas del tick."""
+        vehicles = self.vehicles
+        if not vehicles:
+            return
+        model = self.model
+        layer = model.grid.layer.ravel()
+        priority = np.array([self.PRIORITY[type(v)] for v in vehicles])
+        rank = np.empty(len(vehicles), dtype=np.int64)
+        rank[sorted(range(len(vehicles)), key=lambda i: id_key(vehicles[i].unique_id))] = np.arange(len(vehicles))
+        blocks = np.array([self.PRIORITY[type(v)] < 3 for v in vehicles])  # Las ambulancias no bloquean
+        occupied = model.occupancy()  # Copia de la ocupación; se actualiza tras cada celda de avance
+        left = np.array(self.wanted)
+        while True:
+            moving = np.flatnonzero(left > 0)
+            if len(moving) == 0:
+                break
+            routes = [vehicles[i].route for i in moving]
+            sources = np.array([route.nodes[route.cursor] for route in routes])
+            targets = np.array([route.nodes[route.cursor + 1] for route in routes])
+            kind = layer[targets]
+            ok = (kind == PARKING) | ((kind == ROAD) & (occupied[targets] == 0))
+            if model.closed_edges:
+                ok &= ~np.isin(sources.astype(np.int64) * len(layer) + targets, model.closed_edge_codes())
+            # Conflictos en calle: por celda, prioridad descendente y luego rango
+            road = np.flatnonzero(ok & (kind == ROAD))
+            order = road[np.lexsort((rank[moving[road]], -priority[moving[road]], targets[road]))]
+            repeated = np.zeros(len(order), dtype=bool)
+            repeated[1:] = targets[order[1:]] == targets[order[:-1]]
+            ok[order[repeated]] = False
+            for k in np.flatnonzero(ok):
+                vehicle = vehicles[moving[k]]
+                vehicle.take(vehicle.route.next_pos())
+            moved = ok & blocks[moving]
+            np.subtract.at(occupied, sources[moved], 1)
+            np.add.at(occupied, targets[moved], 1)
+            left[moving[ok]] -= 1
+            left[moving[~ok]] = 0  # Quien no pudo avanzar se queda el resto del tick
+        self.vehicles = []
+        self.wanted = []
+
+
+class GreenWave:
+    """Ola verde para vehículos de emergencia (TrafficModel.enable_preemption).
+
+    Cada vehículo registra su ruta compilada y, por cada semáforo de la ruta,
+    se agenda un evento `lead` ticks antes de su hora estimada de llegada
+    (ETA, a `speed` celdas por tick). Al llegar el evento se recalcula la
+    ETA con la posición real: si el vehículo se retrasó el evento se
+    pospone; si no, el semáforo da verde en la dirección del vehículo para
+    que avancen los autos formados delante y lo mantiene hasta que el
+    vehículo cruza (o max_hold ticks). El plan cuesta O(semáforos de la
+    ruta) por vehículo y cada tick sólo se atienden sus eventos, sin medir
+    distancias a todas las ambulancias.
+    """
+
+    def __init__(self, model, lead=4, max_hold=20, speed=2):
+        self.model = model
+        self.lead = lead
+        self.max_hold = max_hold
+        self.speed = speed
+        self.calendar = {}  # Tick -> [(vehículo, ruta, índice del semáforo en la ruta)]
+        self.lights = {light.index: light for light in model.traffic_lights.values()}
+        self.preemptions = 0  # Verdes dados a vehículos de emergencia
+
+    def register(self, vehicle):
+        """Agendar los semáforos que faltan en la ruta actual de vehicle."""
+        route = vehicle.route
+        now = self.model.step_count
+        stops = np.flatnonzero((route.lights >= 0) & (route.directions != NO_DIRECTION))
+        for i in stops[stops > route.cursor].tolist():
+            eta = -(-(i - route.cursor) // self.speed)
+            self.calendar.setdefault(now + max(eta - self.lead, 1), []).append((vehicle, route, i))
+
+    def step(self):
+        """Atender los eventos de este tick (antes de mover a los agentes)."""
+        tick = self.model.step_count
+        for vehicle, route, i in self.calendar.pop(tick, ()):
+            if vehicle.route is not route or vehicle.pos is None or route.cursor >= i:
+                continue  # Cambió de ruta, salió del modelo o ya cruzó
+            eta = -(-(i - route.cursor) // self.speed)
+            light = self.lights[int(route.lights[i])]
+            if eta > self.lead or light.hold is not None:
+                # Retrasado, o el semáforo lo tiene otro vehículo: volver a revisar después
+                later = tick + max(eta - self.lead, 1)
+                self.calendar.setdefault(later, []).append((vehicle, route, i))
+                continue
+            light.hold = (vehicle, route, i, tick)
+            direction = int(route.directions[i])
+            green = self.model.green_for[light.index]
+            green[:NO_DIRECTION] = False
+            green[direction] = True
+            light.state = LightState.GREEN if direction == light.orientation else LightState.RED
+            self.model.schedule.wake(light)
+            self.preemptions += 1
+
+    def holding(self, light):
+        """Si light sigue reservado; al terminar lo libera para que vuelva a su fase normal."""
+        vehicle, route, i, since = light.hold
+        if (vehicle.route is route and vehicle.pos is not None and route.cursor <= i
+                and self.model.step_count - since < self.max_hold):
+            return True
+        light.hold = None
+        self.model.green_for[light.index, :NO_DIRECTION] = False
+        return False
+
+
 # Main traffic model
+class DemandGenerator:
+    """Demanda continua origen-destino entre estacionamientos.
+
+    Cada tick genera en promedio `rate` autos (Poisson) con origen y destino
+    aleatorios. Los autos que llegan se retiran de la cuadrícula y del
+    schedule y se guardan en un pool; los siguientes viajes reutilizan esos
+    objetos en lugar de crear nuevos agentes de Mesa. Las rutas compiladas de
+    cada par origen-destino se calculan una vez y sus arreglos se comparten.
+
+    Con las reglas del modelo (una celda por vehículo, calles de doble
+    sentido) pueden formarse bloqueos; un auto de demanda que no avanza en
+    max_wait ticks se retira igual que si hubiera llegado (como el
+    "teleport" de SUMO) y se cuenta en `teleported`.
+    """
+
+    def __init__(self, model, rate, lots, max_active=None, max_wait=50):
+        self.model = model
+        self.rate = rate
+        self.lots = [lot for lot in lots if lot in model.graph]
+        self.max_active = max_active  # Tope de autos de demanda circulando a la vez
+        self.max_wait = max_wait
+        self.progress = {}  # Auto de demanda -> (cursor, tick en que avanzó por última vez)
+        self.rng = np.random.default_rng(model.random.getrandbits(64))
+        self.routes = {}  # (origen, destino) -> CompiledRoute plantilla, o None si no hay camino
+        self.provisional = set()  # Pares calculados con algún cierre activo (ver reopened)
+        self.pool = []  # Autos retirados listos para reutilizarse
+        self.arrived = []  # Autos que llegaron en este tick
+        self.active = 0
+        self.created = 0  # Agentes de Mesa creados (no crece en estado estable)
+        self.spawned = 0
+        self.retired = 0
+        self.teleported = 0
+
+    def route(self, origin, destination):
+        key = (origin, destination)
+        if key not in self.routes:
+            try:
+                path = self.model.shortest_path(origin, destination)
+                self.routes[key] = CompiledRoute(self.model, path)
+            except nx.NetworkXNoPath:
+                self.routes[key] = None
+            if self.model.closed_cells or self.model.closed_edges:
+                self.provisional.add(key)
+        return self.routes[key]
+
+    def invalidate(self, edges):
+        """Olvidar las plantillas que pasan por alguna de las aristas (códigos u * celdas + v) cerradas."""
+        size = self.model.grid.width * self.model.grid.height
+        for key, template in list(self.routes.items()):
+            if template is not None and crosses(template, 0, edges, size):
+                del self.routes[key]
+
+    def reopened(self):
+        """Tras reabrir algo: recalcular los pares sin camino y los desvíos calculados durante los cierres."""
+        for key in self.provisional:
+            self.routes.pop(key, None)
+        self.provisional.clear()
+        for key in [key for key, template in self.routes.items() if template is None]:
+            del self.routes[key]
+
+    def arrive(self, car):
+        self.arrived.append(car)
+
+    def retire(self, car, arrived=True):
+        if self.model.metrics is not None:
+            # Llegó en el tick anterior: arrive() se llama un paso después de la última celda
+            self.model.metrics.end_trip(car, self.model.step_count - 1 if arrived else None)
+        self.model.grid.remove_agent(car)
+        self.model.schedule.remove(car)
+        self.model.stranded.discard(car)
+        self.pool.append(car)
+        self.retired += 1
+        if self.progress.pop(car, None) is not None:
+            self.active -= 1
+
+    def spawn(self):
+        """Crear (o sacar del pool) un auto con un viaje aleatorio; False si no hay ruta."""
+        n = len(self.lots)
+        i = int(self.rng.integers(n))
+        j = int(self.rng.integers(n - 1))
+        origin, destination = self.lots[i], self.lots[j + (j >= i)]
+        template = self.route(origin, destination)
+        if template is None or self.model.grid.agents_at(origin) or self.model.grid.layer[origin] == CLOSED:
+            return False  # Sin camino, o el estacionamiento de origen aún está ocupado (o cerrado)
+        if self.pool:
+            car = self.pool.pop()
+            car.happiness = 100
+            car.state = Mood.HAPPY
+        else:
+            car = CarAgent(f"demand_{self.created}", self.model, [])
+            self.created += 1
+        car.route.rebind(template)
+        self.model.grid.place_agent(car, origin)
+        self.model.schedule.add(car)
+        if self.model.metrics is not None:
+            self.model.metrics.register(car)
+        for listener in self.model.vehicle_listeners:
+            listener(car)
+        self.spawned += 1
+        self.progress[car] = (0, self.model.step_count)
+        self.active += 1
+        return True
+
+    def step(self):
+        """Retirar los autos que llegaron y generar la demanda de este tick."""
+        if self.model.moves is not None:
+            # En modo simultáneo el pool no debe depender del orden del schedule
+            self.arrived.sort(key=lambda car: id_key(car.unique_id))
+        for car in self.arrived:
+            self.retire(car)
+        self.arrived.clear()
+        tick = self.model.step_count
+        for car, (cursor, since) in list(self.progress.items()):
+            if car.route.cursor != cursor:
+                self.progress[car] = (car.route.cursor, tick)
+            elif tick - since > self.max_wait:
+                self.retire(car, arrived=False)
+                self.teleported += 1
+        if len(self.lots) < 2:
+            return
+        for _ in range(int(self.rng.poisson(self.rate))):
+            if self.max_active is not None and self.active >= self.max_active:
+                break
+            self.spawn()
+
+
 class TrafficModel(Model):
-    def __init__(self, M, N, light_interval):
-        self.grid = MultiGrid(M, N, torus=False)  # Set torus to False to prevent wrapping
-        self.schedule = SimultaneousActivation(self)
+    def __init__(self, M, N, light_interval, demand_rate=0.0, max_active=None, seed=None,
+                 update="sequential", city=None):
+        # city: mapa generado (generators.generate_city); reemplaza al mapa
+        # dibujado a mano y sus dimensiones a M y N
+        if city is not None:
+            M, N = city.width, city.height
+        # Set torus to False to prevent wrapping. Edificios, estacionamientos y
+        # la rotonda viven en la capa uint8 de la cuadrícula, no como agentes
+        self.grid = LayeredMultiGrid(M, N, False, self.make_boundary)
+        self.schedule = ActivityScheduler(self)  # Sólo avanza los agentes activos
         self.running = True
         self.light_interval = light_interval
         self.step_count = 0
+        # Azar de los destinos iniciales y de los conductores agresivos: con seed
+        # sale de self.random (corridas reproducibles); sin seed se conserva el
+        # módulo random global de siempre
+        if seed is not None:
+            self.reset_randomizer(seed)  # También si seed llega por posición
+        self.chance = self.random if seed is not None else random
+        self.demand = None  # DemandGenerator, sólo si demand_rate > 0
+        self.router = None  # Ver build_router()
+        self.metrics = None  # Ver enable_metrics()
+        # Funciones llamadas con cada vehículo que entra después de construir el
+        # modelo (autos de demanda, nuevos o del pool); ver traffic_frames
+        self.vehicle_listeners = []
+        self.green_wave = None  # Ver enable_preemption()
+        # Cierres en tiempo de ejecución (ver close_cell / close_edge)
+        self.closed_cells = {}  # Celda -> (código anterior de la capa, aristas de entrada quitadas)
+        self.closed_edges = set()  # Aristas (u, v) cerradas una por una
+        self.stranded = set()  # Vehículos cuya ruta cruza un cierre y no tienen desvío
+        self.rerouted = 0
+        # "sequential": cada vehículo se mueve en su turno del schedule.
+        # "simultaneous": todos proponen y se mueven a la vez (SimultaneousMoves)
+        if update not in ("sequential", "simultaneous"):
+            raise ValueError(f"unknown update {update!r}")
+        self.moves = SimultaneousMoves(self) if update == "simultaneous" else None
 
         # Crear el grafo
         self.graph = nx.DiGraph()
@@ -420,6 +760,8 @@ class TrafficModel(Model):
             **{(x, 16): "west" for x in range(20, 15, -1)},
 
         }
+        if city is not None:
+            self.one_way_streets = city.one_way_streets()
 
 
         # Definir restricciones de giro
@@ -443,28 +785,42 @@ class TrafficModel(Model):
             (6, 21), (7, 21),  
             (8, 22), (8, 23),  
         ]
+        if city is not None:
+            self.traffic_light_positions = [tuple(pos) for pos in city.lights.tolist()]
         self.traffic_lights = {}
+        # light_index[x, y]: índice del semáforo en la celda (-1 si no hay).
+        # green_for[i, dirección]: si el semáforo i deja pasar en esa
+        # dirección; la última fila (índice -1) es "sin semáforo", siempre verde
+        self.light_index = np.full((M, N), -1, dtype=np.int16)
+        self.green_for = np.zeros((len(self.traffic_light_positions) + 1, 3), dtype=bool)
+        self.green_for[-1] = True
 
         # Crear semáforos
         for i, pos in enumerate(self.traffic_light_positions):
             # Definir la orientación basada en posiciones específicas
-            if pos in [
+            if city is not None:
+                orientation = Direction(int(city.light_orientation[i]))
+            elif pos in [
                 (5, 0), (5, 1), (2, 4), (2, 5), (8, 22), (8, 23),
                 (17, 8), (17, 9), (8, 17), (8, 18)
             ]:
-                orientation = "horizontal"
+                orientation = Direction.HORIZONTAL
             elif pos in [
                 (6, 2), (7, 2), (0, 6), (1, 6), (18, 7), (19, 7),
                 (6, 21), (7, 21), (6, 16), (7, 16)
             ]:
-                orientation = "vertical"
+                orientation = Direction.VERTICAL
             else:
-                orientation = "horizontal"  # Orientación por defecto
+                orientation = Direction.HORIZONTAL  # Orientación por defecto
 
             
-            smart = pos in [(18, 7), (19, 7), (17, 8), (17, 9)]
+            if city is not None:
+                smart = bool(city.light_smart[i])
+            else:
+                smart = pos in [(18, 7), (19, 7), (17, 8), (17, 9)]
 
-            light = TrafficLightAgent(f"light_{i}", self, pos, orientation, smart=smart)
+            light = TrafficLightAgent(f"light_{i}", self, pos, orientation, smart=smart, index=i)
+            self.light_index[pos] = i
             self.traffic_lights[pos] = light
             self.grid.place_agent(light, pos)
             self.schedule.add(light)
@@ -525,10 +881,11 @@ class TrafficModel(Model):
             [(x, y) for x in range(21, 22) for y in range(12, 16 )],
             [(x, y) for x in range(20, 21 ) for y in range(12, 15)],
         ]
+        if city is not None:
+            building_positions = [city.cells(BUILDING)]
         for idx, positions in enumerate(building_positions):
             for pos in positions:
-                boundary = BoundaryAgent(f"building_{idx}_{pos[0]}_{pos[1]}", self)
-                self.grid.place_agent(boundary, pos)
+                self.grid.layer[pos] = BUILDING
                 # Remover nodos correspondientes a edificios del grafo
                 if pos in self.graph:
                     self.graph.remove_node(pos)
@@ -539,9 +896,11 @@ class TrafficModel(Model):
             (9,2), (10, 19), (10,12),  (10,7), (17, 21), (17,6),
             (17, 4), (20,18), (20,15), (20,4)
         ]
+        if city is not None:
+            parking_lots = [tuple(lot) for lot in city.parking.tolist()]
         for idx, lot in enumerate(parking_lots):
-            boundary = BoundaryAgent(f"parking_{idx}_{lot[0]}_{lot[1]}", self)
-            self.grid.place_agent(boundary, lot)
+            self.grid.layer[lot] = PARKING
+        self.parking_lots = parking_lots
             
 
         # Rotonda (área marrón en el centro)
@@ -549,9 +908,10 @@ class TrafficModel(Model):
             (14, 10), (13,10),
             (14,9), (13,9),
         ]
+        if city is not None:
+            roundabout_positions = city.cells(ROUNDABOUT)
         for idx, pos in enumerate(roundabout_positions):
-            boundary = BoundaryAgent(f"roundabout_{idx}_{pos[0]}_{pos[1]}", self)
-            self.grid.place_agent(boundary, pos)
+            self.grid.layer[pos] = ROUNDABOUT
             # Remover nodos correspondientes a la rotonda del grafo
             if pos in self.graph:
                 self.graph.remove_node(pos)
@@ -564,9 +924,11 @@ class TrafficModel(Model):
         car_start_positions = [
             (18,10), (15,2)
         ]
+        if city is not None:
+            car_start_positions = [tuple(pos) for pos in city.starts["car"].tolist()]
         for i, start_pos in enumerate(car_start_positions):
             # Seleccionar un destino aleatorio de los estacionamientos
-            destino = random.choice(parking_lots)
+            destino = self.chance.choice(parking_lots)
             
             # Asegurarte de que el destino sea válido (exista en el grafo)
             if destino in self.graph.nodes:
@@ -580,19 +942,23 @@ class TrafficModel(Model):
                     print(f"No hay camino entre {start_pos} y {destino}")
 
         bus_stops = [(15, 4), (15, 13), (8,8)]  # Ejemplo de paradas de autobuses
+        if city is not None:
+            bus_stops = [tuple(pos) for pos in city.bus_stops.tolist()]
 
         
         for i, start_pos in enumerate(bus_stops):  # Comenzar cada autobús en una parada
-            bus = BusAgent(f"bus_{i}", self, [], bus_stops)
+            bus = BusAgent(f"bus_{i}", self, CompiledRoute(self, [start_pos]), bus_stops)
             self.grid.place_agent(bus, start_pos)
             self.schedule.add(bus)
 
 
         
         aggressive_start_positions = [(14, 2), (20, 10)]
+        if city is not None:
+            aggressive_start_positions = [tuple(pos) for pos in city.starts["aggressive"].tolist()]
         for i, start_pos in enumerate(aggressive_start_positions):
             # Seleccionar un destino aleatorio de los estacionamientos
-            destino = random.choice(parking_lots)
+            destino = self.chance.choice(parking_lots)
             
             # Asegurarte de que el destino sea válido (exista en el grafo)
             if destino in self.graph.nodes:
@@ -607,9 +973,11 @@ class TrafficModel(Model):
 
         self.emergency_vehicles = []
         emergency_start_positions = [(10,11), (18,6)]
+        if city is not None:
+            emergency_start_positions = [tuple(pos) for pos in city.starts["emergency"].tolist()]
         for i, start_pos in enumerate(emergency_start_positions):
             # Seleccionar un destino aleatorio de los estacionamientos
-            destino = random.choice(parking_lots)
+            destino = self.chance.choice(parking_lots)
             
             # Asegurarte de que el destino sea válido (exista en el grafo)
             if destino in self.graph.nodes:
@@ -623,11 +991,60 @@ class TrafficModel(Model):
                 except nx.NetworkXNoPath:
                     print(f"No hay camino entre {start_pos} y {destino}")
 
+        # Demanda continua entre estacionamientos (desactivada por defecto)
+        if demand_rate > 0:
+            self.demand = DemandGenerator(self, demand_rate, parking_lots, max_active)
+
+    def make_boundary(self, pos, code):
+        """Crear el BoundaryAgent de una celda estática cuando se consulta la cuadrícula."""
+        return BoundaryAgent(f"{BOUNDARY_NAMES[code]}_{pos[0]}_{pos[1]}", self)
+
+    def can_enter(self, pos):
+        """Verificar si un vehículo puede entrar a la celda pos."""
+        cell = self.grid.layer[pos]
+        if cell == PARKING:
+            return True  # Permitir moverse si es un estacionamiento
+        if cell != ROAD:
+            return False  # No se puede mover a otros límites
+        for obj in self.grid.agents_at(pos):
+            if isinstance(obj, (CarAgent, AggressiveDriverAgent, BusAgent)):
+                return False  # No se puede mover a celdas ocupadas por otros vehículos
+        return True
+
+    def occupancy(self):
+        """Arreglo plano (x * N + y) con cuántos autos, autobuses y conductores agresivos hay en cada celda."""
+        height = self.grid.height
+        cells = [
+            agent.pos[0] * height + agent.pos[1] for agent in self.schedule.agents
+            if isinstance(agent, (CarAgent, AggressiveDriverAgent, BusAgent)) and agent.pos is not None
+        ]
+        return np.bincount(cells, minlength=self.grid.width * height)
+
+    def drive(self, vehicle, cells):
+        """Avanzar vehicle hasta cells celdas de su ruta, parando en la primera ocupada.
+
+        En modo simultáneo sólo se registra la propuesta; el movimiento lo
+        hace SimultaneousMoves.resolve() al final del tick.
+        """
+        if cells <= 0:
+            return
+        if self.moves is not None:
+            self.moves.propose(vehicle, cells)
+            return
+        for _ in range(cells):
+            next_pos = vehicle.route.next_pos()
+            if not self.can_enter(next_pos):
+                break
+            if self.closed_edges and (vehicle.pos, next_pos) in self.closed_edges:
+                break  # Sin desvío: espera antes del cierre
+            vehicle.take(next_pos)
+
     def get_positions(self):
         """
         Devuelve una lista combinada de las posiciones de todos los agentes en el modelo,
         excluyendo los semáforos (TrafficLightAgent).
         El formato es una lista de diccionarios con claves 'x' y 'z'.
+        Para exportar cada tick sin crear diccionarios usar frame_exporter().
         """
         points = []
         for agent in self.schedule.agents:
@@ -635,7 +1052,213 @@ class TrafficModel(Model):
             if not isinstance(agent, TrafficLightAgent):
                 points.append({"x": agent.pos[0], "z": agent.pos[1]})
         return {"points": points}
-    
+
+    def build_router(self, contract=True):
+        """Preprocesar el grafo para consultas de ruta (ver road_hierarchy).
+
+        Con contract=False sólo se comprimen los corredores; con True además se
+        construye la jerarquía de contracción. Hay que volver a llamarlo si el
+        grafo cambia.
+        """
+        from road_hierarchy import ContractionHierarchy, CorridorGraph
+        router = CorridorGraph(self.graph)
+        self.router = ContractionHierarchy(router) if contract else router
+        return self.router
+
+    def shortest_path(self, source, target):
+        """Ruta más corta de celda a celda; usa el router si se construyó uno."""
+        if self.router is not None:
+            return self.router.route(source, target)
+        return nx.shortest_path(self.graph, source=source, target=target)
+
+    def close_cell(self, pos):
+        """Cerrar una celda de calle o estacionamiento (accidente, autobús detenido, obra).
+
+        Ningún vehículo puede entrar a la celda; el que ya está en ella sí
+        puede salir. Sólo se quitan del grafo las aristas que entran a la
+        celda, y sólo se reparan las rutas que las usan (ver reroute).
+        Devuelve cuántos vehículos cambiaron de ruta.
+        """
+        if pos in self.closed_cells:
+            return 0
+        code = int(self.grid.layer[pos])
+        if code not in (ROAD, PARKING):
+            raise ValueError(f"cell {pos} is not a road or parking cell")
+        edges = list(self.graph.in_edges(pos))
+        self.graph.remove_edges_from(edges)
+        self.grid.layer[pos] = CLOSED
+        self.closed_cells[pos] = (code, edges)
+        return self.edges_changed(edges, closed=True)
+
+    def open_cell(self, pos):
+        """Reabrir una celda cerrada con close_cell; devuelve cuántos vehículos cambiaron de ruta."""
+        if pos not in self.closed_cells:
+            return 0
+        code, edges = self.closed_cells.pop(pos)
+        self.grid.layer[pos] = code
+        self.graph.add_edges_from(edges)
+        return self.edges_changed(edges, closed=False)
+
+    def close_edge(self, u, v):
+        """Cerrar el paso de la celda u a la celda v (un carril, un giro) sin cerrar las celdas."""
+        if (u, v) in self.closed_edges:
+            return 0
+        cell = self.closed_cells.get(v)
+        if cell is not None and (u, v) in cell[1]:
+            # Ya está fuera del grafo por el cierre de v; queda cerrada al reabrir v
+            cell[1].remove((u, v))
+            self.closed_edges.add((u, v))
+            return 0
+        if not self.graph.has_edge(u, v):
+            raise ValueError(f"no road from {u} to {v}")
+        self.graph.remove_edge(u, v)
+        self.closed_edges.add((u, v))
+        return self.edges_changed([(u, v)], closed=True)
+
+    def open_edge(self, u, v):
+        """Reabrir una arista cerrada con close_edge; devuelve cuántos vehículos cambiaron de ruta."""
+        if (u, v) not in self.closed_edges:
+            return 0
+        self.closed_edges.remove((u, v))
+        if v in self.closed_cells:
+            self.closed_cells[v][1].append((u, v))  # Vuelve al grafo al reabrir v
+            return 0
+        self.graph.add_edge(u, v)
+        return self.edges_changed([(u, v)], closed=False)
+
+    def closed_edge_codes(self):
+        """Códigos u * celdas + v (celdas aplanadas) de las aristas cerradas con close_edge."""
+        height = self.grid.height
+        size = self.grid.width * height
+        return np.fromiter(((u[0] * height + u[1]) * size + v[0] * height + v[1] for u, v in self.closed_edges),
+                           dtype=np.int64, count=len(self.closed_edges))
+
+    def edges_changed(self, edges, closed):
+        """Actualizar cachés y rutas tras quitar (closed=True) o devolver aristas al grafo.
+
+        Al cerrar se olvidan las plantillas de demanda que pasan por las
+        aristas y se reparan los vehículos cuya ruta restante las usa. Al
+        reabrir se recalculan las plantillas sin camino o calculadas durante
+        un cierre y se reintenta a los vehículos varados. Un router de
+        build_router() se descarta porque ya no corresponde al grafo.
+        """
+        self.router = None
+        height = self.grid.height
+        size = self.grid.width * height
+        codes = np.array([(u[0] * height + u[1]) * size + v[0] * height + v[1] for u, v in edges], dtype=np.int64)
+        if closed:
+            if self.demand is not None:
+                self.demand.invalidate(codes)
+            vehicles = [
+                agent for agent in self.schedule.agents
+                if isinstance(agent, (CarAgent, BusAgent, AggressiveDriverAgent, EmergencyVehicleAgent))
+                and agent.pos is not None and agent.route.remaining() > 0
+                and crosses(agent.route, agent.route.cursor, codes, size)
+            ]
+        else:
+            if self.demand is not None:
+                self.demand.reopened()
+            self.stranded = {agent for agent in self.stranded if agent.pos is not None}
+            vehicles = list(self.stranded)
+        return sum(self.reroute(vehicle) for vehicle in vehicles)
+
+    def reroute(self, vehicle):
+        """Reparar la ruta de vehicle si su parte restante cruza un cierre; True si cambió.
+
+        Primero busca un desvío local: BFS desde REPAIR_BACK celdas antes del
+        cierre (o desde la celda actual) hasta REPAIR_LIMIT celdas, hacia las
+        celdas de la ruta posteriores al último cierre, quedándose con el que
+        da la ruta total más corta. Si no lo hay, calcula la ruta completa al
+        destino; sin camino, el vehículo
+        conserva su ruta, espera antes del cierre y queda en self.stranded.
+        """
+        route = vehicle.route
+        cells = [route[i] for i in range(route.cursor, len(route))]
+        blocked = [i for i in range(len(cells) - 1) if not self.graph.has_edge(cells[i], cells[i + 1])]
+        if not blocked:
+            self.stranded.discard(vehicle)
+            return False
+        # Celda de reincorporación -> índice (el último, si la ruta repite celdas)
+        targets = {cell: i for i, cell in enumerate(cells) if i > blocked[-1]}
+        path = None
+        # El desvío sale unas celdas antes del cierre; si no hay, desde la celda actual
+        for start in sorted({max(blocked[0] - REPAIR_BACK, 0), 0}, reverse=True):
+            detour = self.detour(cells[start], targets, len(cells))
+            if detour is not None:
+                path = cells[:start] + detour + cells[targets[detour[-1]] + 1:]
+                break
+        if path is None:
+            try:
+                path = self.shortest_path(cells[0], cells[-1])
+            except nx.NetworkXNoPath:
+                self.stranded.add(vehicle)
+                return False
+        vehicle.route = CompiledRoute(self, path)
+        self.stranded.discard(vehicle)
+        self.rerouted += 1
+        if self.green_wave is not None and isinstance(vehicle, EmergencyVehicleAgent):
+            self.green_wave.register(vehicle)
+        return True
+
+    def detour(self, source, targets, length):
+        """Camino más corto de source a alguna celda de targets (celda -> índice en una ruta de length celdas).
+
+        Minimiza el largo del desvío más lo que falta de la ruta desde la
+        celda de reincorporación; None si ninguna está a menos de
+        REPAIR_LIMIT celdas exploradas.
+        """
+        succ = self.graph.succ
+        parent = {source: None}
+        frontier = [source]
+        best, best_total, dist = None, None, 0
+        while frontier:
+            for cell in frontier:
+                if cell in targets:
+                    total = dist + length - 1 - targets[cell]
+                    if best_total is None or total < best_total:
+                        best, best_total = cell, total
+            if best_total is not None and dist + 1 >= best_total:
+                break  # Ningún desvío más largo puede mejorar la ruta
+            if len(parent) > REPAIR_LIMIT:
+                break
+            nxt = []
+            for cell in frontier:
+                for neighbor in succ[cell]:
+                    if neighbor not in parent:
+                        parent[neighbor] = cell
+                        nxt.append(neighbor)
+            frontier = nxt
+            dist += 1
+        if best is None:
+            return None
+        path = [best]
+        while parent[path[-1]] is not None:
+            path.append(parent[path[-1]])
+        return path[::-1]
+
+    def enable_metrics(self, sample_every=1, **options):
+        """Empezar a medir tiempos de viaje, demoras y colas (ver traffic_metrics)."""
+        from traffic_metrics import TrafficMetrics
+        self.metrics = TrafficMetrics(self, sample_every=sample_every, **options)
+        return self.metrics
+
+    def enable_preemption(self, lead=4, max_hold=20):
+        """Dar ola verde a los vehículos de emergencia en todos los semáforos de su ruta (ver GreenWave)."""
+        self.green_wave = GreenWave(self, lead=lead, max_hold=max_hold)
+        for vehicle in self.emergency_vehicles:
+            self.green_wave.register(vehicle)
+        return self.green_wave
+
+    def frame_exporter(self, capacity=None, ring=8, shared=False, name=None):
+        """Exportador binario de cuadros (ver traffic_frames.FrameExporter)."""
+        from traffic_frames import FrameExporter
+        return FrameExporter(self, capacity=capacity, ring=ring, shared=shared, name=name)
+
+    def trajectory_recorder(self, path, chunk_ticks=256, codec="zlib"):
+        """Grabador de trayectorias para reproducir la corrida sin simularla (ver trajectory)."""
+        from trajectory import TrajectoryRecorder
+        return TrajectoryRecorder(self, path, attributes=("state", "happiness"), chunk_ticks=chunk_ticks, codec=codec)
+
     def create_graph_edges(self, M, N):
         for x in range(M):
             for y in range(N):
@@ -670,9 +1293,8 @@ class TrafficModel(Model):
                         self.graph.add_edge(current_pos, (x, y - 1))
                         self.graph.add_edge((x, y - 1), current_pos)
 
-
-            # Añadir restricciones de giro
-            self.add_edges_with_turn_restrictions()
+        # Añadir restricciones de giro (una vez, con todas las aristas ya creadas)
+        self.add_edges_with_turn_restrictions()
 
     def add_edges_with_turn_restrictions(self):
         # Ajustar las aristas en las intersecciones según las restricciones de giro
@@ -745,17 +1367,26 @@ class TrafficModel(Model):
                     self.graph.remove_edge(node, neighbor)
 
     def is_light_green(self, direction, pos):
-        if pos in self.traffic_light_positions:
-            light = self.traffic_lights[pos]
-            if light.state == "green" and light.orientation == direction:
-                return True
-            else:
-                return False
-        return True  # No traffic light at this position
+        if direction is None:
+            direction = NO_DIRECTION
+        return bool(self.green_for[self.light_index[pos], direction])  # -1: no traffic light
 
     def step(self):
         self.step_count += 1
-        self.schedule.step()
+        if self.green_wave is not None:
+            self.green_wave.step()
+        if self.moves is not None:
+            # Los semáforos cambian en su propia fase antes de que los vehículos
+            # propongan, así todos leen el mismo green_for sin importar el orden
+            self.schedule.step(first=TrafficLightAgent)
+        else:
+            self.schedule.step()
+        if self.moves is not None:
+            self.moves.resolve()
+        if self.demand is not None:
+            self.demand.step()
+        if self.metrics is not None:
+            self.metrics.step()
 
 
 # Visualization function
@@ -804,7 +1435,7 @@ def agent_portrayal(agent):
             "Shape": "circle",
             "Filled": "true",
             "Layer": 1,
-            "Color": "blue" if agent.state == "happy" else "red",
+            "Color": "blue" if agent.state == Mood.HAPPY else "red",
             "r": 0.5,
             "text": f"{int(agent.happiness)}",
             "text_color": "white",
@@ -845,7 +1476,7 @@ def agent_portrayal(agent):
             "Shape": "circle",
             "Filled": "true",
             "Layer": 1,
-            "Color": "green" if agent.state == "green" else "red",
+            "Color": "green" if agent.state == LightState.GREEN else "red",
             "r": 0.5,
         }
     return portrayal
@@ -854,19 +1485,26 @@ def agent_portrayal(agent):
 M, N = 24, 24
 light_interval = 10
 
-grid = CanvasGrid(agent_portrayal, M, N, 600, 600)
-server = ModularServer(
-    TrafficModel,
-    [grid],
-    "Traffic Simulation with Various Vehicles",
-    {
-        "M": M,
-        "N": N,
-        "light_interval": light_interval,
-    },
-)
 
-server.port = 8523
+def make_server():
+    """Servidor de Mesa (puerto 8523) con la ciudad de M x N y semáforos que cambian cada light_interval ticks."""
+    from mesa.visualization.modules import CanvasGrid
+    from mesa.visualization.ModularVisualization import ModularServer
+
+    grid = CanvasGrid(agent_portrayal, M, N, 600, 600)
+    server = ModularServer(
+        TrafficModel,
+        [grid],
+        "Traffic Simulation with Various Vehicles",
+        {
+            "M": M,
+            "N": N,
+            "light_interval": light_interval,
+        },
+    )
+    server.port = 8523
+    return server
+
 
 if __name__ == "__main__":
-    server.launch()
+    make_server().launch()
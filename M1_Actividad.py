@@ -1,12 +1,12 @@
 from mesa import Agent, Model
 from mesa.time import SimultaneousActivation
-from mesa.space import MultiGrid
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.ModularVisualization import ModularServer
-import random
+import numpy as np
 from collections import deque
+from cell_layers import LayeredMultiGrid
 
 class VacuumAgent(Agent):
+    __slots__ = ("movements", "visited", "path_stack", "queue", "behavior", "cursor")
+
     def __init__(self, unique_id, model, behavior="random"):
         super().__init__(unique_id, model)
         self.movements = 0
@@ -16,6 +16,7 @@ class VacuumAgent(Agent):
         self.path_stack.append((1, 1))
         self.queue.append((1, 1))
         self.behavior = behavior  # Comportamiento: "random", "DFS", "BFS cambiar en la linea 136"
+        self.cursor = 0  # Paso del recorrido precalculado (kernels=True)
 
     def step(self):
         if self.behavior == "random":
@@ -26,11 +27,8 @@ class VacuumAgent(Agent):
             self.bfs_move()
 
     def random_move(self):
-        cell_contents = self.model.grid.get_cell_list_contents([self.pos])
-        for obj in cell_contents:
-            if isinstance(obj, DirtAgent):
-                self.model.grid.remove_agent(obj)
-                self.model.clean_cell(self.pos)
+        if self.model.is_cell_dirty(self.pos):
+            self.model.clean_cell(self.pos)
 
         possible_steps = self.model.grid.get_neighborhood(self.pos, moore=True, include_center=False)
         new_position = self.random.choice(possible_steps)
@@ -38,6 +36,8 @@ class VacuumAgent(Agent):
         self.movements += 1
 
     def dfs_move(self):
+        if self.model.kernels is not None:
+            return self.coverage_move(lifo=True)
         if not self.path_stack:
             self.model.running = False
             return
@@ -48,11 +48,8 @@ class VacuumAgent(Agent):
             self.visited.add(current_pos)
             self.movements += 1
 
-            cell_contents = self.model.grid.get_cell_list_contents([current_pos])
-            for obj in cell_contents:
-                if isinstance(obj, DirtAgent):
-                    self.model.grid.remove_agent(obj)
-                    self.model.clean_cell(current_pos)
+            if self.model.is_cell_dirty(current_pos):
+                self.model.clean_cell(current_pos)
 
             neighbors = self.model.grid.get_neighborhood(current_pos, moore=True, include_center=False)
             for neighbor in neighbors:
@@ -60,6 +57,8 @@ class VacuumAgent(Agent):
                     self.path_stack.append(neighbor)
 
     def bfs_move(self):
+        if self.model.kernels is not None:
+            return self.coverage_move(lifo=False)
         if not self.queue:
             self.model.running = False
             return
@@ -70,28 +69,55 @@ class VacuumAgent(Agent):
             self.visited.add(current_pos)
             self.movements += 1
 
-            cell_contents = self.model.grid.get_cell_list_contents([current_pos])
-            for obj in cell_contents:
-                if isinstance(obj, DirtAgent):
-                    self.model.grid.remove_agent(obj)
-                    self.model.clean_cell(current_pos)
+            if self.model.is_cell_dirty(current_pos):
+                self.model.clean_cell(current_pos)
 
             neighbors = self.model.grid.get_neighborhood(current_pos, moore=True, include_center=False)
             for neighbor in neighbors:
                 if neighbor not in self.visited and neighbor not in self.queue:
                     self.queue.append(neighbor)
 
+    def coverage_move(self, lifo):
+        # Mismo recorrido que dfs_move / bfs_move, pero la secuencia de celdas
+        # sacadas de la pila (o cola) la calcula grid_kernels por tramos: un paso por celda
+        popped = self.model.coverage(lifo).step(self.cursor)
+        if popped is None:
+            self.model.running = False
+            return
+
+        self.cursor += 1
+        cell, fresh = popped
+        if fresh:
+            current_pos = divmod(int(cell), self.model.grid.height)
+            self.model.grid.move_agent(self, current_pos)
+            self.visited.add(current_pos)
+            self.movements += 1
+
+            if self.model.is_cell_dirty(current_pos):
+                self.model.clean_cell(current_pos)
+
 class DirtAgent(Agent):
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
 
 class VacuumModel(Model):
-    def __init__(self, M, N, num_agents, dirty_percentage, behavior="random"):
+    def __init__(self, M, N, num_agents, dirty_percentage, behavior="random", seed=None, kernels=False):
         self.num_agents = num_agents
-        self.grid = MultiGrid(M, N, True)
+        # La suciedad vive en la capa uint8 de la cuadrícula; los DirtAgent
+        # sólo se crean cuando la visualización pide el contenido de la celda
+        self.grid = LayeredMultiGrid(M, N, True, self.make_dirt)
         self.schedule = SimultaneousActivation(self)
         self.running = True
         self.behavior = behavior  # Comportamiento seleccionado
+        # kernels=True: DFS y BFS recorren la cuadrícula aplanada en grid_kernels
+        # (compilado con Numba si está instalado); el resultado es idéntico
+        self.kernels = None
+        self.coverages = {}
+        if kernels:
+            from grid_kernels import GridKernels
+            self.kernels = GridKernels(M, N, True)
 
         # Agregar agentes de limpieza
         for i in range(self.num_agents):
@@ -99,25 +125,37 @@ class VacuumModel(Model):
             self.grid.place_agent(agent, (1, 1))
             self.schedule.add(agent)
 
-        # Agregar agentes de suciedad
-        self.dirty_cells = set()
+        # Agregar suciedad: una sola muestra sin reemplazo sobre los índices
+        # aplanados, así se ensucian exactamente num_dirty_cells celdas
         num_dirty_cells = int(M * N * dirty_percentage)
-        for i in range(num_dirty_cells):
-            x, y = random.randint(0, M-1), random.randint(0, N-1)
-            if (x, y) not in self.dirty_cells:
-                dirt = DirtAgent(i + num_agents, self)
-                self.grid.place_agent(dirt, (x, y))
-                self.dirty_cells.add((x, y))
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        flat = rng.choice(M * N, size=num_dirty_cells, replace=False, shuffle=False)
+        self.dirt_layer = self.grid.layer
+        self.dirt_layer.flat[flat] = 1
+
+    def coverage(self, lifo):
+        # El recorrido no depende de la suciedad: todas las aspiradoras comparten
+        # el mismo, que se va calculando a medida que avanzan
+        if lifo not in self.coverages:
+            self.coverages[lifo] = self.kernels.coverage((1, 1), lifo)
+        return self.coverages[lifo]
+
+    def make_dirt(self, pos, code):
+        return DirtAgent(self.num_agents + pos[0] * self.grid.height + pos[1], self)
+
+    @property
+    def dirty_cells(self):
+        xs, ys = np.nonzero(self.dirt_layer)
+        return set(zip(xs.tolist(), ys.tolist()))
 
     def step(self):
         self.schedule.step()
 
     def clean_cell(self, pos):
-        if pos in self.dirty_cells:
-            self.dirty_cells.remove(pos)
+        self.dirt_layer[pos] = 0
 
     def is_cell_dirty(self, pos):
-        return pos in self.dirty_cells
+        return bool(self.dirt_layer[pos])
 
 def agent_portrayal(agent):
     portrayal = {"Shape": "circle", "Filled": "true", "r": 0.5}
@@ -135,13 +173,21 @@ num_agents = 1
 dirty_percentage = 0.3
 behavior = "BFS"  # Cambiar a "random", "DFS" o "BFS" manualmente
 
-grid = CanvasGrid(agent_portrayal, M, N, 500, 500)
-server = ModularServer(
-    VacuumModel,
-    [grid],
-    "Vacuum Model",
-    {"M": M, "N": N, "num_agents": num_agents, "dirty_percentage": dirty_percentage, "behavior": behavior}
-)
+def make_server():
+    """Servidor de Mesa (puerto 8521) con num_agents aspiradoras que limpian según behavior."""
+    from mesa.visualization.modules import CanvasGrid
+    from mesa.visualization.ModularVisualization import ModularServer
+
+    grid = CanvasGrid(agent_portrayal, M, N, 500, 500)
+    server = ModularServer(
+        VacuumModel,
+        [grid],
+        "Vacuum Model",
+        {"M": M, "N": N, "num_agents": num_agents, "dirty_percentage": dirty_percentage, "behavior": behavior}
+    )
+    server.port = 8521
+    return server
+
 
-server.port = 8521
-server.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    make_server().launch()
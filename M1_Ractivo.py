@@ -1,21 +1,18 @@
 from mesa import Agent, Model
 from mesa.time import SimultaneousActivation
-from mesa.space import MultiGrid
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.ModularVisualization import ModularServer
-import random
+import numpy as np
+from cell_layers import LayeredMultiGrid
 
 class VacuumAgent(Agent):
+    __slots__ = ("movements",)
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
         self.movements = 0
     
     def step(self):
-        cell_contents = self.model.grid.get_cell_list_contents([self.pos])
-        for obj in cell_contents:
-            if isinstance(obj, DirtAgent):
-                self.model.grid.remove_agent(obj)
-                self.model.clean_cell(self.pos)
+        if self.model.is_cell_dirty(self.pos):
+            self.model.clean_cell(self.pos)
         
         self.random_move()
     
@@ -28,13 +25,17 @@ class VacuumAgent(Agent):
         self.movements += 1
 
 class DirtAgent(Agent):
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
 
 class VacuumModel(Model):
-    def __init__(self, M, N, num_agents, dirty_percentage):
+    def __init__(self, M, N, num_agents, dirty_percentage, seed=None):
         self.num_agents = num_agents
-        self.grid = MultiGrid(M, N, True)
+        # Dirt lives in the grid's uint8 layer; DirtAgent objects are only
+        # built when the visualization asks for a cell's contents
+        self.grid = LayeredMultiGrid(M, N, True, self.make_dirt)
         self.schedule = SimultaneousActivation(self)
         self.running = True
         
@@ -44,25 +45,30 @@ class VacuumModel(Model):
             self.grid.place_agent(agent, (1, 1))
             self.schedule.add(agent)
         
-        
-        self.dirty_cells = set()
+        # Dirt: one sample without replacement over the flattened cell indices,
+        # so exactly num_dirty_cells distinct cells end up dirty
         num_dirty_cells = int(M * N * dirty_percentage)
-        for i in range(num_dirty_cells):
-            x, y = random.randint(0, M-1), random.randint(0, N-1)
-            if (x, y) not in self.dirty_cells:
-                dirt = DirtAgent(i + num_agents, self)
-                self.grid.place_agent(dirt, (x, y))
-                self.dirty_cells.add((x, y))
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        flat = rng.choice(M * N, size=num_dirty_cells, replace=False, shuffle=False)
+        self.dirt_layer = self.grid.layer
+        self.dirt_layer.flat[flat] = 1
+
+    def make_dirt(self, pos, code):
+        return DirtAgent(self.num_agents + pos[0] * self.grid.height + pos[1], self)
+
+    @property
+    def dirty_cells(self):
+        xs, ys = np.nonzero(self.dirt_layer)
+        return set(zip(xs.tolist(), ys.tolist()))
 
     def step(self):
         self.schedule.step()
 
     def clean_cell(self, pos):
-        if pos in self.dirty_cells:
-            self.dirty_cells.remove(pos)
+        self.dirt_layer[pos] = 0
 
     def is_cell_dirty(self, pos):
-        return pos in self.dirty_cells
+        return bool(self.dirt_layer[pos])
 
 def agent_portrayal(agent):
     portrayal = {"Shape": "circle", "Filled": "true", "r": 0.5}
@@ -80,14 +86,21 @@ M, N = 10, 10
 num_agents = 1
 dirty_percentage = 0.3
 
+def make_server():
+    """Servidor de Mesa (puerto 8521) con las aspiradoras reactivas sobre la cuadrícula de M x N."""
+    from mesa.visualization.modules import CanvasGrid
+    from mesa.visualization.ModularVisualization import ModularServer
+
+    grid = CanvasGrid(agent_portrayal, M, N, 500, 500)
+    server = ModularServer(
+        VacuumModel,
+        [grid],
+        "Vacuum Model",
+        {"M": M, "N": N, "num_agents": num_agents, "dirty_percentage": dirty_percentage}
+    )
+    server.port = 8521
+    return server
 
-grid = CanvasGrid(agent_portrayal, M, N, 500, 500)
-server = ModularServer(
-    VacuumModel,
-    [grid],
-    "Vacuum Model",
-    {"M": M, "N": N, "num_agents": num_agents, "dirty_percentage": dirty_percentage}
-)
 
-server.port = 8521
-server.launch()
+if __name__ == "__main__":
+    make_server().launch()
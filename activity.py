@@ -0,0 +1,98 @@
+"""Activity-aware scheduling for the Mesa models in this repository.
+
+RandomActivation and SimultaneousActivation step every agent on every
+tick, including agents whose step() cannot do anything: a car parked at
+the end of its route, a vacuum with nothing left to clean, a traffic
+light between two phase changes. ``ActivityScheduler`` keeps a set of
+active agents; an agent can go to sleep for a number of ticks or until
+some other part of the model wakes it up (a light changes, trash
+appears, a cell is freed). A tick then costs time proportional to the
+active agents only.
+
+Agents are stepped in the order they were added, as BaseScheduler does,
+or shuffled with the model's random generator like RandomActivation.
+``advance()`` is not called; no agent in this repository implements it.
+While every agent is awake the scheduler steps the same agents in the
+same order as the Mesa scheduler it replaces.
+"""
+import heapq
+from itertools import count
+
+from mesa.time import BaseScheduler
+
+
+class ActivityScheduler(BaseScheduler):
+    """BaseScheduler that only steps awake agents.
+
+    sleep(agent) takes an agent out of the active set until wake(agent);
+    sleep(agent, ticks) skips only the next ticks steps. Agents woken
+    during a step are stepped from the next step on.
+    """
+
+    def __init__(self, model, shuffle=False):
+        super().__init__(model)
+        self.shuffle = shuffle
+        self._added = count()
+        self._order = {}  # unique_id -> insertion number
+        self._active = {}  # unique_id -> insertion number, for awake agents
+        self._alarms = []  # Heap of (step, insertion number, unique_id)
+        self._alarm_at = {}  # unique_id -> step of its pending alarm
+
+    def add(self, agent):
+        super().add(agent)
+        n = next(self._added)
+        self._order[agent.unique_id] = n
+        self._active[agent.unique_id] = n
+
+    def remove(self, agent):
+        super().remove(agent)
+        del self._order[agent.unique_id]
+        self._active.pop(agent.unique_id, None)
+        self._alarm_at.pop(agent.unique_id, None)
+
+    def sleep(self, agent, ticks=None):
+        """Stop stepping agent for the next ticks steps (None: until woken)."""
+        uid = agent.unique_id
+        self._active.pop(uid, None)
+        if ticks is None:
+            self._alarm_at.pop(uid, None)
+            return
+        at = self.steps + 1 + ticks
+        self._alarm_at[uid] = at
+        heapq.heappush(self._alarms, (at, self._order[uid], uid))
+
+    def wake(self, agent):
+        """Step agent again from the next step on (no-op if it is awake)."""
+        uid = agent.unique_id
+        if uid in self._order and uid not in self._active:
+            self._active[uid] = self._order[uid]
+            self._alarm_at.pop(uid, None)
+
+    def is_awake(self, agent):
+        return agent.unique_id in self._active
+
+    @property
+    def active_count(self):
+        return len(self._active)
+
+    def step(self, first=None):
+        """Step the awake agents; those of class first (if given) all go before the rest."""
+        alarms, alarm_at = self._alarms, self._alarm_at
+        while alarms and alarms[0][0] <= self.steps:
+            at, n, uid = heapq.heappop(alarms)
+            if alarm_at.get(uid) == at:  # Otherwise woken or put back to sleep since
+                del alarm_at[uid]
+                self._active[uid] = n
+        active = self._active
+        keys = sorted(active, key=active.__getitem__)
+        if self.shuffle:
+            self.model.random.shuffle(keys)
+        agents = self._agents
+        if first is not None:
+            keys = ([uid for uid in keys if isinstance(agents[uid], first)]
+                    + [uid for uid in keys if not isinstance(agents[uid], first)])
+        for uid in keys:
+            if uid in active:
+                agents[uid].step()
+        self.steps += 1
+        self.time += 1
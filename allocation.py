@@ -0,0 +1,123 @@
+import numpy as np
+
+
+def auction(benefit, eps=None):
+    """Forward auction for the assignment problem (Bertsekas).
+
+    benefit is an (n, m) array with n <= m; every row gets a distinct
+    column. Returns assigned[i] = column of row i. With integer benefits and
+    the default eps = 1 / (n + 1) the assignment is optimal.
+    """
+    n, m = benefit.shape
+    if eps is None:
+        eps = 1.0 / (n + 1)
+    prices = np.zeros(m)
+    owner = np.full(m, -1)
+    assigned = np.full(n, -1)
+    unassigned = list(range(n - 1, -1, -1))
+    while unassigned:
+        i = unassigned.pop()
+        values = benefit[i] - prices
+        j = int(np.argmax(values))
+        best = values[j]
+        if m > 1:
+            values[j] = -np.inf
+            second = values.max()
+        else:
+            second = best
+        prices[j] += best - second + eps
+        if owner[j] >= 0:
+            assigned[owner[j]] = -1
+            unassigned.append(owner[j])
+        owner[j] = i
+        assigned[i] = j
+    return assigned
+
+
+def greedy(benefit):
+    """Rows in order take their best free column; not optimal, but O(n * m)."""
+    n, m = benefit.shape
+    taken = np.zeros(m, dtype=bool)
+    assigned = np.full(n, -1)
+    for i in range(n):
+        values = np.where(taken, -np.inf, benefit[i])
+        j = int(np.argmax(values))
+        if np.isfinite(values[j]):
+            assigned[i] = j
+            taken[j] = True
+    return assigned
+
+
+METHODS = {"auction": auction, "greedy": greedy}
+
+
+class TrashAllocator:
+    """Central assignment of uncleaned trash to vacuums.
+
+    Every target is claimed by at most one vacuum. Idle vacuums are assigned
+    together once per step (assign_idle), solving the assignment problem on
+    the matrix of torus Chebyshev distances to the unclaimed trash. When a
+    claimed cell is cleaned by somebody else, the owner's path is dropped
+    right away (cleaned) instead of being walked to a clean cell.
+    """
+
+    def __init__(self, model, method="auction"):
+        if method not in METHODS:
+            raise ValueError(f"unknown allocation method {method!r}")
+        self.model = model
+        self.solve = METHODS[method]
+        self.claims = {}  # Trash cell -> vacuum
+        self.targets = {}  # Vacuum -> trash cell
+        self.invalidated = 0  # Paths dropped because their target was cleaned
+
+    def target_of(self, vacuum):
+        return self.targets.get(vacuum)
+
+    def claim(self, vacuum, cell):
+        self.release(vacuum)
+        self.claims[cell] = vacuum
+        self.targets[vacuum] = cell
+        self.model.schedule.wake(vacuum)
+
+    def release(self, vacuum):
+        cell = self.targets.pop(vacuum, None)
+        if cell is not None:
+            del self.claims[cell]
+
+    def cleaned(self, cell, cleaner):
+        """A trash cell was cleaned; invalidate the path of whoever claimed it."""
+        owner = self.claims.get(cell)
+        if owner is None:
+            return
+        self.release(owner)
+        if owner is not cleaner:
+            owner.path = []
+            self.invalidated += 1
+
+    def assign_idle(self, vacuums):
+        """Batch-assign the vacuums without a target to unclaimed trash."""
+        idle = [v for v in vacuums if v not in self.targets]
+        if not idle:
+            return
+        free = sorted(
+            cell for cells in self.model.trash_index.buckets.values()
+            for cell in cells if cell not in self.claims
+        )
+        if not free:
+            return
+        width, height = self.model.grid.width, self.model.grid.height
+        vx = np.array([v.pos[0] for v in idle])[:, None]
+        vy = np.array([v.pos[1] for v in idle])[:, None]
+        tx = np.array([c[0] for c in free])[None, :]
+        ty = np.array([c[1] for c in free])[None, :]
+        dx = np.abs(vx - tx)
+        dy = np.abs(vy - ty)
+        cost = np.maximum(np.minimum(dx, width - dx), np.minimum(dy, height - dy))
+        if len(idle) <= len(free):
+            pairs = enumerate(self.solve(-cost))
+        else:
+            # More vacuums than trash: the trash cells pick their vacuums
+            pairs = ((i, j) for j, i in enumerate(self.solve(-cost.T)))
+        for i, j in pairs:
+            if j >= 0:
+                self.claim(idle[i], free[j])
@@ -0,0 +1,113 @@
+"""Memory and attribute-access benchmark for the slotted agent classes.
+
+Compares the agent classes (``__slots__`` + IntEnum codes) against the
+previous layout, where every attribute lived in the instance ``__dict__``
+and state was stored as strings ("happy", "green", "horizontal").
+Each car owns a 40-cell route: a list of tuples for the legacy class, a
+CompiledRoute (three small NumPy arrays) for the current one.
+
+Usage: python benchmarks/bench_compact_agents.py [n_agents]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+from mesa import Agent
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Evidencia1 import CarAgent, TrafficLightAgent, Mood, Direction  # noqa: E402
+
+
+class LegacyCarAgent(Agent):
+    """Evidencia1.CarAgent as it was before __slots__ and Mood codes."""
+
+    def __init__(self, unique_id, model, route):
+        super().__init__(unique_id, model)
+        self.route = route
+        self.current_step = 0
+        self.happiness = 100
+        self.state = "happy"
+
+
+class LegacyTrafficLightAgent(Agent):
+    """Evidencia1.TrafficLightAgent as it was before __slots__ and LightState codes."""
+
+    def __init__(self, unique_id, model, pos, orientation, smart=False):
+        super().__init__(unique_id, model)
+        self.pos = pos
+        self.state = "red"
+        self.orientation = orientation
+        self.smart = smart
+        self.light_interval = model.light_interval
+        self.step_count = 0
+
+
+def measure_memory(factory, n):
+    """Return the bytes allocated per agent when building n agents."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    agents = [factory(i) for i in range(n)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del agents
+    return (after - before) / n
+
+
+def measure_access(agents, happy, n_loops=5):
+    """Return ns per agent for an attribute update and for the CarAgent state check."""
+
+    def update():
+        for agent in agents:
+            agent.happiness += 1
+
+    def state_check():
+        for agent in agents:
+            if agent.state == happy:
+                agent.happiness += 0.2
+
+    results = []
+    for fn in (update, state_check):
+        seconds = min(timeit.repeat(fn, number=1, repeat=n_loops))
+        results.append(seconds / len(agents) * 1e9)
+    return results
+
+
+def main(n=200_000):
+    # Just enough of a TrafficModel for CarAgent to compile its route
+    model = SimpleNamespace(
+        light_interval=10,
+        grid=SimpleNamespace(height=40),
+        light_index=np.full((1, 40), -1, dtype=np.int16),
+    )
+    route = [(0, y) for y in range(40)]
+    cases = [
+        ("CarAgent", lambda i: LegacyCarAgent(i, model, list(route)), lambda i: CarAgent(i, model, route)),
+        (
+            "TrafficLightAgent",
+            lambda i: LegacyTrafficLightAgent(i, model, (0, 0), "horizontal"),
+            lambda i: TrafficLightAgent(i, model, (0, 0), Direction.HORIZONTAL),
+        ),
+    ]
+    print(f"{n} agents per case")
+    print(f"{'class':<20}{'legacy B/agent':>16}{'slots B/agent':>16}{'saving':>10}")
+    for name, legacy, compact in cases:
+        legacy_bytes = measure_memory(legacy, n)
+        compact_bytes = measure_memory(compact, n)
+        saving = 1 - compact_bytes / legacy_bytes
+        print(f"{name:<20}{legacy_bytes:>16.1f}{compact_bytes:>16.1f}{saving:>10.1%}")
+
+    legacy_cars = [LegacyCarAgent(i, model, route) for i in range(n)]
+    compact_cars = [CarAgent(i, model, route) for i in range(n)]
+    legacy_ns = measure_access(legacy_cars, "happy")
+    compact_ns = measure_access(compact_cars, Mood.HAPPY)
+    for label, old, new in zip(("attribute update", "state check"), legacy_ns, compact_ns):
+        print(f"{label:<20}legacy {old:6.1f} ns/agent   slots {new:6.1f} ns/agent")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,47 @@
+"""Per-tick export cost: get_positions() + json.dumps versus FrameExporter.write().
+
+Usage: python benchmarks/bench_frames.py [ticks]
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Evidencia1  # noqa: E402
+
+
+def allocated(fn, n=100):
+    """Bytes allocated (peak above baseline) while calling fn n times."""
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    for _ in range(n):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - base
+
+
+def main(ticks=150):
+    model = Evidencia1.TrafficModel(24, 24, 10, seed=1)
+    exporter = model.frame_exporter(ring=8, shared=True)
+    for _ in range(ticks):
+        model.step()
+
+    def legacy():
+        json.dumps(model.get_positions())
+
+    cases = (("get_positions + json", legacy), ("FrameExporter.write", exporter.write))
+    for label, fn in cases:
+        seconds = min(timeit.repeat(fn, number=1000, repeat=5)) / 1000
+        print(f"{label:<24}{seconds * 1e6:>9.2f} us/frame{allocated(fn):>10} B peak for 100 frames")
+    print(f"static geometry exported once: {exporter.size} B ring, "
+          f"{model.grid.layer.nbytes} B layer")
+    exporter.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 150)
@@ -0,0 +1,40 @@
+"""Generation time and peak memory of the procedural city and room maps.
+
+Usage: python benchmarks/bench_generators.py [size ...]   (default 1000 4000 10000)
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generators import generate_city, generate_room  # noqa: E402
+
+CASES = (
+    ("city", lambda size: generate_city(size, size, block=10, street=2, roundabout_ratio=0.0, seed=1)),
+    ("city+roundabouts", lambda size: generate_city(size, size, block=12, street=3, roundabout_ratio=0.1, seed=1)),
+    ("room", lambda size: generate_room(size, size, room=12, seed=1)),
+)
+
+
+def main(sizes=(1000, 4000, 10000)):
+    for size in sizes:
+        for label, build in CASES:
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = build(size)
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if hasattr(result, "lights"):
+                detail = f"{len(result.lights)} lights, {len(result.parking)} lots"
+            else:
+                detail = f"{result.blocked.mean():.1%} blocked"
+            print(f"{label:<18}{size:>6} x {size:<6}{seconds:>8.2f} s{peak / 2**20:>9.0f} MiB peak   {detail}")
+            del result
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or (1000, 4000, 10000))
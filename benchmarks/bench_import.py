@@ -0,0 +1,58 @@
+"""Cold import time of every model module, each in a fresh interpreter.
+
+Importing a model must not build or launch a visualization server; the
+server is only created by make_server() (or the visualization entry
+points). For each module this prints the import time and which heavy
+packages ended up loaded. The "mesa" row is the floor for every Mesa
+model: mesa 2.x imports pandas, networkx and its tornado visualization
+from its own __init__.
+
+Usage: python benchmarks/bench_import.py [repeat]
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATION = os.path.join(ROOT, "simulationtion", "trafic_sumulation")
+
+# (label, directory to import from, module)
+MODULES = [
+    ("mesa", ROOT, "mesa"),
+    ("M1_Ractivo", ROOT, "M1_Ractivo"),
+    ("M1_Actividad", ROOT, "M1_Actividad"),
+    ("Evidencia1", ROOT, "Evidencia1"),
+    ("test", ROOT, "test"),
+    ("graph/VacumModel", os.path.join(ROOT, "graph"), "VacumModel"),
+    ("simulationtion model", SIMULATION, "model"),
+    ("parallel_traffic", ROOT, "parallel_traffic"),
+    ("road_hierarchy", ROOT, "road_hierarchy"),
+]
+
+PROBE = """
+import json, sys, time
+sys.path[:0] = [{path!r}, {root!r}]
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = ("mesa", "tornado", "pandas", "networkx", "matplotlib")
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in heavy if m in sys.modules]}}))
+"""
+
+
+def probe(path, module):
+    code = PROBE.format(path=path, root=ROOT, module=module)
+    out = subprocess.run([sys.executable, "-c", code], cwd=path, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(repeat=3):
+    for label, path, module in MODULES:
+        runs = [probe(path, module) for _ in range(repeat)]
+        seconds = min(run["seconds"] for run in runs)
+        print(f"{label:<22}{seconds * 1e3:>9.1f} ms   {', '.join(runs[0]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,48 @@
+"""Tick throughput of parallel_traffic on a procedurally generated city.
+
+Runs the serial engine and the multi-process engine with 1, 2, 4, ...
+tiles (up to the number of cores) on the same map and seed, checks that
+every run ends with exactly the same vehicle positions, and prints ticks
+per second.
+
+Usage: python benchmarks/bench_parallel_traffic.py [size] [ticks] [density]
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import parallel_traffic  # noqa: E402
+
+
+def tilings(cores):
+    """(tiles_x, tiles_y) for 1, 2, 4, ... tiles, up to cores."""
+    n = 1
+    while n <= cores:
+        tiles_y = 1
+        while tiles_y * tiles_y < n:
+            tiles_y *= 2
+        yield n // tiles_y, tiles_y
+        n *= 2
+
+
+def main(size=2000, ticks=50, density=0.2):
+    cores = os.cpu_count() or 1
+    print(f"{size}x{size} city, density {density}, {ticks} ticks, {cores} cores")
+    reference, rate = parallel_traffic.run(size, size, density, ticks, workers=False)
+    print(f"{'serial':<16}{rate:>10.1f} ticks/s  {len(reference[0])} vehicles")
+    for tiles_x, tiles_y in tilings(cores):
+        state, rate = parallel_traffic.run(size, size, density, ticks, tiles_x, tiles_y, workers=True)
+        same = all((a == b).all() for a, b in zip(reference, state))
+        label = f"{tiles_x}x{tiles_y} workers"
+        print(f"{label:<16}{rate:>10.1f} ticks/s  {'identical' if same else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if len(args) > 0 else 2000,
+        int(args[1]) if len(args) > 1 else 50,
+        float(args[2]) if len(args) > 2 else 0.2,
+    )
@@ -0,0 +1,69 @@
+"""Route query latency: nx.shortest_path versus road_hierarchy on a lattice city.
+
+Builds CorridorGraph and ContractionHierarchy on lattice_road_graph(size,
+size), checks that both return routes as short as networkx for every
+sampled pair, and prints the preprocessing time and the mean latency of a
+junction-to-junction query and of a full cell-level route.
+
+Usage: python benchmarks/bench_road_hierarchy.py [size] [pairs]
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import networkx as nx  # noqa: E402
+
+import road_hierarchy  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def mean_latency(fn, pairs):
+    start = time.perf_counter()
+    for source, target in pairs:
+        fn(source, target)
+    return (time.perf_counter() - start) / len(pairs)
+
+
+def main(size=1000, n_pairs=50):
+    rng = random.Random(0)
+    graph, seconds = timed(lambda: road_hierarchy.lattice_road_graph(size, size))
+    print(f"{size}x{size} lattice: {graph.number_of_nodes()} cells ({seconds:.1f} s)")
+    corridor, seconds = timed(lambda: road_hierarchy.CorridorGraph(graph))
+    print(f"corridor graph: {corridor.stats()} ({seconds:.1f} s)")
+    hierarchy, seconds = timed(lambda: road_hierarchy.ContractionHierarchy(corridor))
+    print(f"contraction hierarchy: {hierarchy.stats()} ({seconds:.1f} s)")
+
+    cells = list(graph.nodes)
+    pairs = [(rng.choice(cells), rng.choice(cells)) for _ in range(n_pairs)]
+    for source, target in pairs:
+        expected = nx.shortest_path_length(graph, source, target)
+        for router in (corridor, hierarchy):
+            assert len(router.route(source, target)) - 1 == expected, (source, target)
+
+    junctions = list(corridor.junctions)
+    junction_pairs = [(rng.choice(junctions), rng.choice(junctions)) for _ in range(n_pairs)]
+    def junctions_only(router):
+        return lambda s, t: router.junction_path(corridor.entry_points(s), corridor.exit_points(t))
+
+    rows = [
+        ("nx.shortest_path", mean_latency(lambda s, t: nx.shortest_path(graph, s, t), pairs)),
+        ("corridor route", mean_latency(corridor.route, pairs)),
+        ("hierarchy route", mean_latency(hierarchy.route, pairs)),
+        ("corridor junctions", mean_latency(junctions_only(corridor), junction_pairs)),
+        ("hierarchy junctions", mean_latency(junctions_only(hierarchy), junction_pairs)),
+    ]
+    for label, seconds in rows:
+        print(f"{label:<22}{seconds * 1e3:>10.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,58 @@
+"""Trajectory file size and cost: bytes per agent per tick, recording and seeking.
+
+Records the Evidencia1 demand scenario with each available codec, then
+times decoding a frame far into the file (a seek) and a replay step.
+
+Usage: python benchmarks/bench_trajectory.py [ticks]
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Evidencia1  # noqa: E402
+from trajectory import ReplayModel, TrajectoryReader  # noqa: E402
+
+
+def codecs():
+    yield None
+    yield "zlib"
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return
+    yield "zstd"
+
+
+def main(ticks=2000):
+    for codec in codecs():
+        model = Evidencia1.TrafficModel(24, 24, 10, demand_rate=1.0, seed=1)
+        path = os.path.join(tempfile.mkdtemp(), "run.trj")
+        recorder = model.trajectory_recorder(path, codec=codec)
+        spent = 0.0
+        for _ in range(ticks):
+            model.step()
+            start = time.perf_counter()
+            recorder.record()
+            spent += time.perf_counter() - start
+        recorder.close()
+
+        reader = TrajectoryReader(path)
+        start = time.perf_counter()
+        reader.frame(len(reader) - 1)
+        seek = time.perf_counter() - start
+        replay = ReplayModel(path, speed=1, start=0)
+        start = time.perf_counter()
+        for _ in range(100):
+            replay.step()
+        play = (time.perf_counter() - start) / 100
+        print(f"{str(codec):<6}{os.path.getsize(path):>10} B {reader.bytes_per_agent_tick():>7.3f} B/agent/tick"
+              f"{spent / ticks * 1e3:>8.3f} ms/record{seek * 1e3:>8.2f} ms seek{play * 1e3:>8.3f} ms/replay step")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,273 @@
+"""Fixed-seed benchmark suite for every model and engine mode in the repo.
+
+Each scenario builds a model with a fixed seed and runs it for a fixed
+number of ticks. For every scenario the suite records:
+
+* construction time (seconds),
+* ticks per second (best of --repeat runs),
+* peak traced memory in MiB (tracemalloc, measured in a separate run so it
+  does not slow down the timings).
+
+Results are written as JSON to benchmarks/results/<commit>.json. ``compare``
+prints the relative change between two result files, or between two commits
+that each have a results file.
+
+Usage:
+    python benchmarks/run_benchmarks.py run [--filter TEXT] [--repeat N] [--output FILE]
+    python benchmarks/run_benchmarks.py list
+    python benchmarks/run_benchmarks.py compare BASE HEAD [--threshold 0.05]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(ROOT, "benchmarks", "results")
+GRAPH = os.path.join(ROOT, "graph")
+SIMULATION = os.path.join(ROOT, "simulationtion", "trafic_sumulation")
+for path in (ROOT, GRAPH, SIMULATION):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+SEED = 12345
+
+
+def graph_vacuum(search_algorithm, size, n_trash, n_vacuums=1, allocation=None, room=False, kernels=False):
+    def build(seed):
+        from VacumModel import VacuumModel
+
+        plan = None
+        if room:
+            from generators import generate_room
+            plan = generate_room(size, size, seed=seed)
+        return VacuumModel(n_vacuums=n_vacuums, n_trash=n_trash, width=size, height=size, seed=seed,
+                           search_algorithm=search_algorithm, allocation=allocation, room=plan,
+                           kernels=kernels)
+    return build
+
+
+def m1_actividad(behavior, size, kernels=False):
+    def build(seed):
+        import M1_Actividad
+
+        return M1_Actividad.VacuumModel(size, size, 1, 0.3, behavior=behavior, seed=seed, kernels=kernels)
+    return build
+
+
+def m1_ractivo(size):
+    def build(seed):
+        import M1_Ractivo
+
+        return M1_Ractivo.VacuumModel(size, size, 1, 0.3, seed=seed)
+    return build
+
+
+def evidencia1(seed):
+    import Evidencia1
+
+    return Evidencia1.TrafficModel(24, 24, 10, seed=seed)
+
+
+def evidencia1_demand(rate, update="sequential", metrics_every=None):
+    def build(seed):
+        import Evidencia1
+
+        model = Evidencia1.TrafficModel(24, 24, 10, demand_rate=rate, seed=seed, update=update)
+        if metrics_every is not None:
+            model.enable_metrics(sample_every=metrics_every)
+        return model
+    return build
+
+
+def evidencia1_city(size, rate=1.0):
+    def build(seed):
+        import Evidencia1
+        from generators import generate_city
+
+        city = generate_city(size, size, block=10, light_density=0.4, n_cars=20, seed=seed)
+        return Evidencia1.TrafficModel(size, size, 10, demand_rate=rate, seed=seed, city=city)
+    return build
+
+
+def simulation(lane_mode, sync_grid=True):
+    def build(seed):
+        from model import TrafficModel
+
+        return TrafficModel(50, 50, 10, sync_grid=sync_grid, lane_mode=lane_mode, seed=seed)
+    return build
+
+
+def parallel_city(size, density):
+    def build(seed):
+        import parallel_traffic
+
+        config = parallel_traffic.CityConfig(size, size, seed=seed)
+        return parallel_traffic.SerialTileEngine(config, parallel_traffic.place_vehicles(config, density))
+    return build
+
+
+# name -> (build(seed), ticks)
+SCENARIOS = {
+    "graph.bfs.10": (graph_vacuum("bfs", 10, 20), 50),
+    "graph.bfs.30": (graph_vacuum("bfs", 30, 90), 50),
+    "graph.bfs.60": (graph_vacuum("bfs", 60, 360), 50),
+    "graph.dfs.10": (graph_vacuum("dfs", 10, 20), 50),
+    "graph.dfs.30": (graph_vacuum("dfs", 30, 90), 50),
+    "graph.dfs.60": (graph_vacuum("dfs", 60, 360), 50),
+    "graph.astar.10": (graph_vacuum("astar", 10, 20), 50),
+    "graph.astar.30": (graph_vacuum("astar", 30, 90), 50),
+    "graph.astar.60": (graph_vacuum("astar", 60, 360), 50),
+    "graph.astar.500": (graph_vacuum("astar", 500, 50), 500),
+    "graph.bfs.500": (graph_vacuum("bfs", 500, 50), 500),
+    "graph.astar.8x60": (graph_vacuum("astar", 60, 200, n_vacuums=8), 100),
+    "graph.auction.8x60": (graph_vacuum("astar", 60, 200, n_vacuums=8, allocation="auction"), 100),
+    "graph.bfs.room.60": (graph_vacuum("bfs", 60, 90, room=True), 50),
+    "graph.astar.room.500": (graph_vacuum("astar", 500, 50, room=True), 500),
+    "graph.bfs.kernels.60": (graph_vacuum("bfs", 60, 360, kernels=True), 50),
+    "graph.dfs.kernels.60": (graph_vacuum("dfs", 60, 360, kernels=True), 50),
+    "graph.bfs.kernels.500": (graph_vacuum("bfs", 500, 50, kernels=True), 500),
+    "m1_actividad.random.50": (m1_actividad("random", 50), 500),
+    "m1_actividad.dfs.50": (m1_actividad("DFS", 50), 500),
+    "m1_actividad.bfs.50": (m1_actividad("BFS", 50), 500),
+    "m1_actividad.dfs.kernels.50": (m1_actividad("DFS", 50, kernels=True), 500),
+    "m1_actividad.bfs.kernels.50": (m1_actividad("BFS", 50, kernels=True), 500),
+    "m1_ractivo.random.50": (m1_ractivo(50), 500),
+    "evidencia1.24": (evidencia1, 150),
+    "evidencia1.demand.24": (evidencia1_demand(1.0), 1000),
+    "evidencia1.simultaneous.24": (evidencia1_demand(1.0, "simultaneous"), 1000),
+    "evidencia1.metrics.24": (evidencia1_demand(1.0, metrics_every=1), 1000),
+    "evidencia1.metrics10.24": (evidencia1_demand(1.0, metrics_every=10), 1000),
+    "evidencia1.city.96": (evidencia1_city(96), 300),
+    "simulation.kernel.50": (simulation("kernel"), 300),
+    "simulation.kernel_nosync.50": (simulation("kernel", sync_grid=False), 300),
+    "simulation.nasch.50": (simulation("nasch"), 300),
+    "parallel_traffic.serial.500": (parallel_city(500, 0.2), 50),
+}
+
+
+def run_scenario(build, ticks, repeat):
+    """Return construction time, ticks/s and peak MiB for one scenario."""
+    build(SEED)  # Warm-up: module imports and first-call caches are not timed
+    build_times, rates = [], []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        model = build(SEED)
+        built = time.perf_counter()
+        for _ in range(ticks):
+            model.step()
+        end = time.perf_counter()
+        build_times.append(built - start)
+        rates.append(ticks / (end - built))
+        if hasattr(model, "close"):
+            model.close()
+        del model
+
+    gc.collect()
+    tracemalloc.start()
+    model = build(SEED)
+    for _ in range(ticks):
+        model.step()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if hasattr(model, "close"):
+        model.close()
+    return {
+        "construction_s": min(build_times),
+        "ticks_per_s": max(rates),
+        "peak_mib": peak / 2**20,
+        "ticks": ticks,
+    }
+
+
+def current_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def run(args):
+    commit = current_commit()
+    results = {}
+    for name, (build, ticks) in SCENARIOS.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = run_scenario(build, ticks, args.repeat)
+        r = results[name]
+        print(f"{name:<32}{r['construction_s'] * 1e3:>10.2f} ms build{r['ticks_per_s']:>12.1f} ticks/s"
+              f"{r['peak_mib']:>10.2f} MiB")
+    report = {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": SEED,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS, f"{commit}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+
+def load(ref):
+    """Load a results file by path or by the commit it was recorded at."""
+    path = ref if os.path.exists(ref) else os.path.join(RESULTS, f"{ref}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(args):
+    base, head = load(args.base), load(args.head)
+    print(f"base {base['commit']}  ->  head {head['commit']}")
+    # Higher is better for ticks/s, lower is better for the other two
+    metrics = (("construction_s", -1), ("ticks_per_s", 1), ("peak_mib", -1))
+    print(f"{'scenario':<32}" + "".join(f"{name:>22}" for name, _ in metrics))
+    for name in sorted(set(base["results"]) & set(head["results"])):
+        cells = []
+        for metric, sign in metrics:
+            old, new = base["results"][name][metric], head["results"][name][metric]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if abs(change) >= args.threshold:
+                flag = " +" if change * sign > 0 else " -"
+            cells.append(f"{change:>+19.1%}{flag:<3}")
+        print(f"{name:<32}" + "".join(cells))
+    only = set(base["results"]) ^ set(head["results"])
+    if only:
+        print("only in one run: " + ", ".join(sorted(only)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run")
+    p_run.add_argument("--filter", default="")
+    p_run.add_argument("--repeat", type=int, default=3)
+    p_run.add_argument("--output")
+    sub.add_parser("list")
+    p_cmp = sub.add_parser("compare")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("head")
+    p_cmp.add_argument("--threshold", type=float, default=0.05)
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+    elif args.command == "list":
+        for name, (_, ticks) in SCENARIOS.items():
+            print(f"{name:<32}{ticks:>6} ticks")
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import numpy as np
+from mesa.space import MultiGrid, accept_tuple_argument
+
+
+class LayeredMultiGrid(MultiGrid):
+    """A MultiGrid with a uint8 layer for passive cells (dirt, trash, boundaries).
+
+    Passive cells are not agents: each one is a single byte in ``layer``
+    (0 means nothing there). Agent objects for them are only built when
+    somebody asks for the contents of a cell, e.g. the CanvasGrid
+    visualization or user code calling ``get_cell_list_contents``, and are
+    cached so the same cell and code always return the same object.
+    """
+
+    def __init__(self, width, height, torus, factory):
+        super().__init__(width, height, torus)
+        self.layer = np.zeros((width, height), dtype=np.uint8)
+        self.factory = factory  # factory(pos, code) -> Agent
+        self._materialized = {}
+
+    def passive_agent(self, pos):
+        """Return the agent object for the passive cell at pos, or None."""
+        code = int(self.layer[pos])
+        if code == 0:
+            self._materialized.pop(pos, None)
+            return None
+        cached = self._materialized.get(pos)
+        if cached is None or cached[0] != code:
+            agent = self.factory(pos, code)
+            agent.pos = pos
+            cached = (code, agent)
+            self._materialized[pos] = cached
+        return cached[1]
+
+    @accept_tuple_argument
+    def iter_cell_list_contents(self, cell_list):
+        for x, y in cell_list:
+            passive = self.passive_agent((x, y))
+            if passive is not None:
+                yield passive
+            yield from self._grid[x][y]
+
+    def agents_at(self, pos):
+        """Agents placed at pos (without the passive cell), as the grid's own list: do not modify it."""
+        return self._grid[pos[0]][pos[1]]
+
+    def is_cell_empty(self, pos):
+        return self.layer[pos] == 0 and super().is_cell_empty(pos)
+
+    def count(self, code):
+        """Number of cells in the layer holding the given code."""
+        return int(np.count_nonzero(self.layer == code))
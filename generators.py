@@ -0,0 +1,253 @@
+"""Procedural maps for scale testing: grid cities and furnished rooms.
+
+Evidencia1 ships one hand-drawn 24x24 city and the vacuum models only
+scatter trash on open grids. The generators here build, with NumPy and
+without any per-cell Python loop, maps up to 10k x 10k from a handful of
+parameters and a seed:
+
+* ``generate_city`` returns a ``City``: the uint8 cell layer with the
+  Evidencia1 codes (road, building, parking, roundabout), a one-way
+  direction per road cell, traffic lights with orientation and smart
+  flag, parking lots, bus stops and vehicle start cells. Pass it as
+  ``Evidencia1.TrafficModel(..., city=city)``.
+* ``generate_room`` returns a ``Room``: a torus split into rooms by walls
+  with a door in every wall segment, and a piece of furniture in each
+  room. Pass it as ``VacumModel.VacuumModel(..., room=room)``.
+
+At 10k x 10k a city takes about 2 s and 1 GB of peak memory, a room 3 s
+and 300 MB (benchmarks/bench_generators.py). The Mesa models build a
+networkx graph or one agent per light, so they are practical up to about
+1000 x 1000; the arrays are what the array engines and benchmarks use at
+larger sizes.
+"""
+import numpy as np
+
+# Same codes as Evidencia1 (cell layer) and Evidencia1.Direction (light orientation)
+ROAD, BUILDING, PARKING, ROUNDABOUT = 0, 1, 2, 3
+HORIZONTAL, VERTICAL = 0, 1
+# Codes of City.direction; the names are the ones Evidencia1.one_way_streets uses
+TWO_WAY, EAST, WEST, NORTH, SOUTH = 0, 1, 2, 3, 4
+DIRECTION_NAMES = {EAST: "east", WEST: "west", NORTH: "north", SOUTH: "south"}
+
+
+def _cells(xs, ys):
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def _sample(rng, width, height, ok, n):
+    """n distinct cells (x, y) drawn uniformly from the cells where ok(xs, ys) holds."""
+    chosen = {}
+    batch = 4 * n + 16
+    for _ in range(64):
+        if len(chosen) == n:
+            break
+        flat = rng.integers(width * height, size=batch)
+        xs, ys = flat // height, flat % height
+        keep = ok(xs, ys)
+        for x, y in _cells(xs[keep], ys[keep]):
+            chosen.setdefault((x, y), None)
+            if len(chosen) == n:
+                break
+        batch *= 2
+    if len(chosen) < n:
+        raise ValueError(f"could not find {n} free cells")
+    return np.array(list(chosen), dtype=np.int32).reshape(-1, 2)
+
+
+class City:
+    """A generated city; every array is indexed [x, y] like the Mesa grids."""
+
+    def __init__(self, layer, direction, lights, light_orientation, light_smart, parking, bus_stops, starts):
+        self.layer = layer  # uint8 (width, height), ROAD / BUILDING / PARKING / ROUNDABOUT
+        self.direction = direction  # uint8 (width, height), TWO_WAY or the one-way direction
+        self.lights = lights  # int32 (n, 2)
+        self.light_orientation = light_orientation  # uint8 (n,), HORIZONTAL / VERTICAL
+        self.light_smart = light_smart  # bool (n,)
+        self.parking = parking  # int32 (n, 2)
+        self.bus_stops = bus_stops  # int32 (n, 2)
+        self.starts = starts  # {"car" | "aggressive" | "emergency": int32 (n, 2)}
+
+    @property
+    def width(self):
+        return self.layer.shape[0]
+
+    @property
+    def height(self):
+        return self.layer.shape[1]
+
+    def cells(self, code):
+        """Cells of the layer holding code, as a list of (x, y)."""
+        return _cells(*np.nonzero(self.layer == code))
+
+    def one_way_streets(self):
+        """The {(x, y): "north" | ...} dict Evidencia1.TrafficModel builds its graph from."""
+        xs, ys = np.nonzero(self.direction)
+        codes = self.direction[xs, ys].tolist()
+        return {cell: DIRECTION_NAMES[code] for cell, code in zip(_cells(xs, ys), codes)}
+
+
+def generate_city(width, height, block=8, street=2, one_way_ratio=0.5, light_density=0.5, smart_ratio=0.0,
+                  parking_ratio=0.5, roundabout_ratio=0.0, n_cars=2, n_buses=3, n_aggressive=2, n_emergency=2,
+                  seed=0):
+    """Grid city with a street of street lanes every block cells in both axes.
+
+    Each street is one-way (all its lanes the same way, chosen at random)
+    with probability one_way_ratio, except the first and last street of
+    each axis, which are two-way: together with streets ending at the last
+    crossing street this keeps every road cell reachable from every other.
+    Crossings are two-way. light_density of the crossings get a pair of
+    light groups like the hand-drawn map (a HORIZONTAL group on the cells
+    west of the crossing and a VERTICAL group north of it), smart_ratio of
+    them smart. roundabout_ratio of the crossings without lights become a
+    roundabout (needs street >= 3: the inside of the crossing is blocked,
+    its outer ring stays road). parking_ratio of the blocks get a parking
+    lot on the building cell next to the street at their left or bottom
+    side.
+    """
+    if block < street + 2:
+        raise ValueError("block must leave at least two building cells between streets")
+    if roundabout_ratio and street < 3:
+        raise ValueError("roundabouts need streets of at least 3 lanes")
+    rng = np.random.default_rng(seed)
+    last_x = (width - street) // block * block  # First lane of the last street of each axis
+    last_y = (height - street) // block * block
+    if last_x <= 0 or last_y <= 0:
+        raise ValueError("the map must hold at least two streets per axis")
+    x, y = np.arange(width), np.arange(height)
+    street_x = (x % block < street) & (x < last_x + street)  # Lanes of the streets along y
+    street_y = (y % block < street) & (y < last_y + street)
+    in_x, in_y = x < last_x + street, y < last_y + street
+    along_y = street_x[:, None] & in_y[None, :]  # Road cells of the streets along y
+    along_x = street_y[None, :] & in_x[:, None]
+    crossing = street_x[:, None] & street_y[None, :]
+    layer = np.where(along_y | along_x, ROAD, BUILDING).astype(np.uint8)
+
+    # One-way streets: one random draw per street, broadcast to its lanes
+    n_sx, n_sy = last_x // block + 1, last_y // block + 1
+    dir_x = np.where(rng.random(n_sx) < one_way_ratio, np.where(rng.random(n_sx) < 0.5, NORTH, SOUTH), TWO_WAY)
+    dir_y = np.where(rng.random(n_sy) < one_way_ratio, np.where(rng.random(n_sy) < 0.5, EAST, WEST), TWO_WAY)
+    dir_x, dir_y = dir_x.astype(np.uint8), dir_y.astype(np.uint8)
+    dir_x[[0, -1]] = TWO_WAY
+    dir_y[[0, -1]] = TWO_WAY
+    direction = np.zeros((width, height), dtype=np.uint8)
+    sx = np.minimum(x // block, n_sx - 1)
+    sy = np.minimum(y // block, n_sy - 1)
+    direction[:] = np.where(along_y & ~crossing, dir_x[sx][:, None], 0)
+    direction |= np.where(along_x & ~crossing, dir_y[sy][None, :], 0)
+
+    # Crossings, by the index of their first lane on each axis
+    cx, cy = np.meshgrid(np.arange(n_sx) * block, np.arange(n_sy) * block, indexing="ij")
+    cx, cy = cx.ravel(), cy.ravel()
+    lit = rng.random(len(cx)) < light_density
+    lit &= (cx > 0) & (cy + street < last_y + street)  # Room for both light groups
+    smart = rng.random(len(cx)) < smart_ratio
+    lane = np.arange(street)
+    hx = np.repeat(cx[lit] - 1, street)  # West of the crossing, one light per lane
+    hy = (cy[lit][:, None] + lane).ravel()
+    vx = (cx[lit][:, None] + lane).ravel()  # North of the crossing
+    vy = np.repeat(cy[lit] + street, street)
+    lights = np.stack([np.concatenate([hx, vx]), np.concatenate([hy, vy])], axis=1).astype(np.int32)
+    light_orientation = np.repeat(np.array([HORIZONTAL, VERTICAL], dtype=np.uint8), len(hx))
+    light_smart = np.tile(np.repeat(smart[lit], street), 2)
+
+    if roundabout_ratio:
+        round_ = ~lit & (rng.random(len(cx)) < roundabout_ratio)
+        inner = np.arange(1, street - 1)
+        rx = (cx[round_][:, None, None] + inner[None, :, None]).repeat(len(inner), axis=2).ravel()
+        ry = (cy[round_][:, None, None] + inner[None, None, :]).repeat(len(inner), axis=1).ravel()
+        layer[rx, ry] = ROUNDABOUT
+        direction[rx, ry] = TWO_WAY
+
+    # Parking: one lot on the left or bottom edge of some blocks
+    bx, by = np.meshgrid(np.arange(n_sx - 1) * block + street, np.arange(n_sy - 1) * block + street, indexing="ij")
+    bx, by = bx.ravel(), by.ravel()
+    has_lot = rng.random(len(bx)) < parking_ratio
+    bx, by = bx[has_lot], by[has_lot]
+    offset = rng.integers(block - street, size=len(bx))
+    left = rng.random(len(bx)) < 0.5
+    px = np.where(left, bx, bx + offset)
+    py = np.where(left, by + offset, by)
+    layer[px, py] = PARKING
+    parking = np.stack([px, py], axis=1).astype(np.int32)
+
+    # Vehicles start on road cells that are neither a crossing nor a light
+    free = (layer == ROAD) & ~crossing
+    free[lights[:, 0], lights[:, 1]] = False
+    counts = {"bus": n_buses, "car": n_cars, "aggressive": n_aggressive, "emergency": n_emergency}
+    picked = _sample(rng, width, height, lambda xs, ys: free[xs, ys], sum(counts.values()))
+    starts, i = {}, 0
+    for kind, n in counts.items():
+        starts[kind] = picked[i:i + n]
+        i += n
+    bus_stops = starts.pop("bus")
+    return City(layer, direction, lights, light_orientation, light_smart, parking, bus_stops, starts)
+
+
+class Room:
+    """A generated floor plan on a torus; blocked[x, y] is True for walls and furniture."""
+
+    def __init__(self, blocked, room):
+        self.blocked = blocked
+        self.room = room
+
+    @property
+    def width(self):
+        return self.blocked.shape[0]
+
+    @property
+    def height(self):
+        return self.blocked.shape[1]
+
+    def free_cells(self, n, rng):
+        """n distinct free cells, as an int32 (n, 2) array."""
+        return _sample(rng, self.width, self.height, lambda xs, ys: ~self.blocked[xs, ys], n)
+
+
+def generate_room(width, height, room=12, door=2, furniture=0.25, seed=0, strip=512):
+    """Rooms of room x room cells (walls included) with furniture, on a width x height torus.
+
+    Every wall segment between two rooms has a door of door cells at a
+    random place, so every room is reachable. Each full room gets one
+    rectangle of furniture covering about furniture of its inside, kept
+    one cell away from the walls so the doors stay usable. Furniture is
+    painted in strips of strip columns to bound the temporary memory.
+    """
+    if room < door + 3:
+        raise ValueError("room must be at least door + 3 cells")
+    rng = np.random.default_rng(seed)
+    x, y = np.arange(width), np.arange(height)
+    blocked = (x % room == 0)[:, None] | (y % room == 0)[None, :]
+    n_rx, n_ry = -(-width // room), -(-height // room)
+
+    # Doors: one per wall segment, at a random offset inside the segment
+    for axis, (n_along, n_across, length) in enumerate(((n_rx, n_ry, height), (n_ry, n_rx, width))):
+        wall, segment = np.meshgrid(np.arange(n_along) * room, np.arange(n_across) * room, indexing="ij")
+        wall, segment = wall.ravel(), segment.ravel()
+        span = np.maximum(np.minimum(room - 1, length - segment - 1) - door, 0)
+        start = segment + 1 + (rng.random(len(segment)) * (span + 1)).astype(np.int64)
+        for d in range(door):
+            along = np.minimum(start + d, length - 1)
+            keep = along % room != 0  # Never open a corner of the wall grid
+            if axis == 0:
+                blocked[wall[keep], along[keep]] = False
+            else:
+                blocked[along[keep], wall[keep]] = False
+
+    # Furniture: one rectangle per full room, inside local cells [2, room - 2)
+    inside = room - 4
+    if inside > 0 and furniture > 0:
+        full_x, full_y = width // room, height // room
+        side = max(1, int(round(inside * furniture ** 0.5)))
+        fw = rng.integers(max(1, side // 2), min(inside, 2 * side) + 1, size=(full_x, full_y))
+        fh = np.clip((side * side) // fw, 1, inside)
+        fx = 2 + (rng.random((full_x, full_y)) * (inside - fw + 1)).astype(np.int64)
+        fy = 2 + (rng.random((full_x, full_y)) * (inside - fh + 1)).astype(np.int64)
+        ly = y[: full_y * room] % room
+        ry = y[: full_y * room] // room
+        for s in range(0, full_x * room, strip):
+            xs = x[s: min(s + strip, full_x * room)]
+            lx, rx = (xs % room)[:, None], (xs // room)[:, None]
+            x0, y0 = fx[rx, ry], fy[rx, ry]
+            piece = (lx >= x0) & (lx < x0 + fw[rx, ry]) & (ly >= y0) & (ly < y0 + fh[rx, ry])
+            blocked[xs[0]: xs[-1] + 1, : full_y * room] |= piece
+    return Room(blocked, room)
@@ -1,21 +1,39 @@
+import os
+import sys
+import heapq
 import mesa
 from collections import deque
-import matplotlib.pyplot as plt
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.ModularVisualization import ModularServer
 from mesa.datacollection import DataCollector
 import numpy as np
 
+if __name__ == "__main__":  # Run as a script: the shared helpers live in the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cell_layers import LayeredMultiGrid
+from activity import ActivityScheduler
+from spatial_index import BucketIndex, torus_chebyshev
+from allocation import TrashAllocator
+
+# Codes stored in the trash layer of the grid
+EMPTY, TRASH, CLEANED = 0, 1, 2
+
 class TrashAgent(mesa.Agent):
-    """An agent representing trash that can be cleaned."""
+    """An agent representing trash that can be cleaned.
+
+    Trash is stored in the model's trash_layer; these objects are only built
+    on demand when a cell's contents are queried (e.g. by the visualization).
+    """
+
+    __slots__ = ("cleaned",)
 
-    def __init__(self, unique_id, model):
+    def __init__(self, unique_id, model, cleaned=False):
         super().__init__(unique_id, model)
-        self.cleaned = False  
+        self.cleaned = cleaned
 
 class VacuumAgent(mesa.Agent):
     """An agent representing a vacuum cleaner."""
 
+    __slots__ = ("path", "search_algorithm", "cleaned_count", "steps_taken")
+
     def __init__(self, unique_id, model, search_algorithm='bfs'):
         super().__init__(unique_id, model)
         self.path = []  # Path to the target trash
@@ -25,6 +43,8 @@ class VacuumAgent(mesa.Agent):
 
     def bfs(self, start_pos):
         """Perform BFS to find the nearest uncleaned trash."""
+        if self.model.kernels is not None:
+            return self.model.kernels.search(self.model.trash_layer, TRASH, start_pos)
         queue = deque([(start_pos, [])])
         visited = set()
         while queue:
@@ -32,13 +52,9 @@ class VacuumAgent(mesa.Agent):
             if current_pos in visited:
                 continue
             visited.add(current_pos)
-            cell_contents = self.model.grid.get_cell_list_contents([current_pos])
-            for obj in cell_contents:
-                if isinstance(obj, TrashAgent) and not obj.cleaned:
-                    return path + [current_pos]  # Path to the trash
-            neighbors = self.model.grid.get_neighborhood(
-                current_pos, moore=True, include_center=False
-            )
+            if self.model.trash_layer[current_pos] == TRASH:
+                return path + [current_pos]  # Path to the trash
+            neighbors = self.model.neighbors(current_pos)
             for neighbor in neighbors:
                 if neighbor not in visited:
                     queue.append((neighbor, path + [neighbor]))
@@ -46,6 +62,8 @@ class VacuumAgent(mesa.Agent):
 
     def dfs(self, start_pos):
         """Perform DFS to find an uncleaned trash."""
+        if self.model.kernels is not None:
+            return self.model.kernels.search(self.model.trash_layer, TRASH, start_pos, lifo=True)
         stack = [(start_pos, [])]
         visited = set()
         while stack:
@@ -53,18 +71,48 @@ class VacuumAgent(mesa.Agent):
             if current_pos in visited:
                 continue
             visited.add(current_pos)
-            cell_contents = self.model.grid.get_cell_list_contents([current_pos])
-            for obj in cell_contents:
-                if isinstance(obj, TrashAgent) and not obj.cleaned:
-                    return path + [current_pos]  # Path to the trash
-            neighbors = self.model.grid.get_neighborhood(
-                current_pos, moore=True, include_center=False
-            )
+            if self.model.trash_layer[current_pos] == TRASH:
+                return path + [current_pos]  # Path to the trash
+            neighbors = self.model.neighbors(current_pos)
             for neighbor in neighbors:
                 if neighbor not in visited:
                     stack.append((neighbor, path + [neighbor]))
         return []  # No uncleaned trash found
 
+    def astar(self, start_pos, target=None):
+        """A* path to target, by default the nearest uncleaned trash in the spatial index."""
+        if target is None:
+            target = self.model.trash_index.nearest(start_pos)
+        if target is None:
+            return []  # No uncleaned trash found
+        if target == start_pos:
+            return [start_pos]
+        grid = self.model.grid
+        width, height = grid.width, grid.height
+        parent = {start_pos: None}
+        cost = {start_pos: 0}
+        # Ties on f are broken towards the larger g, i.e. closer to the target
+        heap = [(torus_chebyshev(start_pos, target, width, height), 0, start_pos)]
+        while heap:
+            _, neg_g, current_pos = heapq.heappop(heap)
+            g = -neg_g
+            if current_pos == target:
+                break
+            if g > cost[current_pos]:
+                continue  # Stale heap entry
+            for neighbor in self.model.neighbors(current_pos):
+                if neighbor not in cost or g + 1 < cost[neighbor]:
+                    cost[neighbor] = g + 1
+                    parent[neighbor] = current_pos
+                    f = g + 1 + torus_chebyshev(neighbor, target, width, height)
+                    heapq.heappush(heap, (f, -(g + 1), neighbor))
+        if target not in parent:
+            return []  # Walled off by obstacles
+        path = [target]
+        while parent[path[-1]] != start_pos:
+            path.append(parent[path[-1]])
+        return path[::-1]
+
     def move_along_path(self):
         """Move along the precomputed path."""
         if self.path:
@@ -75,30 +123,56 @@ class VacuumAgent(mesa.Agent):
     def step(self):
         """Perform one step: find path to trash, move, and clean."""
         if not self.path:
-            if self.search_algorithm == 'bfs':
+            allocator = self.model.allocator
+            if allocator is not None:
+                target = allocator.target_of(self)
+                self.path = self.astar(self.pos, target) if target is not None else []
+            elif self.search_algorithm == 'bfs':
                 self.path = self.bfs(self.pos)
             elif self.search_algorithm == 'dfs':
                 self.path = self.dfs(self.pos)
+            elif self.search_algorithm == 'astar':
+                self.path = self.astar(self.pos)
         if self.path:
             self.move_along_path()
             self.clean()
+        else:
+            # Nothing left to clean: sleep until new trash or a target wakes it
+            self.model.schedule.sleep(self)
 
     def clean(self):
         """Clean trash if present in the current cell."""
-        cell_contents = self.model.grid.get_cell_list_contents([self.pos])
-        for obj in cell_contents:
-            if isinstance(obj, TrashAgent) and not obj.cleaned:
-                obj.cleaned = True
-                self.model.cleaned_trash += 1  # Update cleaned trash count
-                self.cleaned_count += 1  # Update agent's cleaned count
+        if self.model.trash_layer[self.pos] == TRASH:
+            self.model.trash_layer[self.pos] = CLEANED
+            self.model.trash_index.discard(self.pos)
+            if self.model.allocator is not None:
+                self.model.allocator.cleaned(self.pos, self)
+            self.model.cleaned_trash += 1  # Update cleaned trash count
+            self.cleaned_count += 1  # Update agent's cleaned count
 
 class VacuumModel(mesa.Model):
     """A model with vacuum agents and trash."""
 
-    def __init__(self, n_vacuums=1, n_trash=20, width=10, height=10, seed=None, search_algorithm='bfs'):
+    def __init__(self, n_vacuums=1, n_trash=20, width=10, height=10, seed=None, search_algorithm='bfs',
+                 allocation=None, room=None, kernels=False):
         super().__init__(seed=seed)
-        self.grid = mesa.space.MultiGrid(width, height, True)
-        self.schedule = mesa.time.RandomActivation(self)
+        # room: floor plan from generators.generate_room; its walls and
+        # furniture block movement, and it replaces width and height
+        self.blocked = None
+        if room is not None:
+            width, height = room.width, room.height
+            self.blocked = room.blocked
+        self.grid = LayeredMultiGrid(width, height, True, self.make_trash)
+        self.trash_layer = self.grid.layer
+        # kernels=True runs 'bfs' and 'dfs' over the flattened grid in
+        # grid_kernels (Numba compiled if installed), with identical paths
+        self.kernels = None
+        if kernels:
+            from grid_kernels import GridKernels
+            self.kernels = GridKernels(width, height, True, self.blocked)
+        self.n_vacuums = n_vacuums
+        # Random order like RandomActivation, but idle vacuums are not stepped
+        self.schedule = ActivityScheduler(self, shuffle=True)
         self.cleaned_trash = 0  # Count of cleaned trash
         self.total_trash = n_trash  # Total number of trash items
 
@@ -121,14 +195,48 @@ class VacuumModel(mesa.Model):
             self.schedule.add(vacuum)
             x = self.random.randrange(self.grid.width)
             y = self.random.randrange(self.grid.height)
+            while self.blocked is not None and self.blocked[x, y]:
+                x = self.random.randrange(self.grid.width)
+                y = self.random.randrange(self.grid.height)
             self.grid.place_agent(vacuum, (x, y))
 
-        # Create trash agents
-        for i in range(n_trash):
-            trash = TrashAgent(i + n_vacuums, self)
-            x = self.random.randrange(self.grid.width)
-            y = self.random.randrange(self.grid.height)
-            self.grid.place_agent(trash, (x, y))
+        # Place trash: sample n_trash distinct cells in one draw over the
+        # flattened grid indices, so no two trash items share a cell
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        if room is None:
+            flat = rng.choice(width * height, size=n_trash, replace=False, shuffle=False)
+            self.trash_layer.flat[flat] = TRASH
+        else:
+            cells = room.free_cells(n_trash, rng)
+            self.trash_layer[cells[:, 0], cells[:, 1]] = TRASH
+        # Uncleaned trash cells, for nearest-trash queries ('astar')
+        self.trash_index = BucketIndex.from_layer(self.trash_layer, TRASH)
+        # With allocation ('auction' or 'greedy') targets are assigned centrally
+        # and paths are planned with A*, whatever search_algorithm says
+        self.allocator = TrashAllocator(self, allocation) if allocation else None
+
+    def neighbors(self, pos):
+        """Moore neighbors of pos that are not blocked by a wall or furniture."""
+        cells = self.grid.get_neighborhood(pos, moore=True, include_center=False)
+        if self.blocked is None:
+            return cells
+        return [cell for cell in cells if not self.blocked[cell]]
+
+    def add_trash(self, pos):
+        """Drop new trash at pos and wake the vacuums that ran out of work."""
+        if self.trash_layer[pos] == TRASH:
+            return
+        self.trash_layer[pos] = TRASH
+        self.trash_index.add(pos)
+        self.total_trash += 1
+        if self.allocator is None:  # The allocator wakes the vacuums it assigns
+            for agent in self.schedule.agents:
+                self.schedule.wake(agent)
+
+    def make_trash(self, pos, code):
+        """Build the TrashAgent for a trash cell when the grid is queried."""
+        unique_id = self.n_vacuums + pos[0] * self.grid.height + pos[1]
+        return TrashAgent(unique_id, self, cleaned=code == CLEANED)
 
     def compute_average_path_length(self):
         """Compute the average path length taken by agents to clean trash."""
@@ -138,6 +246,8 @@ class VacuumModel(mesa.Model):
 
     def step(self):
         """Run one step of the model."""
+        if self.allocator is not None:
+            self.allocator.assign_idle(self.schedule.agents)
         self.schedule.step()
         self.datacollector.collect(self)
 
@@ -153,17 +263,23 @@ def agent_portrayal(agent):
         color = "red" if not agent.cleaned else "green"
         return {"Shape": "rect", "Color": color, "Filled": True, "Layer": 0, "w": 0.5, "h": 0.5}
 
-# Visualization setup (optional)
-grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
-server = ModularServer(
-    VacuumModel,
-    [grid],
-    "Vacuum Cleaning Model",
-    {"n_vacuums": 1, "n_trash": 10, "width": 10, "height": 10, "search_algorithm": 'bfs'}
-)
+def make_server():
+    """Mesa server showing one BFS vacuum cleaning 10 trash cells on a 10 x 10 torus."""
+    from mesa.visualization.modules import CanvasGrid
+    from mesa.visualization.ModularVisualization import ModularServer
+
+    grid = CanvasGrid(agent_portrayal, 10, 10, 500, 500)
+    return ModularServer(
+        VacuumModel,
+        [grid],
+        "Vacuum Cleaning Model",
+        {"n_vacuums": 1, "n_trash": 10, "width": 10, "height": 10, "search_algorithm": 'bfs'}
+    )
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     # Run the model using BFS with a single vacuum agent
     model_bfs = VacuumModel(n_vacuums=1, n_trash=20, width=10, height=10, search_algorithm='bfs')
     model_bfs.run_model(step_count=50)
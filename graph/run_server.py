@@ -1,3 +1,9 @@
+import os
+import sys
+
+# The shared helpers (cell_layers, activity, ...) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import mesa
 from mesa.visualization.modules import CanvasGrid, ChartModule
 from mesa.visualization.ModularVisualization import ModularServer
@@ -0,0 +1,243 @@
+"""Grid search kernels for the vacuum models, compiled with Numba when available.
+
+The grids are flattened (cell ``x * height + y``, the C order of the uint8
+layers) and the neighbors of every cell are precomputed once in a table of
+8 slots per cell, in the order of Mesa's ``get_neighborhood(moore=True)``
+with torus wrapping; slots that are off the grid, repeated (grids under
+3 cells wide), the cell itself or blocked hold -1.
+
+The kernels replay the searches of the models step by step, including
+their duplicate queue entries, so the results are identical:
+
+* ``GridKernels.search`` is ``VacuumAgent.bfs`` / ``dfs`` of graph/VacumModel.py;
+* ``GridKernels.coverage`` is the sequence of cells popped by ``dfs_move`` /
+  ``bfs_move`` of M1_Actividad.py, which does not depend on the dirt. It is
+  computed CHUNK cells at a time as the agents ask for them, so a run of a
+  few hundred steps never pays for the walk over the whole grid.
+
+With Numba installed the kernels are ``njit`` compiled (``JIT`` is True);
+without it the same functions run as plain Python over memoryviews of the
+same NumPy buffers (indexing a memoryview yields plain ints, much faster
+than indexing the arrays).
+"""
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # Optional: same kernels, interpreted
+    numba = None
+
+JIT = numba is not None
+_jit = numba.njit(cache=True, nogil=True) if JIT else (lambda function: function)
+
+# Moore offsets in get_neighborhood order (x outer, y inner, center skipped)
+OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+CHUNK = 64  # Cells of the coverage walk computed per call
+
+
+def moore_table(width, height, torus=True, blocked=None):
+    """Flat int32 table of the 8 neighbor slots of every cell (-1 = no neighbor)."""
+    xs, ys = np.divmod(np.arange(width * height, dtype=np.int64), height)
+    cells = xs * height + ys
+    table = np.full((width * height, 8), -1, dtype=np.int64)
+    for k, (dx, dy) in enumerate(OFFSETS):
+        nx, ny = xs + dx, ys + dy
+        if torus:
+            valid = np.ones(len(xs), dtype=bool)
+            nx, ny = nx % width, ny % height
+        else:
+            valid = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        neighbor = nx * height + ny
+        valid &= neighbor != cells
+        for j in range(k):  # Wrapped onto an earlier slot: Mesa keeps the first
+            valid &= neighbor != table[:, j]
+        table[valid, k] = neighbor[valid]
+    if blocked is not None:
+        flat_blocked = np.asarray(blocked, dtype=bool).reshape(-1)
+        table[(table >= 0) & flat_blocked[np.maximum(table, 0)]] = -1
+    return table.astype(np.int32).reshape(-1)
+
+
+@_jit
+def _search(codes, target, nbr, start, lifo, seen, stamp, node, parent, stack):
+    """First popped cell holding target, as an entry index; -1 if none, -2 if the buffers are full.
+
+    Entries (node, parent entry) are kept in push order, so a queue is just
+    a read position over them and a stack holds entry indices.
+    """
+    cap = len(node)
+    node[0] = start
+    parent[0] = -1
+    stack[0] = 0
+    count = 1
+    head = 0
+    top = 1
+    while True:
+        if lifo:
+            if top == 0:
+                return -1
+            top -= 1
+            entry = stack[top]
+        else:
+            if head == count:
+                return -1
+            entry = head
+            head += 1
+        cell = node[entry]
+        if seen[cell] == stamp:
+            continue
+        seen[cell] = stamp
+        if codes[cell] == target:
+            return entry
+        base = cell * 8
+        for k in range(8):
+            neighbor = nbr[base + k]
+            if neighbor >= 0 and seen[neighbor] != stamp:
+                if count == cap:
+                    return -2
+                node[count] = neighbor
+                parent[count] = entry
+                if lifo:
+                    stack[top] = count
+                    top += 1
+                count += 1
+
+
+@_jit
+def _coverage(nbr, lifo, pending, ends, order, fresh, n, limit, visited, queued):
+    """Continue the coverage walk: pop cells into order[n:limit] (fresh[i] = 1 if first visit).
+
+    The pending stack (or queue) lives in pending[ends[0]:ends[1]] and is
+    kept between calls; returns the new n, below limit once the walk ended.
+    As in M1_Actividad, DFS pushes every unvisited neighbor and BFS only
+    those that are not already waiting in the queue.
+    """
+    head = ends[0]
+    top = ends[1]
+    while top > head and n < limit:
+        if lifo:
+            top -= 1
+            cell = pending[top]
+        else:
+            cell = pending[head]
+            head += 1
+            queued[cell] = 0
+        order[n] = cell
+        if visited[cell]:
+            fresh[n] = 0
+            n += 1
+            continue
+        visited[cell] = 1
+        fresh[n] = 1
+        n += 1
+        base = cell * 8
+        for k in range(8):
+            neighbor = nbr[base + k]
+            if neighbor >= 0 and not visited[neighbor] and (lifo or not queued[neighbor]):
+                pending[top] = neighbor
+                top += 1
+                queued[neighbor] = 1
+    ends[0] = head
+    ends[1] = top
+    return n
+
+
+class CoverageWalk:
+    """The cells popped by one coverage walk, computed CHUNK at a time as they are asked for."""
+
+    def __init__(self, kernels, start, lifo):
+        size = kernels.width * kernels.height
+        self.kernels = kernels
+        self.lifo = lifo
+        self.pending = kernels._buffer(8 * size + 1 if lifo else size + 1)
+        self.visited = kernels._buffer(size, np.uint8)
+        self.queued = kernels._buffer(size, np.uint8)
+        self.ends = kernels._buffer(2)
+        self.order = kernels._buffer(CHUNK)
+        self.fresh = kernels._buffer(CHUNK, np.uint8)
+        self.n = 0  # Cells computed so far
+        self.done = False  # The stack (or queue) ran empty
+        self.pending[0] = start
+        self.queued[start] = 1
+        self.ends[1] = 1
+
+    def step(self, i):
+        """(flat cell, fresh) popped at step i of the walk, or None if the walk ended before it."""
+        while i >= self.n:
+            if self.done:
+                return None
+            self._extend()
+        return self.order[i], self.fresh[i]
+
+    def _extend(self):
+        if self.n == len(self.order):  # Double the computed prefix, keeping it
+            view = self.kernels._view
+            order, fresh = np.zeros(2 * self.n, dtype=np.int32), np.zeros(2 * self.n, dtype=np.uint8)
+            order[: self.n], fresh[: self.n] = np.asarray(self.order), np.asarray(self.fresh)
+            self.order, self.fresh = view(order), view(fresh)
+        limit = min(self.n + CHUNK, len(self.order))
+        self.n = _coverage(self.kernels.nbr, self.lifo, self.pending, self.ends, self.order, self.fresh,
+                           self.n, limit, self.visited, self.queued)
+        self.done = self.n < limit
+
+
+class GridKernels:
+    """Searches over one grid; keeps the neighbor table and work buffers between calls."""
+
+    def __init__(self, width, height, torus=True, blocked=None):
+        self.width = width
+        self.height = height
+        self.nbr = self._view(moore_table(width, height, torus, blocked))
+        self.seen = self._buffer(width * height)
+        self.stamp = 0
+        self._grow(min(8 * width * height + 1, 1024))
+
+    @staticmethod
+    def _view(array):
+        return array if JIT else memoryview(array)
+
+    def _buffer(self, size, dtype=np.int32):
+        return self._view(np.zeros(size, dtype=dtype))
+
+    def _grow(self, capacity):
+        self.node = self._buffer(capacity)
+        self.parent = self._buffer(capacity)
+        self.stack = self._buffer(capacity)
+
+    def search(self, layer, target, start, lifo=False):
+        """Path from start to the first cell of layer holding target, as VacuumAgent.bfs (dfs with lifo).
+
+        Like the agents' searches the path ends with the found cell twice,
+        is [start] when start itself holds target and [] when nothing does.
+        """
+        height = self.height
+        codes = self._view(layer.reshape(-1))
+        start = start[0] * height + start[1]
+        while True:
+            self.stamp += 1
+            if self.stamp == 2 ** 31 - 1:
+                self.stamp = 1
+                self.seen = self._buffer(self.width * height)
+            entry = _search(codes, target, self.nbr, start, lifo, self.seen, self.stamp,
+                            self.node, self.parent, self.stack)
+            if entry != -2:
+                break
+            self._grow(2 * len(self.node))
+        if entry == -1:
+            return []
+        node, parent = self.node, self.parent
+        path = [divmod(int(node[entry]), height)]
+        while parent[entry] >= 0:
+            path.append(divmod(int(node[entry]), height))
+            entry = parent[entry]
+        path.reverse()
+        return path
+
+    def coverage(self, start, lifo=True):
+        """Walk of M1_Actividad's dfs_move (bfs_move with lifo=False) from start, one cell per step.
+
+        The CoverageWalk computes the cells lazily; a step whose cell is not
+        fresh was already visited and does nothing.
+        """
+        return CoverageWalk(self, start[0] * self.height + start[1], lifo)
@@ -0,0 +1,422 @@
+"""Domain-decomposed, multi-process stepping for city-scale traffic maps.
+
+Evidencia1.TrafficModel steps every agent in one Python loop, so a tick is
+bound to a single core. This module runs the same kind of street traffic
+(vehicles on a road grid, traffic lights at the crossings, a vehicle never
+enters an occupied cell) on a map split into rectangular tiles. Each tile
+is stepped by its own worker process, which owns the vehicles and the
+lights inside it.
+
+Workers share three things through ``multiprocessing.shared_memory``:
+
+* ``occupancy``: two (height, width) int32 buffers holding vehicle id + 1
+  (0 = free). Tick t reads buffer t % 2 and writes buffer (t + 1) % 2, so
+  the halo cells at a tile border are simply read from the neighbour's part
+  of the current buffer.
+* ``mail``: a (tiles, tiles, capacity, 4) int32 outbox per pair of tiles,
+  holding (id, x, y, direction) for the vehicles that cross into another
+  tile, plus a (tiles, tiles) count matrix.
+* A barrier. A tick is two phases: move (read current buffer, write next
+  buffer, post migrants), then receive (pick up migrants, clear the cells
+  this tile's vehicles left in the current buffer).
+
+If a tile raises (a full mailbox, say), its worker aborts the barrier so
+the other workers stop waiting, and every worker reports back; the parent
+re-raises the first real error and the engine refuses further steps. The
+barrier and the parent's waits time out after BARRIER_TIMEOUT seconds per
+tick, so a stuck or dead worker is an error too, never a hang.
+
+The update is a pure function of the occupancy at tick t, the light phase
+(which depends only on the tick and the crossing) and a counter-based hash
+of (seed, vehicle id, tick). Results do not depend on the number of tiles
+or workers, and ``SerialTileEngine`` gives the same trajectories in-process.
+
+Map model: one-way streets every ``block`` cells in both axes, alternating
+direction (even streets go +x / +y, odd ones -x / -y), torus wrap. A
+vehicle may turn onto the crossing street when it stands on a crossing.
+Only one direction is green at a crossing, so a cell never has two
+candidates to enter it in the same tick.
+"""
+import threading
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HORIZONTAL, VERTICAL = 0, 1  # Same codes as Evidencia1.Direction
+
+BARRIER_TIMEOUT = 60.0  # Seconds a worker waits for the others at a phase barrier
+POLL = 0.1  # Seconds between the parent's checks on a worker it is waiting for
+
+
+def lattice_city(width, height, block=10):
+    """Return the road mask (width, height) of a grid city with a street every block cells."""
+    if width % block or height % block:
+        raise ValueError("width and height must be multiples of block")
+    xs = np.arange(width) % block == 0
+    ys = np.arange(height) % block == 0
+    return xs[:, None] | ys[None, :]
+
+
+def _hash_uniform(seed, ids, tick):
+    """Counter-based uniform numbers in [0, 1) for (seed, id, tick) (splitmix64)."""
+    z = ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    z ^= np.uint64((seed + tick * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF)
+    z ^= z >> np.uint64(30)
+    z *= np.uint64(0xBF58476D1CE4E5B9)
+    z ^= z >> np.uint64(27)
+    z *= np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+class CityConfig:
+    """Map and rule parameters shared by every tile."""
+
+    def __init__(self, width, height, block=10, light_interval=10, p_turn=0.25, seed=0):
+        self.width = width
+        self.height = height
+        self.block = block
+        self.light_interval = light_interval
+        self.p_turn = p_turn
+        self.seed = seed
+
+    def light_green(self, x, y, direction, tick):
+        """Whether the light at crossing (x, y) lets the direction through at this tick.
+
+        Neighbouring crossings are offset by one phase so the city does not
+        switch all at once.
+        """
+        phase = (tick // self.light_interval + x // self.block + y // self.block) % 2
+        return phase == direction
+
+    def step_vectors(self, x, y, direction):
+        """Unit step (dx, dy) of each vehicle for its street and direction."""
+        b = self.block
+        dx = np.where(direction == HORIZONTAL, 1 - 2 * ((y // b) % 2), 0)
+        dy = np.where(direction == VERTICAL, 1 - 2 * ((x // b) % 2), 0)
+        return dx, dy
+
+
+def place_vehicles(config, density, seed=None):
+    """Pick distinct road cells (not crossings) for round(density * roads) vehicles.
+
+    Returns (ids, x, y, direction) int32 arrays sorted by id.
+    """
+    road = lattice_city(config.width, config.height, config.block)
+    b = config.block
+    cross = (np.arange(config.width) % b == 0)[:, None] & (np.arange(config.height) % b == 0)[None, :]
+    cells = np.flatnonzero(road & ~cross)
+    rng = np.random.default_rng(config.seed if seed is None else seed)
+    n = int(round(density * len(cells)))
+    chosen = np.sort(rng.choice(cells, size=n, replace=False))
+    x, y = np.divmod(chosen, config.height)
+    direction = np.where(y % b == 0, HORIZONTAL, VERTICAL)
+    return (np.arange(n, dtype=np.int32), x.astype(np.int32), y.astype(np.int32), direction.astype(np.int32))
+
+
+class Tile:
+    """The vehicles inside one rectangle [x0, x1) x [y0, y1) of the map."""
+
+    def __init__(self, index, bounds, config, tiles_x, tiles_y, x_edges, y_edges):
+        self.index = index
+        self.x0, self.x1, self.y0, self.y1 = bounds
+        self.config = config
+        self.tiles_x = tiles_x
+        self.tiles_y = tiles_y
+        self.x_edges = x_edges  # Start column of each tile column (for owner lookup)
+        self.y_edges = y_edges
+        self.ids = np.zeros(0, dtype=np.int32)
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.direction = np.zeros(0, dtype=np.int32)
+        self._left_x = self.x  # Cells vacated this tick, cleared in receive()
+        self._left_y = self.y
+
+    def owner(self, x, y):
+        tx = np.searchsorted(self.x_edges, x, side="right") - 1
+        ty = np.searchsorted(self.y_edges, y, side="right") - 1
+        return ty * self.tiles_x + tx
+
+    def adopt(self, ids, x, y, direction):
+        self.ids = np.concatenate([self.ids, ids]).astype(np.int32)
+        self.x = np.concatenate([self.x, x]).astype(np.int32)
+        self.y = np.concatenate([self.y, y]).astype(np.int32)
+        self.direction = np.concatenate([self.direction, direction]).astype(np.int32)
+
+    def move(self, current, following, tick):
+        """Move phase: read current occupancy, write following, return migrants by tile.
+
+        Returns a dict {tile index: (n, 4) int32 array of (id, x, y, direction)}.
+        """
+        cfg = self.config
+        if len(self.ids) == 0:
+            self._left_x, self._left_y = self.x, self.y
+            return {}
+        x, y = self.x, self.y
+        at_cross = (x % cfg.block == 0) & (y % cfg.block == 0)
+        turn = at_cross & (_hash_uniform(cfg.seed, self.ids, tick) < cfg.p_turn)
+        direction = np.where(turn, 1 - self.direction, self.direction)
+        dx, dy = cfg.step_vectors(x, y, direction)
+        nx = (x + dx) % cfg.width
+        ny = (y + dy) % cfg.height
+
+        # Enter the next cell only if it was free at tick t and, for a
+        # crossing, its light is green for this direction
+        free = current[ny, nx] == 0
+        enters_cross = (nx % cfg.block == 0) & (ny % cfg.block == 0)
+        green = cfg.light_green(nx, ny, direction, tick)
+        moves = free & (~enters_cross | green)
+
+        self._left_x, self._left_y = x, y
+        self.x = np.where(moves, nx, x).astype(np.int32)
+        self.y = np.where(moves, ny, y).astype(np.int32)
+        self.direction = np.where(moves, direction, self.direction).astype(np.int32)
+        following[self.y, self.x] = self.ids + 1
+
+        inside = (self.x >= self.x0) & (self.x < self.x1) & (self.y >= self.y0) & (self.y < self.y1)
+        migrants = {}
+        if not inside.all():
+            leaving = ~inside
+            records = np.stack([self.ids[leaving], self.x[leaving], self.y[leaving], self.direction[leaving]], axis=1)
+            owners = self.owner(self.x[leaving], self.y[leaving])
+            for dst in np.unique(owners):
+                migrants[int(dst)] = records[owners == dst]
+            self.ids, self.x, self.y, self.direction = (
+                self.ids[inside], self.x[inside], self.y[inside], self.direction[inside]
+            )
+        return migrants
+
+    def receive(self, current, arrivals):
+        """Receive phase: clear the cells left in current, adopt arriving vehicles."""
+        current[self._left_y, self._left_x] = 0
+        for records in arrivals:
+            if len(records):
+                self.adopt(records[:, 0], records[:, 1], records[:, 2], records[:, 3])
+
+    def state(self):
+        return self.ids, self.x, self.y, self.direction
+
+
+def _split(length, parts):
+    return np.linspace(0, length, parts + 1).astype(np.int64)
+
+
+def make_tiles(config, tiles_x, tiles_y):
+    x_edges = _split(config.width, tiles_x)
+    y_edges = _split(config.height, tiles_y)
+    tiles = []
+    for ty in range(tiles_y):
+        for tx in range(tiles_x):
+            bounds = (x_edges[tx], x_edges[tx + 1], y_edges[ty], y_edges[ty + 1])
+            tiles.append(Tile(len(tiles), bounds, config, tiles_x, tiles_y, x_edges[:-1], y_edges[:-1]))
+    return tiles
+
+
+def _distribute(tiles, vehicles):
+    ids, x, y, direction = vehicles
+    owners = tiles[0].owner(x, y)
+    for tile in tiles:
+        mine = owners == tile.index
+        tile.adopt(ids[mine], x[mine], y[mine], direction[mine])
+
+
+def _gather(states):
+    ids, x, y, direction = (np.concatenate(parts) for parts in zip(*states))
+    order = np.argsort(ids, kind="stable")
+    return ids[order], x[order], y[order], direction[order]
+
+
+class SerialTileEngine:
+    """Runs the tiles one after the other in this process (reference and fallback)."""
+
+    def __init__(self, config, vehicles, tiles_x=1, tiles_y=1):
+        self.config = config
+        self.tiles = make_tiles(config, tiles_x, tiles_y)
+        _distribute(self.tiles, vehicles)
+        self.occupancy = np.zeros((2, config.height, config.width), dtype=np.int32)
+        ids, x, y, _ = vehicles
+        self.occupancy[0, y, x] = ids + 1
+        self.tick = 0
+
+    def step(self, ticks=1):
+        for _ in range(ticks):
+            current = self.occupancy[self.tick % 2]
+            following = self.occupancy[(self.tick + 1) % 2]
+            mail = [tile.move(current, following, self.tick) for tile in self.tiles]
+            for tile in self.tiles:
+                tile.receive(current, [box[tile.index] for box in mail if tile.index in box])
+            self.tick += 1
+
+    def vehicles(self):
+        """(ids, x, y, direction) of every vehicle, sorted by id."""
+        return _gather([tile.state() for tile in self.tiles])
+
+    def close(self):
+        pass
+
+
+def _worker(tile, names, shapes, capacity, barrier, conn):
+    """Worker loop: run the requested number of ticks, reply with the tile state."""
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    occupancy = np.ndarray(shapes[0], dtype=np.int32, buffer=blocks[0].buf)
+    counts = np.ndarray(shapes[1], dtype=np.int32, buffer=blocks[1].buf)
+    mail = np.ndarray(shapes[2], dtype=np.int32, buffer=blocks[2].buf)
+    me = tile.index
+    try:
+        while True:
+            command, tick, ticks = conn.recv()
+            if command == "stop":
+                break
+            if command == "state":
+                conn.send(tile.state())
+                continue
+            try:
+                for t in range(tick, tick + ticks):
+                    current = occupancy[t % 2]
+                    migrants = tile.move(current, occupancy[(t + 1) % 2], t)
+                    counts[me, :] = 0
+                    for dst, records in migrants.items():
+                        if len(records) > capacity:
+                            raise RuntimeError(
+                                f"tile {me}: {len(records)} migrants exceed mailbox capacity {capacity}")
+                        mail[me, dst, : len(records)] = records
+                        counts[me, dst] = len(records)
+                    barrier.wait(BARRIER_TIMEOUT)
+                    arrivals = [mail[src, me, : counts[src, me]].copy()
+                                for src in range(counts.shape[0]) if counts[src, me]]
+                    tile.receive(current, arrivals)
+                    barrier.wait(BARRIER_TIMEOUT)
+            except Exception as exc:  # Release the other workers, then report to the parent
+                barrier.abort()
+                try:
+                    conn.send(("error", exc))
+                except Exception:  # The exception does not pickle
+                    conn.send(("error", RuntimeError(f"tile {me}: {type(exc).__name__}: {exc}")))
+                continue
+            conn.send(("done", tick + ticks))
+    finally:
+        for block in blocks:
+            block.close()
+
+
+class ParallelTileEngine:
+    """Steps each tile in its own worker process over shared memory.
+
+    Gives the same trajectories as SerialTileEngine for any tiling.
+    """
+
+    def __init__(self, config, vehicles, tiles_x=2, tiles_y=2, capacity=None):
+        self.config = config
+        tiles = make_tiles(config, tiles_x, tiles_y)
+        _distribute(tiles, vehicles)
+        n_tiles = len(tiles)
+        if capacity is None:
+            # A vehicle moves one cell per tick, so at most one tile border's worth of cells
+            capacity = max(config.width // tiles_x, config.height // tiles_y) + 1
+        shapes = [(2, config.height, config.width), (n_tiles, n_tiles), (n_tiles, n_tiles, capacity, 4)]
+        self._blocks = [
+            shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4) for shape in shapes
+        ]
+        occupancy = np.ndarray(shapes[0], dtype=np.int32, buffer=self._blocks[0].buf)
+        occupancy[:] = 0
+        ids, x, y, _ = vehicles
+        occupancy[0, y, x] = ids + 1
+        self.occupancy = occupancy
+        self.tick = 0
+
+        barrier = mp.Barrier(n_tiles)
+        self._barrier = barrier
+        self.error = None  # First error raised by a worker; the engine cannot step after it
+        names = [block.name for block in self._blocks]
+        self._conns = []
+        self._procs = []
+        for tile in tiles:
+            parent, child = mp.Pipe()
+            proc = mp.Process(target=_worker, args=(tile, names, shapes, capacity, barrier, child), daemon=True)
+            proc.start()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+    def _recv(self, i, timeout):
+        """Reply of worker i, or RuntimeError if it exits or is silent for timeout seconds."""
+        conn, proc = self._conns[i], self._procs[i]
+        deadline = time.monotonic() + timeout
+        while not conn.poll(POLL):
+            if not proc.is_alive():
+                raise RuntimeError(f"tile worker {i} exited with code {proc.exitcode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"tile worker {i} did not answer within {timeout:.0f} s")
+        try:
+            return conn.recv()
+        except EOFError:
+            raise RuntimeError(f"tile worker {i} exited with code {proc.exitcode}") from None
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("a tile worker failed; the engine cannot continue") from self.error
+
+    def step(self, ticks=1):
+        self._check()
+        errors = []
+        for i, conn in enumerate(self._conns):
+            try:
+                conn.send(("run", self.tick, ticks))
+            except (BrokenPipeError, OSError):
+                errors.append(RuntimeError(f"tile worker {i} exited with code {self._procs[i].exitcode}"))
+                self._barrier.abort()  # The others would wait for it at the first barrier
+        for i in range(len(self._conns)):
+            try:
+                status, reply = self._recv(i, BARRIER_TIMEOUT * (ticks + 1))
+            except RuntimeError as exc:
+                self._barrier.abort()
+                status, reply = "error", exc
+            if status == "error" and reply not in errors:
+                errors.append(reply)
+        if errors:
+            # The workers released by the aborted barrier only report BrokenBarrierError
+            real = [exc for exc in errors if not isinstance(exc, threading.BrokenBarrierError)]
+            self.error = (real or errors)[0]
+            raise self.error
+        self.tick += ticks
+
+    def vehicles(self):
+        """(ids, x, y, direction) of every vehicle, sorted by id."""
+        self._check()
+        for conn in self._conns:
+            conn.send(("state", self.tick, 0))
+        return _gather([self._recv(i, BARRIER_TIMEOUT) for i in range(len(self._conns))])
+
+    def close(self):
+        for conn, proc in zip(self._conns, self._procs):
+            if proc.is_alive():
+                try:
+                    conn.send(("stop", self.tick, 0))
+                except (BrokenPipeError, OSError):
+                    pass
+        for proc in self._procs:
+            proc.join(BARRIER_TIMEOUT)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+        self.occupancy = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def run(width=2000, height=2000, density=0.2, ticks=50, tiles_x=2, tiles_y=2, workers=True, seed=0):
+    """Build a lattice city, step it and return (engine state, ticks per second)."""
+    config = CityConfig(width, height, seed=seed)
+    vehicles = place_vehicles(config, density)
+    engine_cls = ParallelTileEngine if workers else SerialTileEngine
+    engine = engine_cls(config, vehicles, tiles_x, tiles_y)
+    try:
+        start = time.perf_counter()
+        engine.step(ticks)
+        rate = ticks / (time.perf_counter() - start)
+        return engine.vehicles(), rate
+    finally:
+        engine.close()
@@ -0,0 +1,406 @@
+"""Corridor compression and contraction hierarchies for cell-level road graphs.
+
+Evidencia1.TrafficModel keeps one networkx node per road cell, so every
+shortest-path query walks each cell of every corridor it considers. This
+module preprocesses such a graph (directed, unit length per cell step):
+
+* ``CorridorGraph`` keeps only the junctions (cells that are not in the
+  middle of a simple one-way or two-way chain) and replaces every chain
+  between two junctions by one weighted link. A link only stores its
+  length and its first cell; the cells in between are expanded lazily by
+  walking the original graph.
+* ``ContractionHierarchy`` contracts the junction graph (edge-difference
+  ordering, bounded witness searches) so a query is a bidirectional
+  Dijkstra over upward edges only.
+
+Both answer ``route(source, target)`` for any two road cells, including
+cells in the middle of a corridor, and return the same lengths as
+``nx.shortest_path``. Equal-length alternatives may differ.
+"""
+import heapq
+from itertools import count
+
+import networkx as nx
+
+EDGE_DIFFERENCE_WEIGHT = 2  # Weight of the edge difference in the contraction order
+INF = float("inf")
+
+
+def _is_chain(graph, node):
+    """True for a cell in the middle of a one-way or two-way corridor."""
+    preds = set(graph.predecessors(node))
+    succs = set(graph.successors(node))
+    neighbours = preds | succs
+    if len(neighbours) != 2 or node in neighbours:
+        return False
+    if len(preds) == 1 and len(succs) == 1:
+        return preds != succs  # One-way: in from one side, out to the other
+    return preds == succs == neighbours  # Two-way in both directions
+
+
+class CorridorGraph:
+    """Junction graph of a cell graph with degree-2 chains compressed into links."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.junctions = {node for node in graph if not _is_chain(graph, node)}
+        # out[u][w] = (length, first cell after u); the shortest chain wins
+        self.out = {u: {} for u in self.junctions}
+        # Every chain, parallel ones included: (u, first) -> (w, length)
+        self.chains = {}
+        # Interior cell -> [(u, first, offset from u)] for every chain through it
+        self.through = {}
+        for u in self.junctions:
+            for first in graph.successors(u):
+                self._trace(u, first)
+
+    def _walk(self, u, first):
+        """Yield the cells after u along the chain starting at first, up to the next junction."""
+        prev, node = u, first
+        while True:
+            yield node
+            if node in self.junctions:
+                return
+            nxt = [s for s in self.graph.successors(node) if s != prev]
+            if not nxt:
+                return  # Two-way dead end cannot happen for a chain; stop defensively
+            prev, node = node, nxt[0]
+
+    def _trace(self, u, first):
+        cells = []
+        for cell in self._walk(u, first):
+            cells.append(cell)
+        w = cells[-1]
+        if w not in self.junctions:
+            return  # Chain that never reaches a junction
+        length = len(cells)
+        self.chains[(u, first)] = (w, length)
+        for offset, cell in enumerate(cells[:-1], start=1):
+            self.through.setdefault(cell, []).append((u, first, offset))
+        best = self.out[u].get(w)
+        if best is None or (length, first) < best:
+            self.out[u][w] = (length, first)
+
+    def expand(self, u, w):
+        """Cells of the link u -> w after u (ending with w), walked lazily."""
+        _, first = self.out[u][w]
+        yield from self._walk(u, first)
+
+    def entry_points(self, source):
+        """Junctions reachable from source without passing another junction: [(junction, cost, chain)]."""
+        if source in self.junctions:
+            return [(source, 0, None)]
+        return [(self.chains[(u, first)][0], self.chains[(u, first)][1] - offset, (u, first))
+                for u, first, offset in self.through.get(source, ())]
+
+    def exit_points(self, target):
+        """Junctions from which target is reached without passing another junction: [(junction, cost, chain)]."""
+        if target in self.junctions:
+            return [(target, 0, None)]
+        return [(u, offset, (u, first)) for u, first, offset in self.through.get(target, ())]
+
+    def _same_link(self, source, target):
+        """(cost, chain) if source and target lie on the same chain, source first."""
+        best = None
+        for u, first, offset in self.through.get(source, ()):
+            for u2, first2, offset2 in self.through.get(target, ()):
+                if (u, first) == (u2, first2) and offset2 > offset:
+                    if best is None or offset2 - offset < best[0]:
+                        best = (offset2 - offset, (u, first))
+        return best
+
+    def junction_path(self, sources, targets):
+        """Dijkstra over the junction graph from several seeds to several exits.
+
+        sources / targets are lists of (junction, cost, link); returns
+        (length, [junctions]) or None.
+        """
+        dist, parent = {}, {}
+        heap, tie = [], count()
+        for node, cost, _ in sources:
+            if cost < dist.get(node, float("inf")):
+                dist[node] = cost
+                parent[node] = None
+                heapq.heappush(heap, (cost, next(tie), node))
+        exit_cost = {}
+        for node, cost, _ in targets:
+            exit_cost[node] = min(cost, exit_cost.get(node, float("inf")))
+        best, best_node = float("inf"), None
+        done = set()
+        while heap:
+            d, _, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            if d >= best:
+                break
+            done.add(u)
+            if u in exit_cost and d + exit_cost[u] < best:
+                best, best_node = d + exit_cost[u], u
+            for w, (length, _) in self.out[u].items():
+                nd = d + length
+                if nd < dist.get(w, float("inf")):
+                    dist[w] = nd
+                    parent[w] = u
+                    heapq.heappush(heap, (nd, next(tie), w))
+        if best_node is None:
+            return None
+        path = [best_node]
+        while parent[path[-1]] is not None:
+            path.append(parent[path[-1]])
+        return best, path[::-1]
+
+    def _cells(self, source, target, junctions):
+        """Expand a junction path (with the partial links at both ends) into cells."""
+        cells = [source]
+        first_j = junctions[0]
+        if source != first_j:
+            # Cheapest chain from source into the first junction
+            _, _, chain = min((cost, i, chain) for i, (j, cost, chain) in enumerate(self.entry_points(source))
+                              if j == first_j)
+            cells.extend(self._from(source, *chain))
+        for u, w in zip(junctions, junctions[1:]):
+            cells.extend(self.expand(u, w))
+        last_j = junctions[-1]
+        if target != last_j:
+            _, _, chain = min((cost, i, chain) for i, (j, cost, chain) in enumerate(self.exit_points(target))
+                              if j == last_j)
+            for cell in self._walk(*chain):
+                cells.append(cell)
+                if cell == target:
+                    break
+        return cells
+
+    def _from(self, source, u, first):
+        """Cells of chain (u, first) strictly after source (which lies on it)."""
+        seen = False
+        for cell in self._walk(u, first):
+            if seen:
+                yield cell
+            elif cell == source:
+                seen = True
+
+    def route(self, source, target):
+        """Cell-level shortest route (list of cells, both ends included)."""
+        if source == target:
+            return [source]
+        direct = self._same_link(source, target)
+        found = self.junction_path(self.entry_points(source), self.exit_points(target))
+        if direct is not None and (found is None or direct[0] <= found[0]):
+            return self._direct(source, target, direct[1])
+        if found is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}")
+        return self._cells(source, target, found[1])
+
+    def _direct(self, source, target, chain):
+        cells = [source]
+        for cell in self._from(source, *chain):
+            cells.append(cell)
+            if cell == target:
+                break
+        return cells
+
+    def stats(self):
+        links = sum(len(v) for v in self.out.values())
+        return {"cells": self.graph.number_of_nodes(), "junctions": len(self.junctions), "links": links}
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy over the junction graph of a CorridorGraph."""
+
+    def __init__(self, corridor, witness_settle_limit=60):
+        self.corridor = corridor
+        self.witness_settle_limit = witness_settle_limit
+        out = {u: {w: length for w, (length, _) in links.items() if w != u} for u, links in corridor.out.items()}
+        inc = {u: {} for u in out}
+        for u, links in out.items():
+            for w, length in links.items():
+                inc[w][u] = length
+        self.middle = {}  # (u, w) -> contracted junction of a shortcut
+        self.rank = {}
+        self._contract(out, inc)
+
+    def _witness(self, out, source, avoid, limit):
+        """Distances from source (not through avoid) up to limit, bounded settle count."""
+        dist = {source: 0}
+        heap, tie = [(0, 0, source)], count(1)
+        settled = 0
+        while heap and settled < self.witness_settle_limit:
+            d, _, u = heapq.heappop(heap)
+            if d > dist.get(u, float("inf")) or d > limit:
+                continue
+            settled += 1
+            for w, length in out[u].items():
+                if w == avoid:
+                    continue
+                nd = d + length
+                if nd < dist.get(w, float("inf")):
+                    dist[w] = nd
+                    heapq.heappush(heap, (nd, next(tie), w))
+        return dist
+
+    def _shortcuts(self, out, inc, v):
+        """Shortcuts needed to contract v: [(u, x, weight)]."""
+        needed = []
+        for u, w_in in inc[v].items():
+            limit = w_in + max(out[v].values(), default=0)
+            dist = self._witness(out, u, v, limit)
+            for x, w_out in out[v].items():
+                if x == u:
+                    continue
+                weight = w_in + w_out
+                if dist.get(x, float("inf")) > weight:
+                    needed.append((u, x, weight))
+        return needed
+
+    def _priority(self, out, inc, v, contracted_neighbours, level):
+        """Edge difference plus contracted neighbours and level, which spread contraction evenly."""
+        shortcuts = len(self._shortcuts(out, inc, v))
+        edge_difference = shortcuts - len(out[v]) - len(inc[v])
+        return EDGE_DIFFERENCE_WEIGHT * edge_difference + contracted_neighbours.get(v, 0) + level.get(v, 0)
+
+    def _contract(self, out, inc):
+        self.up = {v: {} for v in out}  # Every edge, stored at its lower-ranked end
+        contracted_neighbours, level = {}, {}
+        heap, tie = [], count()
+        for v in out:
+            heapq.heappush(heap, (self._priority(out, inc, v, contracted_neighbours, level), next(tie), v))
+        order = 0
+        while heap:
+            _, _, v = heapq.heappop(heap)
+            if v in self.rank:
+                continue
+            # Lazy update: re-evaluate, and put back if it is no longer the minimum
+            priority = self._priority(out, inc, v, contracted_neighbours, level)
+            if heap and priority > heap[0][0]:
+                heapq.heappush(heap, (priority, next(tie), v))
+                continue
+            for u, x, weight in self._shortcuts(out, inc, v):
+                if weight < out[u].get(x, float("inf")):
+                    out[u][x] = weight
+                    inc[x][u] = weight
+                    self.middle[(u, x)] = v
+            self.rank[v] = order
+            order += 1
+            for w, length in out[v].items():
+                self.up[v][w] = length
+                del inc[w][v]
+                contracted_neighbours[w] = contracted_neighbours.get(w, 0) + 1
+                level[w] = max(level.get(w, 0), level.get(v, 0) + 1)
+            for u, length in inc[v].items():
+                self.up[u][v] = length
+                del out[u][v]
+                contracted_neighbours[u] = contracted_neighbours.get(u, 0) + 1
+                level[u] = max(level.get(u, 0), level.get(v, 0) + 1)
+            out[v], inc[v] = {}, {}
+        # Forward search follows u -> w with rank[w] > rank[u]; the backward
+        # search follows u -> w in reverse when rank[u] > rank[w]
+        self.forward = {u: {w: d for w, d in links.items() if self.rank[w] > self.rank[u]} for u, links in self.up.items()}
+        backward = {v: {} for v in self.rank}
+        for u, links in self.up.items():
+            for w, d in links.items():
+                if self.rank[u] > self.rank[w]:
+                    backward[w][u] = d  # Edge u -> w, searched from w up to u
+        self.backward = backward
+        del self.up
+
+    @staticmethod
+    def _upward(seeds, edges):
+        """Dijkstra over upward edges from several seeds; returns (dist, parent) of every reached node."""
+        dist, parent = {}, {}
+        heap = []
+        for node, cost, _ in seeds:
+            if cost < dist.get(node, INF):
+                dist[node] = cost
+                parent[node] = None
+                heap.append((cost, node))
+        heapq.heapify(heap)
+        pop, push = heapq.heappop, heapq.heappush
+        while heap:
+            d, u = pop(heap)
+            if d > dist[u]:
+                continue
+            for w, length in edges[u].items():
+                nd = d + length
+                if nd < dist.get(w, INF):
+                    dist[w] = nd
+                    parent[w] = u
+                    push(heap, (nd, w))
+        return dist, parent
+
+    def junction_path(self, sources, targets):
+        """Upward searches from both ends, meeting at the cheapest common node.
+
+        Returns (length, [junctions]) or None.
+        """
+        f_dist, f_parent = self._upward(sources, self.forward)
+        b_dist, b_parent = self._upward(targets, self.backward)
+        best, meet = INF, None
+        for node, d in f_dist.items():
+            other = b_dist.get(node)
+            if other is not None and d + other < best:
+                best, meet = d + other, node
+        if meet is None:
+            return None
+        up = [meet]
+        while f_parent[up[-1]] is not None:
+            up.append(f_parent[up[-1]])
+        down = [meet]
+        while b_parent[down[-1]] is not None:
+            down.append(b_parent[down[-1]])
+        return best, self._unpack(up[::-1] + down[1:])
+
+    def _unpack(self, path):
+        """Replace shortcuts by the junctions they skip."""
+        result = [path[0]]
+        stack = list(zip(path, path[1:]))[::-1]
+        while stack:
+            u, w = stack.pop()
+            m = self.middle.get((u, w))
+            if m is None:
+                result.append(w)  # Original link of the junction graph
+            else:
+                stack.append((m, w))
+                stack.append((u, m))
+        return result
+
+    def route(self, source, target):
+        """Cell-level shortest route using the hierarchy for the junction part."""
+        corridor = self.corridor
+        if source == target:
+            return [source]
+        direct = corridor._same_link(source, target)
+        found = self.junction_path(corridor.entry_points(source), corridor.exit_points(target))
+        if direct is not None and (found is None or direct[0] <= found[0]):
+            return corridor._direct(source, target, direct[1])
+        if found is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}")
+        return corridor._cells(source, target, found[1])
+
+    def stats(self):
+        edges = sum(len(v) for v in self.forward.values()) + sum(len(v) for v in self.backward.values())
+        return {"junctions": len(self.rank), "shortcuts": len(self.middle), "search_edges": edges}
+
+
+def lattice_road_graph(width, height, block=10):
+    """Directed cell graph of a grid city: one-way streets every block cells, alternating direction.
+
+    The same street layout as parallel_traffic.lattice_city, without torus
+    wrap. Streets end at the last street of the other axis and the outer
+    ring is two-way, so every cell is reachable from every other one.
+    """
+    last_x = (width - 1) // block * block
+    last_y = (height - 1) // block * block
+    graph = nx.DiGraph()
+    for y in range(0, last_y + 1, block):
+        xs = range(last_x + 1) if (y // block) % 2 == 0 else range(last_x, -1, -1)
+        nx.add_path(graph, [(x, y) for x in xs])
+    for x in range(0, last_x + 1, block):
+        ys = range(last_y + 1) if (x // block) % 2 == 0 else range(last_y, -1, -1)
+        nx.add_path(graph, [(x, y) for y in ys])
+    for y in (0, last_y):
+        nx.add_path(graph, [(x, y) for x in range(last_x + 1)])
+        nx.add_path(graph, [(x, y) for x in range(last_x, -1, -1)])
+    for x in (0, last_x):
+        nx.add_path(graph, [(x, y) for y in range(last_y + 1)])
+        nx.add_path(graph, [(x, y) for y in range(last_y, -1, -1)])
+    return graph
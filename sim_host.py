@@ -0,0 +1,509 @@
+"""Many model instances behind one port: an asyncio host with a tick budget per model.
+
+Every visualization script runs one model in its own server on a fixed
+port. ``SimulationHost`` owns any number of scenarios (any of the models
+in PRESETS) and interleaves their step() calls on one event loop:
+
+* Each scenario has a tick rate (ticks per second, or None for "as fast as
+  its share allows"). A token bucket refills at that rate, holding at most
+  BURST seconds of ticks, so a scenario that fell behind catches up a
+  little but never floods the loop.
+* Scenarios stepped in the event loop ("inline") step until their budget
+  or a SLICE of wall time is used up, then the loop serves requests and
+  the next scenario. A slow model therefore delays the others by at most
+  SLICE per round instead of a whole batch.
+* With processes > 0, scenarios are offloaded to worker processes that
+  keep the model in memory. The host sends "step n ticks" over a pipe and
+  waits for the reply through the event loop (add_reader), so heavy models
+  run in parallel and never block it. Offloaded batches are sized to take
+  about REMOTE_BATCH seconds.
+* A scenario whose step() raises is marked failed: it is never stepped
+  again and its error is reported in /scenarios, while the others go on.
+
+HTTP/WebSocket API (JSON), on one port:
+
+    GET    /scenarios                         every scenario: tick, rate, achieved rate, where it runs, error
+    POST   /scenarios                         {"name", "model", "kwargs", "rate", "offload"} -> add one
+    GET    /scenarios/<name>                  snapshot: tick and [unique_id, x, y] of every agent
+    POST   /scenarios/<name>/rate?ticks_per_second=R   change the budget (empty: unlimited)
+    DELETE /scenarios/<name>
+    WS     /scenarios/<name>/stream?fps=F     pushes the snapshot at most F times per second
+
+"model" must be a preset name from PRESETS (kwargs are merged over its
+defaults); anything else is rejected with 400, so a request can never
+import or call arbitrary code. The server listens on 127.0.0.1 unless
+--address says otherwise.
+
+Usage: python sim_host.py [--address 127.0.0.1] [--port 8525] [--processes N] [--preset evidencia1] [--count K]
+       [--rate R]
+"""
+import argparse
+import asyncio
+import collections
+import importlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import tornado.web
+import tornado.websocket
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for path in (os.path.join(ROOT, "graph"), os.path.join(ROOT, "simulationtion", "trafic_sumulation")):
+    if path not in sys.path:
+        sys.path.append(path)
+
+SLICE = 0.005  # Seconds of inline stepping before yielding to the event loop
+BURST = 1.0  # Seconds of ticks a scenario's budget can hold
+REMOTE_BATCH = 0.05  # Target seconds per offloaded step batch
+IDLE = 0.05  # Longest sleep of the scheduler when nothing is due
+
+# name -> (model spec, default kwargs)
+PRESETS = {
+    "evidencia1": ("Evidencia1:TrafficModel", {"M": 24, "N": 24, "light_interval": 10}),
+    "evidencia1.demand": ("Evidencia1:TrafficModel", {"M": 24, "N": 24, "light_interval": 10, "demand_rate": 1.0}),
+    "vacuum": ("VacumModel:VacuumModel",
+               {"n_vacuums": 2, "n_trash": 40, "width": 30, "height": 30, "search_algorithm": "astar"}),
+    "m1_actividad": ("M1_Actividad:VacuumModel", {"M": 20, "N": 20, "num_agents": 2, "dirty_percentage": 0.3}),
+    "m1_ractivo": ("M1_Ractivo:VacuumModel", {"M": 20, "N": 20, "num_agents": 2, "dirty_percentage": 0.3}),
+    "simulation": ("model:TrafficModel", {"M": 50, "N": 50, "light_interval": 10}),
+}
+
+
+# The only model classes build() will import
+MODELS = frozenset(spec for spec, _ in PRESETS.values())
+
+
+def resolve(model, kwargs=None):
+    """(spec, kwargs) for a preset name."""
+    if model not in PRESETS:
+        raise ValueError(f"unknown model {model!r}; expected one of {sorted(PRESETS)}")
+    if kwargs is not None and not isinstance(kwargs, dict):
+        raise ValueError("kwargs must be an object")
+    spec, defaults = PRESETS[model]
+    return spec, {**defaults, **(kwargs or {})}
+
+
+def build(spec, kwargs):
+    if spec not in MODELS:
+        raise ValueError(f"model {spec!r} is not a preset")
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)(**kwargs)
+
+
+def snapshot(model):
+    return {
+        "tick": model.schedule.steps,
+        "agents": [[str(a.unique_id), a.pos[0], a.pos[1]] for a in model.schedule.agents if a.pos is not None],
+    }
+
+
+def _worker(conn):
+    """Worker process loop: owns models by name and answers one request at a time, in order."""
+    models = {}
+    while True:
+        op, name, *args = conn.recv()
+        if op == "close":
+            conn.send((True, None))
+            return
+        try:
+            if op == "create":
+                models[name] = build(*args)
+                reply = models[name].schedule.steps
+            elif op == "step":
+                model = models[name]
+                start = time.perf_counter()
+                for _ in range(args[0]):
+                    model.step()
+                reply = (model.schedule.steps, time.perf_counter() - start)
+            elif op == "snapshot":
+                reply = snapshot(models[name])
+            elif op == "remove":
+                reply = models.pop(name, None) is not None
+            else:
+                raise ValueError(f"unknown request {op!r}")
+            conn.send((True, reply))
+        except Exception as exc:  # Report to the host instead of killing the worker
+            conn.send((False, f"{type(exc).__name__}: {exc}"))
+
+
+class WorkerProcess:
+    """A worker process and the futures of its pending requests (answered in order)."""
+
+    def __init__(self):
+        self.conn, child = mp.Pipe()
+        self.process = mp.Process(target=_worker, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.pending = collections.deque()
+        self.scenarios = 0
+        self.dead = False  # The process exited; every call fails
+        self._loop = None
+
+    def _readable(self):
+        while self.conn.poll():
+            try:
+                ok, reply = self.conn.recv()
+            except (EOFError, OSError):
+                self._lost()
+                return
+            future = self.pending.popleft()
+            if future.cancelled():
+                continue
+            if ok:
+                future.set_result(reply)
+            else:
+                future.set_exception(RuntimeError(reply))
+
+    def _lost(self):
+        """The worker exited: fail its pending requests and stop watching the pipe."""
+        if self._loop is not None:
+            self._loop.remove_reader(self.conn.fileno())
+            self._loop = None
+        self.dead = True
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError(f"worker {self.process.pid} exited"))
+
+    async def call(self, *request):
+        if self.dead:
+            raise RuntimeError(f"worker {self.process.pid} exited")
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+            loop.add_reader(self.conn.fileno(), self._readable)
+        future = loop.create_future()
+        self.pending.append(future)
+        try:
+            self.conn.send(request)
+        except (BrokenPipeError, OSError):
+            self._lost()
+        return await future
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self.conn.fileno())
+        if self.process.is_alive():
+            self.conn.send(("close", None))
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class Scenario:
+    """One model instance, its tick budget and where it runs."""
+
+    def __init__(self, name, spec, kwargs, rate=None, worker=None):
+        self.name = name
+        self.spec = spec
+        self.kwargs = kwargs
+        self.rate = rate
+        self.worker = worker  # WorkerProcess, or None to step in the event loop
+        self.model = None  # Inline scenarios only
+        self.tick = 0
+        self.budget = 0.0
+        self.busy = False  # An offloaded batch is running
+        self.tick_seconds = None  # Running estimate of the cost of one tick
+        self.stepped = 0
+        self.started = time.monotonic()
+        self.error = None  # "Type: message" once step() raised; no more ticks
+
+    def fail(self, error):
+        self.error = error
+        self.budget = 0.0
+
+    def refill(self, dt):
+        if self.error is not None:
+            return
+        if self.rate is None:
+            self.budget = float("inf")
+        else:
+            self.budget = min(self.budget + self.rate * dt, max(self.rate * BURST, 1.0))
+
+    def measured(self, ticks, seconds):
+        if ticks:
+            cost = seconds / ticks
+            self.tick_seconds = cost if self.tick_seconds is None else 0.8 * self.tick_seconds + 0.2 * cost
+
+    def info(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "name": self.name,
+            "model": self.spec,
+            "kwargs": self.kwargs,
+            "tick": self.tick,
+            "rate": self.rate,
+            "achieved_rate": self.stepped / elapsed if elapsed > 0 else 0.0,
+            "tick_ms": None if self.tick_seconds is None else self.tick_seconds * 1e3,
+            "where": "inline" if self.worker is None else f"worker {self.worker.process.pid}",
+            "error": self.error,
+        }
+
+
+class SimulationHost:
+    """Owns the scenarios and runs the scheduler; see the module docstring."""
+
+    def __init__(self, processes=0):
+        self.scenarios = {}
+        self.workers = [WorkerProcess() for _ in range(processes)]
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def add(self, name, model, kwargs=None, rate=None, offload=None):
+        if name in self.scenarios:
+            raise ValueError(f"scenario {name!r} already exists")
+        spec, kwargs = resolve(model, kwargs)
+        if offload is None:
+            offload = bool(self.workers)
+        worker = None
+        if offload:
+            if not self.workers:
+                raise ValueError("no worker processes to offload to")
+            live = [w for w in self.workers if not w.dead]
+            if not live:
+                raise RuntimeError("every worker process exited")
+            worker = min(live, key=lambda w: w.scenarios)
+        scenario = Scenario(name, spec, kwargs, rate, worker)
+        if worker is None:
+            scenario.model = build(spec, kwargs)
+            scenario.tick = scenario.model.schedule.steps
+        else:
+            worker.scenarios += 1
+            try:
+                scenario.tick = await worker.call("create", name, spec, kwargs)
+            except Exception:
+                worker.scenarios -= 1
+                raise
+        self.scenarios[name] = scenario
+        self._wake.set()
+        return scenario
+
+    async def remove(self, name):
+        scenario = self.scenarios.pop(name)
+        if scenario.worker is not None:
+            scenario.worker.scenarios -= 1
+            try:
+                await scenario.worker.call("remove", name)
+            except RuntimeError:
+                pass  # The worker died; the model went with it
+
+    def set_rate(self, name, rate):
+        scenario = self.scenarios[name]
+        scenario.rate = rate
+        scenario.budget = 0.0
+        self._wake.set()
+
+    async def state(self, name):
+        scenario = self.scenarios[name]
+        if scenario.worker is None:
+            return snapshot(scenario.model)
+        return await scenario.worker.call("snapshot", name)
+
+    def _step_inline(self, scenario):
+        """Step within the budget for at most SLICE seconds; a step that raises fails the scenario."""
+        model = scenario.model
+        start = now = time.perf_counter()
+        ticks = 0
+        try:
+            while scenario.budget >= 1 and now - start < SLICE:
+                model.step()
+                scenario.budget -= 1
+                ticks += 1
+                now = time.perf_counter()
+        except Exception as exc:  # Only this scenario stops; the host keeps scheduling the rest
+            scenario.fail(f"{type(exc).__name__}: {exc}")
+            now = time.perf_counter()
+        scenario.tick = model.schedule.steps
+        scenario.stepped += ticks
+        scenario.measured(ticks, now - start)
+
+    async def _step_remote(self, scenario):
+        cost = scenario.tick_seconds or REMOTE_BATCH
+        ticks = int(max(1, min(scenario.budget, REMOTE_BATCH / cost)))
+        scenario.budget -= ticks
+        scenario.busy = True
+        try:
+            scenario.tick, seconds = await scenario.worker.call("step", scenario.name, ticks)
+            scenario.stepped += ticks
+            scenario.measured(ticks, seconds)
+        except Exception as exc:  # The model raised in the worker, it was removed meanwhile or the worker died
+            scenario.fail(str(exc) if isinstance(exc, RuntimeError) else f"{type(exc).__name__}: {exc}")
+        finally:
+            scenario.busy = False
+            self._wake.set()
+
+    def _wait(self):
+        """Seconds until some scenario is due, capped at IDLE."""
+        wait = IDLE
+        for scenario in self.scenarios.values():
+            if scenario.busy or scenario.error is not None:
+                continue
+            if scenario.budget >= 1:
+                return 0
+            if scenario.rate:
+                wait = min(wait, (1 - scenario.budget) / scenario.rate)
+        return wait
+
+    async def run(self):
+        last = time.monotonic()
+        while True:
+            now = time.monotonic()
+            for scenario in list(self.scenarios.values()):
+                scenario.refill(now - last)
+            last = now
+            for scenario in list(self.scenarios.values()):
+                if scenario.busy or scenario.budget < 1 or self.scenarios.get(scenario.name) is not scenario:
+                    continue
+                if scenario.worker is None:
+                    self._step_inline(scenario)
+                    await asyncio.sleep(0)  # Let requests in between two scenarios
+                else:
+                    asyncio.get_running_loop().create_task(self._step_remote(scenario))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._wait())
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for worker in self.workers:
+            worker.close()
+
+    def make_app(self):
+        return tornado.web.Application([
+            (r"/scenarios", ScenariosHandler, {"host": self}),
+            (r"/scenarios/([^/]+)", ScenarioHandler, {"host": self}),
+            (r"/scenarios/([^/]+)/rate", RateHandler, {"host": self}),
+            (r"/scenarios/([^/]+)/stream", StreamHandler, {"host": self}),
+        ])
+
+
+class HostHandler(tornado.web.RequestHandler):
+    def initialize(self, host):
+        self.host = host
+
+    def write_json(self, data):
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(data))
+
+    def scenario(self, name):
+        if name not in self.host.scenarios:
+            raise tornado.web.HTTPError(404, f"no scenario {name!r}")
+        return name
+
+
+class ScenariosHandler(HostHandler):
+    def get(self):
+        self.write_json([scenario.info() for scenario in self.host.scenarios.values()])
+
+    async def post(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+            scenario = await self.host.add(body["name"], body["model"], body.get("kwargs"), body.get("rate"),
+                                           body.get("offload"))
+        except (KeyError, ValueError, TypeError, RuntimeError) as exc:
+            raise tornado.web.HTTPError(400, str(exc))
+        self.write_json(scenario.info())
+
+
+class ScenarioHandler(HostHandler):
+    async def get(self, name):
+        self.write_json(await self.host.state(self.scenario(name)))
+
+    async def delete(self, name):
+        await self.host.remove(self.scenario(name))
+        self.write_json({"removed": name})
+
+
+class RateHandler(HostHandler):
+    def post(self, name):
+        rate = self.get_argument("ticks_per_second", "")
+        try:
+            rate = float(rate) if rate else None
+        except ValueError:
+            raise tornado.web.HTTPError(400, "ticks_per_second must be a number")
+        if rate is not None and not rate >= 0:
+            raise tornado.web.HTTPError(400, "ticks_per_second must be >= 0")
+        self.host.set_rate(self.scenario(name), rate)
+        self.write_json(self.host.scenarios[name].info())
+
+
+class StreamHandler(tornado.websocket.WebSocketHandler):
+    """Pushes the scenario's snapshot at most fps times per second, when its tick changed."""
+
+    def initialize(self, host):
+        self.host = host
+        self._task = None
+
+    def open(self, name):
+        if name not in self.host.scenarios:
+            self.close(code=4004, reason=f"no scenario {name!r}")
+            return
+        self.name = name
+        try:
+            self.fps = float(self.get_argument("fps", "10"))
+        except ValueError:
+            self.fps = 0.0
+        if not 0 < self.fps < float("inf"):
+            self.close(code=4000, reason="fps must be a positive number")
+            return
+        self._task = asyncio.get_running_loop().create_task(self.push())
+
+    async def push(self):
+        period = 1.0 / self.fps
+        sent = None
+        try:
+            while self.name in self.host.scenarios:
+                scenario = self.host.scenarios[self.name]
+                if scenario.tick != sent:
+                    state = await self.host.state(self.name)
+                    await self.write_message(json.dumps(state))
+                    sent = state["tick"]
+                await asyncio.sleep(period)
+        except (tornado.websocket.WebSocketClosedError, KeyError, RuntimeError):
+            pass
+
+    def on_close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+async def serve(host, port, scenarios=(), address="127.0.0.1"):
+    for name, model, kwargs, rate in scenarios:
+        await host.add(name, model, kwargs, rate)
+    host.make_app().listen(port, address=address)
+    host.start()
+    print(f"simulation host on http://{address}:{port} ({len(host.scenarios)} scenarios, "
+          f"{len(host.workers)} worker processes)")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many model instances behind one HTTP/WebSocket port")
+    parser.add_argument("--address", default="127.0.0.1", help="interface to listen on (default: local only)")
+    parser.add_argument("--port", type=int, default=8525)
+    parser.add_argument("--processes", type=int, default=0, help="worker processes for offloaded scenarios")
+    parser.add_argument("--preset", choices=sorted(PRESETS), help="start with --count scenarios of this model")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--rate", type=float, help="ticks per second of each starting scenario")
+    args = parser.parse_args(argv)
+
+    host = SimulationHost(args.processes)
+    scenarios = [(f"{args.preset}-{i}", args.preset, None, args.rate) for i in range(args.count if args.preset else 0)]
+    try:
+        asyncio.run(serve(host, args.port, scenarios, args.address))
+    finally:
+        host.stop()
+
+
+if __name__ == "__main__":
+    main()
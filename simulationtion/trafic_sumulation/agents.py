@@ -1,143 +1,87 @@
 # agents.py
+from enum import IntEnum
 from mesa import Agent
-import random
+
+# Integer codes for agent state instead of strings
+class Direction(IntEnum):
+    HORIZONTAL = 0
+    VERTICAL = 1
+
+class LightState(IntEnum):
+    RED = 0
+    GREEN = 1
 
 class BoundaryAgent(Agent):
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
 
-class CarAgent(Agent):
-    def __init__(self, unique_id, model, start_pos, direction):
-        super().__init__(unique_id, model)
-        self.direction = direction
-        self.start_pos = start_pos
+class VehicleAgent(Agent):
+    """Base class for every vehicle type.
+
+    Vehicles do not step themselves: the model's LaneEngine (lanes.py) moves
+    all vehicles of a lane at once. Each type only describes how it drives
+    through these class attributes, read once when the vehicle is added:
+
+    - step_size: cells advanced per tick.
+    - stop_probability: chance of holding at the stop cell while the light is
+      red (1 always stops, 0 ignores lights).
+    - dwell_steps: ticks spent at each bus stop.
+    """
+    __slots__ = ("direction", "start_pos", "stop_pos", "bus_stops", "lane", "index")
 
-    def step(self):
-        # Determine the position one cell before the traffic light
-        if self.direction == "horizontal":
-            stop_pos = (self.model.traffic_light_positions[0][0] - 1, self.start_pos[1])
-        else:
-            stop_pos = (self.start_pos[0], self.model.traffic_light_positions[2][1] - 1)
-
-        # Stop at red light
-        light_green = self.model.is_light_green(self.direction)
-        if self.pos == stop_pos and not light_green:
-            return  # Stop if the light is red for this direction
-
-        # Move towards the opposite edge and reappear if at the edge
-        self.move_and_wrap()
-
-    def move_and_wrap(self):
-        x, y = self.pos
-        step_size = 1
-        if self.direction == "horizontal":
-            next_x = x + step_size if x + step_size < self.model.grid.width else (x + step_size) % self.model.grid.width
-            next_pos = (next_x, y)
-        else:
-            next_y = y + step_size if y + step_size < self.model.grid.height else (y + step_size) % self.model.grid.height
-            next_pos = (x, next_y)
-
-        # Move to the next position
-        self.model.grid.move_agent(self, next_pos)
-
-class EmergencyVehicleAgent(Agent):
-    def __init__(self, unique_id, model, start_pos, direction):
+    step_size = 1
+    stop_probability = 1.0
+    dwell_steps = 0
+
+    def __init__(self, unique_id, model, start_pos, direction, bus_stops=()):
         super().__init__(unique_id, model)
         self.direction = direction
         self.start_pos = start_pos
+        self.bus_stops = list(bus_stops)
+        # The position one cell before the traffic light, computed once
+        self.stop_pos = model.stop_position(start_pos, direction) if self.stop_probability > 0 else None
+        self.lane = None  # Set by the LaneEngine
+        self.index = None
+
+class CarAgent(VehicleAgent):
+    __slots__ = ()
 
-    def step(self):
-        self.move_and_wrap()
+class EmergencyVehicleAgent(VehicleAgent):
+    __slots__ = ()
 
-    def move_and_wrap(self):
-        x, y = self.pos
-        step_size = 2  # Higher speed for emergency vehicles
-        if self.direction == "horizontal":
-            next_x = x + step_size if x + step_size < self.model.grid.width else (x + step_size) % self.model.grid.width
-            next_pos = (next_x, y)
-        else:
-            next_y = y + step_size if y + step_size < self.model.grid.height else (y + step_size) % self.model.grid.height
-            next_pos = (x, next_y)
+    step_size = 2  # Higher speed for emergency vehicles
+    stop_probability = 0.0  # Move regardless of traffic lights
 
-        # Move regardless of traffic lights
-        self.model.grid.move_agent(self, next_pos)
+class BusAgent(VehicleAgent):
+    __slots__ = ()
+
+    stop_probability = 0.0
+    dwell_steps = 5  # Stop for several steps to simulate a full stop for passengers
 
-class BusAgent(Agent):
     def __init__(self, unique_id, model, start_pos, direction, bus_stops):
-        super().__init__(unique_id, model)
-        self.direction = direction
-        self.start_pos = start_pos
-        self.bus_stops = bus_stops  # List of positions where the bus will stop
-        self.stop_counter = 0  # Counts steps to simulate a full stop for dropping off/picking up
-
-    def step(self):
-        if self.pos in self.bus_stops:
-            # Stop at bus stops for several steps to simulate a full stop for passengers
-            if self.stop_counter < 5:
-                self.stop_counter += 1
-                return
-            else:
-                self.stop_counter = 0  # Reset counter after the stop
-
-        # Move towards the opposite edge and reappear if at the edge
-        self.move_and_wrap()
-
-    def move_and_wrap(self):
-        x, y = self.pos
-        step_size = 1
-        if self.direction == "horizontal":
-            next_x = x + step_size if x + step_size < self.model.grid.width else (x + step_size) % self.model.grid.width
-            next_pos = (next_x, y)
-        else:
-            next_y = y + step_size if y + step_size < self.model.grid.height else (y + step_size) % self.model.grid.height
-            next_pos = (x, next_y)
-
-        # Move to the next position
-        self.model.grid.move_agent(self, next_pos)
-
-class AggressiveDriverAgent(Agent):
-    def __init__(self, unique_id, model, start_pos, direction):
-        super().__init__(unique_id, model)
-        self.direction = direction
-        self.start_pos = start_pos
+        super().__init__(unique_id, model, start_pos, direction, bus_stops)
 
-    def step(self):
-        # Determine the position one cell before the traffic light
-        if self.direction == "horizontal":
-            stop_pos = (self.model.traffic_light_positions[0][0] - 1, self.start_pos[1])
-        else:
-            stop_pos = (self.start_pos[0], self.model.traffic_light_positions[2][1] - 1)
-
-        # Tends to ignore yellow lights or proceed just as the light turns red
-        light_green = self.model.is_light_green(self.direction)
-        if self.pos == stop_pos and not light_green and random.random() < 0.8:
-            return  # 80% chance to ignore yellow or proceed quickly
-
-        # Move towards the opposite edge and reappear if at the edge
-        self.move_and_wrap()
-
-    def move_and_wrap(self):
-        x, y = self.pos
-        step_size = 1
-        if self.direction == "horizontal":
-            next_x = x + step_size if x + step_size < self.model.grid.width else (x + step_size) % self.model.grid.width
-            next_pos = (next_x, y)
-        else:
-            next_y = y + step_size if y + step_size < self.model.grid.height else (y + step_size) % self.model.grid.height
-            next_pos = (x, next_y)
-
-        # Move to the next position
-        self.model.grid.move_agent(self, next_pos)
+class AggressiveDriverAgent(VehicleAgent):
+    __slots__ = ()
+
+    # Tends to ignore yellow lights or proceed just as the light turns red
+    stop_probability = 0.8
 
 class TrafficLightAgent(Agent):
+    __slots__ = ("state", "orientation")
+
     def __init__(self, unique_id, model, pos, orientation):
         super().__init__(unique_id, model)
         self.pos = pos
-        self.state = "red"
+        self.state = LightState.RED
         self.orientation = orientation
 
     def turn_green(self):
-        self.state = "green"
+        self.state = LightState.GREEN
+        self.model.phase_green[self.orientation] = True
 
     def turn_red(self):
-        self.state = "red"
+        self.state = LightState.RED
+        self.model.phase_green[self.orientation] = False
@@ -0,0 +1,242 @@
+# lanes.py
+import time
+import numpy as np
+from agents import Direction
+
+
+def nasch_update(coord, velocity, vmax, length, p_slow, rng, limit=None):
+    """One Nagel-Schreckenberg update of a ring lane, in place.
+
+    coord and velocity are the vehicles' cells and speeds; vmax may be a
+    scalar or per-vehicle array. limit optionally caps how far each vehicle
+    may drive this tick (red lights, bus stops). Vehicles never overtake, so
+    the order along the ring is kept; coord does not need to be sorted.
+    """
+    n = len(coord)
+    if n == 0:
+        return velocity
+    order = np.argsort(coord, kind="stable")
+    ahead = np.roll(order, -1)
+    # Free cells up to the next vehicle; a lone vehicle sees the whole ring
+    gap = (coord[ahead] - coord[order] - 1) % length
+    gap[coord[ahead] == coord[order]] = 0
+    if n == 1:
+        gap[:] = length - 1
+    gaps = np.empty(n, dtype=np.int64)
+    gaps[order] = gap
+
+    velocity = np.minimum(velocity + 1, vmax)  # 1. accelerate
+    velocity = np.minimum(velocity, gaps)  # 2. brake for the vehicle ahead
+    if limit is not None:
+        velocity = np.minimum(velocity, limit)
+    slow = rng.random(n) < p_slow  # 3. randomize
+    velocity[slow] = np.maximum(velocity[slow] - 1, 0)
+    coord += velocity  # 4. move
+    coord %= length
+    return velocity
+
+
+def fundamental_diagram(length, densities, vmax=5, p_slow=0.2, ticks=200, warmup=100, seed=None):
+    """Measure flow (vehicles per cell per tick) on a ring lane for each density.
+
+    Returns a list of (density, flow, cell_updates_per_second).
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for density in densities:
+        n = int(length * density)
+        coord = np.sort(rng.choice(length, size=n, replace=False)).astype(np.int64)
+        velocity = np.zeros(n, dtype=np.int64)
+        for _ in range(warmup):
+            velocity = nasch_update(coord, velocity, vmax, length, p_slow, rng)
+        moved = 0
+        start = time.perf_counter()
+        for _ in range(ticks):
+            velocity = nasch_update(coord, velocity, vmax, length, p_slow, rng)
+            moved += int(velocity.sum())
+        elapsed = time.perf_counter() - start
+        flow = moved / (ticks * length)
+        results.append((density, flow, length * ticks / elapsed))
+    return results
+
+
+class Lane:
+    """All vehicles driving along one row (horizontal) or one column (vertical).
+
+    Vehicle state lives in parallel NumPy arrays indexed by vehicle.index, so
+    a tick of the whole lane is a few vectorized operations instead of one
+    step() call per vehicle. add() only queues a vehicle; the arrays are
+    extended once for all the queued vehicles by build(), before they are read.
+    """
+
+    def __init__(self, direction, index, length):
+        self.direction = direction
+        self.index = index  # y of the row, or x of the column
+        self.length = length
+        self.vehicles = []
+        self.coord = np.zeros(0, dtype=np.int32)  # Position along the lane
+        self.speed = np.zeros(0, dtype=np.int32)
+        self.stop = np.zeros(0, dtype=np.int32)  # Stop cell before the light, -1 if none
+        self.stop_probability = np.zeros(0, dtype=np.float64)
+        self.dwell_steps = np.zeros(0, dtype=np.int32)
+        self.counter = np.zeros(0, dtype=np.int32)  # Ticks waited at the current bus stop
+        self.velocity = np.zeros(0, dtype=np.int64)  # Only used in "nasch" mode
+        self.bus_stop = np.zeros((0, length), dtype=bool)
+        self.added = []  # (coord, speed, stop, stop probability, dwell steps, bus stop cells) not built yet
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def along(self, pos):
+        return pos[0] if self.direction == Direction.HORIZONTAL else pos[1]
+
+    def cell(self, coord):
+        if self.direction == Direction.HORIZONTAL:
+            return (int(coord), self.index)
+        return (self.index, int(coord))
+
+    def add(self, vehicle, pos):
+        vehicle.lane = self
+        vehicle.index = len(self.vehicles)
+        self.vehicles.append(vehicle)
+        self.added.append((
+            self.along(pos),
+            vehicle.step_size,
+            -1 if vehicle.stop_pos is None else self.along(vehicle.stop_pos),
+            vehicle.stop_probability,
+            vehicle.dwell_steps,
+            [self.along(stop) for stop in vehicle.bus_stops],
+        ))
+
+    def build(self):
+        """Append the vehicles queued by add() to the arrays, one concatenation per array."""
+        if not self.added:
+            return
+        coord, speed, stop, stop_probability, dwell_steps, bus_stops = zip(*self.added)
+        k = len(self.added)
+        stops = np.zeros((k, self.length), dtype=bool)
+        for row, cells in enumerate(bus_stops):
+            stops[row, cells] = True
+        self.coord = np.concatenate([self.coord, np.array(coord, dtype=np.int32)])
+        self.speed = np.concatenate([self.speed, np.array(speed, dtype=np.int32)])
+        self.stop = np.concatenate([self.stop, np.array(stop, dtype=np.int32)])
+        self.stop_probability = np.concatenate([self.stop_probability, np.array(stop_probability, dtype=np.float64)])
+        self.dwell_steps = np.concatenate([self.dwell_steps, np.array(dwell_steps, dtype=np.int32)])
+        self.counter = np.concatenate([self.counter, np.zeros(k, dtype=np.int32)])
+        self.velocity = np.concatenate([self.velocity, np.zeros(k, dtype=np.int64)])
+        self.bus_stop = np.concatenate([self.bus_stop, stops])
+        self.added = []
+
+    def step(self, green, rng):
+        """Advance every vehicle of the lane one tick; return the indices that moved."""
+        self.build()
+        n = len(self.vehicles)
+        if n == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        # Buses wait dwell_steps ticks at each of their stops, then leave
+        at_bus_stop = self.bus_stop[np.arange(n), self.coord]
+        waiting = at_bus_stop & (self.counter < self.dwell_steps)
+        self.counter[waiting] += 1
+        self.counter[at_bus_stop & ~waiting] = 0
+        hold = waiting
+
+        # Stop at red light, one cell before it
+        if not green:
+            at_light = (self.coord == self.stop) & ~hold
+            hold = hold | (at_light & (self.stop_probability >= 1))
+            unsure = np.flatnonzero(at_light & (self.stop_probability < 1))
+            if len(unsure):
+                hold[unsure] |= rng.random(len(unsure)) < self.stop_probability[unsure]
+
+        # Move towards the opposite edge and reappear if at the edge
+        moving = np.flatnonzero(~hold)
+        self.coord[moving] = (self.coord[moving] + self.speed[moving]) % self.length
+        return moving
+
+    def step_nasch(self, green, vmax, p_slow, rng):
+        """Nagel-Schreckenberg tick: vehicles keep their distance, a red light
+        blocks the cell after each vehicle's stop cell. Returns the indices that moved."""
+        self.build()
+        n = len(self.vehicles)
+        if n == 0:
+            return np.zeros(0, dtype=np.intp)
+        limit = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+
+        # Buses wait dwell_steps ticks at their stops and never drive past one
+        at_bus_stop = self.bus_stop[np.arange(n), self.coord]
+        waiting = at_bus_stop & (self.counter < self.dwell_steps)
+        self.counter[waiting] += 1
+        self.counter[at_bus_stop & ~waiting] = 0
+        limit[waiting] = 0
+        for i in np.flatnonzero(self.dwell_steps > 0):
+            if not waiting[i]:
+                ahead = np.flatnonzero(np.roll(self.bus_stop[i], -int(self.coord[i]) - 1))
+                if len(ahead):
+                    limit[i] = min(limit[i], ahead[0] + 1)
+
+        # The light acts as a blocking cell right after the stop cell
+        if not green:
+            obeys = (self.stop >= 0) & (rng.random(n) < self.stop_probability)
+            to_stop = (self.stop - self.coord) % self.length
+            limit[obeys] = np.minimum(limit[obeys], to_stop[obeys])
+
+        before = self.coord.copy()
+        coord = self.coord.astype(np.int64)
+        self.velocity = nasch_update(coord, self.velocity, vmax * self.speed, self.length, p_slow, rng, limit)
+        self.coord[:] = coord
+        return np.flatnonzero(self.coord != before)
+
+
+class LaneEngine:
+    """Owns the lanes of a TrafficModel and moves their vehicles in batches."""
+
+    def __init__(self, model, mode="kernel", vmax=5, p_slow=0.2):
+        self.model = model
+        self.lanes = {}
+        self.mode = mode  # "kernel" (fixed step per tick) or "nasch" (cellular automaton)
+        self.vmax = vmax
+        self.p_slow = p_slow
+        self.rng = np.random.default_rng(model.random.getrandbits(64))
+
+    def lane_for(self, pos, direction):
+        index = pos[1] if direction == Direction.HORIZONTAL else pos[0]
+        key = (direction, index)
+        if key not in self.lanes:
+            grid = self.model.grid
+            length = grid.width if direction == Direction.HORIZONTAL else grid.height
+            self.lanes[key] = Lane(direction, index, length)
+        return self.lanes[key]
+
+    def add(self, vehicle, pos):
+        self.lane_for(pos, vehicle.direction).add(vehicle, pos)
+
+    def step(self, sync_grid=True):
+        """Advance every lane one tick.
+
+        With sync_grid=False only the lane arrays are updated; call sync()
+        before reading vehicle.pos or rendering the grid.
+        """
+        for lane in self.lanes.values():
+            green = self.model.is_light_green(lane.direction)
+            if self.mode == "nasch":
+                moved = lane.step_nasch(green, self.vmax, self.p_slow, self.rng)
+            else:
+                moved = lane.step(green, self.rng)
+            if sync_grid:
+                self._sync_lane(lane, moved)
+
+    def sync(self):
+        """Move the grid agents to the positions held in the lane arrays."""
+        for lane in self.lanes.values():
+            lane.build()
+            self._sync_lane(lane, range(len(lane)))
+
+    def _sync_lane(self, lane, indices):
+        grid = self.model.grid
+        vehicles = lane.vehicles
+        coords = lane.coord
+        for i in indices:
+            pos = lane.cell(coords[i])
+            if vehicles[i].pos != pos:
+                grid.move_agent(vehicles[i], pos)
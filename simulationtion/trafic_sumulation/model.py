@@ -1,19 +1,31 @@
 # model.py
+import numpy as np
 from mesa import Model
-from mesa.time import SimultaneousActivation
-from mesa.space import MultiGrid
 from agents import (
     BoundaryAgent, CarAgent, EmergencyVehicleAgent, 
-    BusAgent, AggressiveDriverAgent, TrafficLightAgent
+    BusAgent, AggressiveDriverAgent, TrafficLightAgent,
+    Direction
 )
+from lanes import LaneEngine
+from cell_layers import LayeredMultiGrid
+from activity import ActivityScheduler
+
+BOUNDARY = 1  # Código de la capa para edificios / celdas fuera de la calle
 
 class TrafficModel(Model):
-    def __init__(self, M, N, light_interval):
-        self.grid = MultiGrid(M, N, True)
-        self.schedule = SimultaneousActivation(self)
+    def __init__(self, M, N, light_interval, sync_grid=True, lane_mode="kernel", vmax=5, p_slow=0.2, seed=None):
+        if seed is not None:
+            self.reset_randomizer(seed)  # Also when seed is passed positionally
+        self.grid = LayeredMultiGrid(M, N, True, self.make_boundary)
+        self.schedule = ActivityScheduler(self)
         self.running = True
         self.light_interval = light_interval
         self.step_count = 0
+        # Vehicles are moved lane by lane by the LaneEngine, not by the schedule.
+        # lane_mode="nasch" uses the Nagel-Schreckenberg cellular automaton
+        self.lanes = LaneEngine(self, lane_mode, vmax, p_slow)
+        self.vehicles = []
+        self.sync_grid = sync_grid
 
         # Define traffic light positions
         self.traffic_light_positions = [
@@ -23,67 +35,79 @@ class TrafficModel(Model):
             (M // 2, N // 2 + 1),
         ]
         self.traffic_lights = {}
+        # One phase flag per direction, written by the lights when they switch
+        self.phase_green = np.zeros(len(Direction), dtype=bool)
 
         # Create traffic lights
         for i, pos in enumerate(self.traffic_light_positions):
-            orientation = "horizontal" if i < 2 else "vertical"
+            orientation = Direction.HORIZONTAL if i < 2 else Direction.VERTICAL
             light = TrafficLightAgent(f"light_{i}", self, pos, orientation)
             self.traffic_lights[pos] = light
             self.grid.place_agent(light, pos)
             self.schedule.add(light)
+            self.schedule.sleep(light)  # Switched by step(), nothing to do on its own
 
-        # Add boundary agents to fill the grid with yellow rectangles
-        for x in range(M):
-            for y in range(N):
-                if (y in range(N // 2 - 2, N // 2 + 3) or x in range(M // 2 - 2, M // 2 + 3)) and (x, y) not in self.traffic_light_positions:
-                    continue
-                boundary = BoundaryAgent(f"boundary_{x}_{y}", self)
-                self.grid.place_agent(boundary, (x, y))
+        # Fill the grid with boundary cells: everything off the two roads, plus
+        # the light cells. They are stored in the grid layer, not as agents
+        on_road_x = (np.arange(M) >= M // 2 - 2) & (np.arange(M) < M // 2 + 3)
+        on_road_y = (np.arange(N) >= N // 2 - 2) & (np.arange(N) < N // 2 + 3)
+        self.grid.layer[~(on_road_x[:, None] | on_road_y[None, :])] = BOUNDARY
+        for pos in self.traffic_light_positions:
+            self.grid.layer[pos] = BOUNDARY
 
         # Add a regular car
         car_start_pos = (0, N // 2 - 1)
-        car = CarAgent("car", self, car_start_pos, "horizontal")
-        self.grid.place_agent(car, car_start_pos)
-        self.schedule.add(car)
+        car = CarAgent("car", self, car_start_pos, Direction.HORIZONTAL)
+        self.add_vehicle(car)
 
         # Add an emergency vehicle
         emergency_start_pos = (0, N // 2)
-        emergency_vehicle = EmergencyVehicleAgent("emergency_vehicle", self, emergency_start_pos, "horizontal")
-        self.grid.place_agent(emergency_vehicle, emergency_start_pos)
-        self.schedule.add(emergency_vehicle)
+        emergency_vehicle = EmergencyVehicleAgent("emergency_vehicle", self, emergency_start_pos, Direction.HORIZONTAL)
+        self.add_vehicle(emergency_vehicle)
 
         # Add a public transport bus with bus stops
         bus_start_pos = (M // 2, 0)
         bus_stops = [(M // 2, N // 4), (M // 2, 3 * N // 4)]
-        bus = BusAgent("bus", self, bus_start_pos, "vertical", bus_stops)
-        self.grid.place_agent(bus, bus_start_pos)
-        self.schedule.add(bus)
+        bus = BusAgent("bus", self, bus_start_pos, Direction.VERTICAL, bus_stops)
+        self.add_vehicle(bus)
 
         # Add an aggressive driver
         aggressive_start_pos = (0, N // 2 + 1)
-        aggressive_driver = AggressiveDriverAgent("aggressive_driver", self, aggressive_start_pos, "horizontal")
-        self.grid.place_agent(aggressive_driver, aggressive_start_pos)
-        self.schedule.add(aggressive_driver)
+        aggressive_driver = AggressiveDriverAgent("aggressive_driver", self, aggressive_start_pos, Direction.HORIZONTAL)
+        self.add_vehicle(aggressive_driver)
+
+    def make_boundary(self, pos, code):
+        return BoundaryAgent(f"boundary_{pos[0]}_{pos[1]}", self)
+
+    def stop_position(self, start_pos, direction):
+        # The position one cell before the traffic light for this lane
+        if direction == Direction.HORIZONTAL:
+            return (self.traffic_light_positions[0][0] - 1, start_pos[1])
+        return (start_pos[0], self.traffic_light_positions[2][1] - 1)
+
+    def add_vehicle(self, vehicle, pos=None):
+        pos = vehicle.start_pos if pos is None else pos
+        self.grid.place_agent(vehicle, pos)
+        self.lanes.add(vehicle, pos)
+        self.vehicles.append(vehicle)
 
     def is_light_green(self, direction):
-        for light in self.traffic_lights.values():
-            if light.state == "green" and light.orientation == direction:
-                return True
-        return False
+        return bool(self.phase_green[direction])
 
     def step(self):
         if self.step_count % (2 * self.light_interval) < self.light_interval:
             for pos, light in self.traffic_lights.items():
-                if light.orientation == "horizontal":
+                if light.orientation == Direction.HORIZONTAL:
                     light.turn_green()
                 else:
                     light.turn_red()
         else:
             for pos, light in self.traffic_lights.items():
-                if light.orientation == "vertical":
+                if light.orientation == Direction.VERTICAL:
                     light.turn_green()
                 else:
                     light.turn_red()
 
         self.step_count += 1
-        self.schedule.step()
\ No newline at end of file
+        self.schedule.step()
+        self.lanes.step(self.sync_grid)
\ No newline at end of file
@@ -1,9 +1,15 @@
+import os
+import sys
+
+# cell_layers y activity viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
 from mesa.visualization.modules import CanvasGrid
 from mesa.visualization.ModularVisualization import ModularServer
 from model import TrafficModel
 from agents import (
     BoundaryAgent, CarAgent, EmergencyVehicleAgent, 
-    BusAgent, AggressiveDriverAgent, TrafficLightAgent
+    BusAgent, AggressiveDriverAgent, TrafficLightAgent, LightState
 )
 
 def agent_portrayal(agent):
@@ -40,7 +46,7 @@ def agent_portrayal(agent):
         portrayal["Layer"] = 2
     elif isinstance(agent, TrafficLightAgent):
         # Semáforos
-        portrayal["Color"] = "#00FF00" if agent.state == "green" else "#FF0000"  # Verde o rojo
+        portrayal["Color"] = "#00FF00" if agent.state == LightState.GREEN else "#FF0000"  # Verde o rojo
         portrayal["Shape"] = "circle"
         portrayal["r"] = 0.5
         portrayal["Layer"] = 1
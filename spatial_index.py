@@ -0,0 +1,89 @@
+import numpy as np
+
+
+def torus_chebyshev(a, b, width, height):
+    """Moves between two cells with a Moore neighborhood on a width x height torus."""
+    dx = abs(a[0] - b[0])
+    dy = abs(a[1] - b[1])
+    return max(min(dx, width - dx), min(dy, height - dy))
+
+
+class BucketIndex:
+    """Bucketed grid over a set of cells of a torus, for nearest-cell queries.
+
+    Cells are kept in square buckets of side ``bucket``. nearest() looks at
+    rings of buckets around the query until no unseen bucket can hold a
+    closer cell, so a query costs about (distance / bucket)^2 buckets
+    instead of the distance^2 cells a BFS flood visits.
+    """
+
+    def __init__(self, width, height, cells=(), bucket=8):
+        self.width = width
+        self.height = height
+        self.bucket = bucket
+        self.n_bx = -(-width // bucket)
+        self.n_by = -(-height // bucket)
+        self.buckets = {}
+        self.size = 0
+        for cell in cells:
+            self.add(cell)
+
+    @classmethod
+    def from_layer(cls, layer, code, bucket=8):
+        """Index every cell of a grid layer holding code."""
+        xs, ys = np.nonzero(layer == code)
+        cells = zip(xs.tolist(), ys.tolist())
+        return cls(layer.shape[0], layer.shape[1], cells, bucket)
+
+    def __len__(self):
+        return self.size
+
+    def _key(self, cell):
+        return cell[0] // self.bucket, cell[1] // self.bucket
+
+    def add(self, cell):
+        cells = self.buckets.setdefault(self._key(cell), set())
+        if cell not in cells:
+            cells.add(cell)
+            self.size += 1
+
+    def discard(self, cell):
+        key = self._key(cell)
+        cells = self.buckets.get(key)
+        if cells is not None and cell in cells:
+            cells.remove(cell)
+            self.size -= 1
+            if not cells:
+                del self.buckets[key]
+
+    def _ring(self, bx, by, r):
+        """Bucket keys at Chebyshev bucket distance r, wrapped around the torus."""
+        if r == 0:
+            yield bx, by
+            return
+        for dx in range(-r, r + 1):
+            step = 1 if abs(dx) == r else 2 * r  # Inner columns: only the top and bottom rows
+            for dy in range(-r, r + 1, step):
+                yield (bx + dx) % self.n_bx, (by + dy) % self.n_by
+
+    def nearest(self, pos):
+        """Closest indexed cell to pos (ties broken by coordinates), or None if empty."""
+        if not self.size:
+            return None
+        bx, by = self._key(pos)
+        best, best_d = None, None
+        seen = set()
+        for r in range(max(self.n_bx, self.n_by)):
+            # Every bucket r rings away is at least (r - 2) * bucket + 1 moves
+            # away, even when the short last bucket of an axis is in between
+            if best is not None and best_d < (r - 2) * self.bucket + 1:
+                break
+            for key in self._ring(bx, by, r):
+                if key in seen:
+                    continue
+                seen.add(key)
+                for cell in self.buckets.get(key, ()):
+                    d = torus_chebyshev(pos, cell, self.width, self.height)
+                    if best is None or (d, cell) < (best_d, best):
+                        best, best_d = cell, d
+        return best
@@ -1,10 +1,7 @@
 from mesa import Agent, Model
-from mesa.time import SimultaneousActivation
+from activity import ActivityScheduler
 from mesa.space import MultiGrid
-from mesa.visualization.modules import CanvasGrid
-from mesa.visualization.ModularVisualization import ModularServer
 import random
-import matplotlib.pyplot as plt
 
 
 
@@ -40,13 +37,10 @@ class CarAgent(VehicleAgent):
         super().__init__(unique_id, model, start_pos, direction)
 
     def step(self):
-        # Detenerse en semáforos rojos
-        if not self.model.is_light_green(self.direction):
-            for light_pos in self.model.traffic_light_positions:
-                if self.pos == (light_pos[0] - 1, light_pos[1]) and self.direction == "horizontal":
-                    return
-                if self.pos == (light_pos[0], light_pos[1] - 1) and self.direction == "vertical":
-                    return
+        # Detenerse en semáforos rojos (celda de alto precalculada por el modelo)
+        group = self.model.stop_cells.get((self.pos, self.direction))
+        if group is not None and not self.model.phase_green[group]:
+            return
         self.move_and_wrap()
 
 
@@ -99,15 +93,17 @@ class TrafficLightAgent(Agent):
 
     def turn_green(self):
         self.state = "green"
+        self.model.phase_green[self.orientation] = True
 
     def turn_red(self):
         self.state = "red"
+        self.model.phase_green[self.orientation] = False
 
 
 class TrafficModel(Model):
     def __init__(self, M, N, light_interval):
         self.grid = MultiGrid(M, N, True)
-        self.schedule = SimultaneousActivation(self)
+        self.schedule = ActivityScheduler(self)
         self.running = True
         self.light_interval = light_interval
         self.step_count = 0
@@ -120,6 +116,15 @@ class TrafficModel(Model):
     (11, 13), (14, 13)  # Semáforos oeste
 ]
 
+        # Bandera de fase por dirección, la actualizan los semáforos al cambiar
+        self.phase_green = {"horizontal": False, "vertical": False}
+        # (celda, dirección del vehículo) -> grupo de semáforos que lo detiene.
+        # La celda de alto es la anterior al semáforo en esa dirección
+        self.stop_cells = {}
+        for light_x, light_y in self.traffic_light_positions:
+            self.stop_cells[((light_x - 1, light_y), "horizontal")] = "horizontal"
+            self.stop_cells[((light_x, light_y - 1), "vertical")] = "vertical"
+
         self.traffic_lights = {}
         for i, pos in enumerate(self.traffic_light_positions):
             orientation = "horizontal" if i % 2 == 0 else "vertical"
@@ -127,6 +132,7 @@ class TrafficModel(Model):
             self.traffic_lights[pos] = light
             self.grid.place_agent(light, pos)
             self.schedule.add(light)
+            self.schedule.sleep(light)  # Los cambia step(); no hacen nada por sí mismos
 
         # Definir la glorieta (posiciones centrales)
         self.glorieta_positions = [
@@ -178,10 +184,7 @@ class TrafficModel(Model):
         self.schedule.add(aggressive_driver)
 
     def is_light_green(self, direction):
-        for light in self.traffic_lights.values():
-            if light.state == "green" and light.orientation == direction:
-                return True
-        return False
+        return self.phase_green[direction]
 
     def step(self):
         # Alternar semáforos
@@ -227,9 +230,18 @@ def agent_portrayal(agent):
 # Parámetros de simulación
 M, N = 24, 24
 light_interval = 10
-grid = CanvasGrid(agent_portrayal, M, N, 600, 600)
-server = ModularServer(TrafficModel, [grid], "Simulación de Tráfico con Tipos de Vehículos", {"M": M, "N": N, "light_interval": light_interval})
-server.port = 8521
+
+
+def make_server():
+    """Servidor de Mesa (puerto 8521) con el cruce de prueba y sus distintos tipos de vehículo."""
+    from mesa.visualization.modules import CanvasGrid
+    from mesa.visualization.ModularVisualization import ModularServer
+
+    grid = CanvasGrid(agent_portrayal, M, N, 600, 600)
+    server = ModularServer(TrafficModel, [grid], "Simulación de Tráfico con Tipos de Vehículos", {"M": M, "N": N, "light_interval": light_interval})
+    server.port = 8521
+    return server
+
 
 if __name__ == "__main__":
-    server.launch()
+    make_server().launch()
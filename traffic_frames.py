@@ -0,0 +1,260 @@
+"""Binary frame export of Evidencia1.TrafficModel for external (3D) clients.
+
+``TrafficModel.get_positions`` builds a list of dicts on every call and the
+client then receives it as JSON. This module writes each tick into a
+preallocated ring of NumPy arrays instead. The ring lives in a plain buffer
+or in ``multiprocessing.shared_memory`` so another process can map it, and
+writing a frame allocates no Python objects per agent.
+
+Only dynamic state goes into a frame: for every vehicle a compact id
+(uint32), a type code (uint8) and its cell as int16 (x, z), plus one byte
+per traffic light (1 = green). The static part is exported once with
+``static_geometry()`` or ``export_static(path)``: the map layer (buildings,
+parking, roundabout), light positions and orientations, and the table that
+maps compact ids to the model's unique_id strings.
+
+Vehicles that appear later (demand cars) are registered through the
+model's ``vehicle_listeners``; each new one bumps ``static_version``. When
+they no longer fit, the exporter doubles its capacity and moves to a new
+buffer: the old one is flagged ``moved`` and, with shared memory, the new
+block reuses the same name, so a reader just reopens it.
+
+Buffer layout (little endian):
+
+    header   int64[8]   seq, ring, capacity, n_lights, width, height, static_version, moved
+    slots    int64[ring, 2]          tick, count   (tick = -1 while being written)
+    ids      uint32[ring, capacity]
+    types    uint8[ring, capacity]
+    xz       int16[ring, capacity, 2]
+    lights   uint8[ring, n_lights]
+
+``seq`` counts the frames written; the newest frame is in slot
+``(seq - 1) % ring``. A reader that finds the slot tick changed after
+copying it should read again (the writer lapped it).
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Vehicle type codes stored in each frame
+CAR, BUS, AGGRESSIVE, EMERGENCY = 0, 1, 2, 3
+TYPE_NAMES = {CAR: "car", BUS: "bus", AGGRESSIVE: "aggressive", EMERGENCY: "emergency"}
+
+HEADER_FIELDS = 8
+
+
+def _layout(ring, capacity, n_lights):
+    """Return ({name: (offset, dtype, shape)}, total size in bytes)."""
+    fields = [
+        ("header", np.int64, (HEADER_FIELDS,)),
+        ("slots", np.int64, (ring, 2)),
+        ("ids", np.uint32, (ring, capacity)),
+        ("types", np.uint8, (ring, capacity)),
+        ("xz", np.int16, (ring, capacity, 2)),
+        ("lights", np.uint8, (ring, max(n_lights, 1))),
+    ]
+    layout, offset = {}, 0
+    for name, dtype, shape in fields:
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        layout[name] = (offset, dtype, shape)
+        offset += (size + 7) // 8 * 8  # Keep every array 8-byte aligned
+    return layout, offset
+
+
+def _views(buffer, layout):
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+        for name, (offset, dtype, shape) in layout.items()
+    }
+
+
+class FrameExporter:
+    """Writes one frame per call to write() into a preallocated ring buffer.
+
+    With shared=True the ring lives in a SharedMemory block; pass
+    exporter.name to FrameReader in the client process.
+    """
+
+    def __init__(self, model, capacity=None, ring=8, shared=False, name=None):
+        from Evidencia1 import (
+            AggressiveDriverAgent, BusAgent, CarAgent, EmergencyVehicleAgent, TrafficLightAgent,
+        )
+
+        self._type_codes = {
+            CarAgent: CAR, BusAgent: BUS, AggressiveDriverAgent: AGGRESSIVE, EmergencyVehicleAgent: EMERGENCY,
+        }
+        self.model = model
+        self.lights = [a for a in model.schedule.agents if isinstance(a, TrafficLightAgent)]
+        vehicles = [a for a in model.schedule.agents if type(a) in self._type_codes]
+        self.ring = ring
+        self.shared = shared
+        self._shm = None
+        self._allocate(capacity if capacity is not None else max(len(vehicles), 1), name)
+        self.arrays["header"][:] = 0
+        self.arrays["header"][1:6] = (ring, self.capacity, len(self.lights), model.grid.width, model.grid.height)
+        self.arrays["slots"][:, 0] = -1
+        self.agents = []  # Compact id -> agent
+        self.ids = {}  # Agent -> compact id
+        for vehicle in vehicles:
+            self.register(vehicle)
+        model.vehicle_listeners.append(self.register)
+
+    def _allocate(self, capacity, name=None):
+        self.capacity = capacity
+        self.layout, self.size = _layout(self.ring, capacity, len(self.lights))
+        if self.shared:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=self.size)
+            buffer = self._shm.buf
+        else:
+            buffer = bytearray(self.size)
+        self._buffer = buffer
+        self.arrays = _views(buffer, self.layout)
+
+    def _grow(self, capacity):
+        """Move to a buffer with room for capacity vehicles, keeping the frames written so far."""
+        old = {name: array.copy() for name, array in self.arrays.items()}
+        self.arrays["header"][7] = 1  # Moved: readers must reopen
+        name = self.name
+        if self._shm is not None:
+            self.arrays = None
+            self._shm.close()
+            self._shm.unlink()
+        self._allocate(capacity, name)
+        arrays = self.arrays
+        n = old["ids"].shape[1]
+        arrays["header"][:] = old["header"]
+        arrays["header"][2] = capacity
+        arrays["header"][7] = 0
+        arrays["slots"][:] = old["slots"]
+        arrays["ids"][:, :n] = old["ids"]
+        arrays["types"][:, :n] = old["types"]
+        arrays["xz"][:, :n] = old["xz"]
+        arrays["lights"][:] = old["lights"]
+
+    @property
+    def name(self):
+        """SharedMemory name for FrameReader, or None for a private buffer."""
+        return self._shm.name if self._shm is not None else None
+
+    def register(self, agent):
+        """Compact id of a vehicle; a new one gets the next id and bumps static_version."""
+        index = self.ids.get(agent)
+        if index is not None:
+            return index  # Reused demand car: keeps its id
+        if len(self.agents) >= self.capacity:
+            self._grow(2 * self.capacity)
+        index = len(self.agents)
+        self.ids[agent] = index
+        self.agents.append(agent)
+        self.arrays["header"][6] += 1
+        return index
+
+    @property
+    def static_version(self):
+        return int(self.arrays["header"][6])
+
+    def static_geometry(self):
+        """Everything a client needs once: map layer, lights and the agent table."""
+        return {
+            "layer": self.model.grid.layer.copy(),
+            "light_xz": np.array([light.pos for light in self.lights], dtype=np.int16).reshape(-1, 2),
+            "light_orientation": np.array([int(light.orientation) for light in self.lights], dtype=np.uint8),
+            "agent_unique_id": np.array([str(agent.unique_id) for agent in self.agents]),
+            "agent_type": np.array([self._type_codes[type(agent)] for agent in self.agents], dtype=np.uint8),
+        }
+
+    def export_static(self, path):
+        """Write static_geometry() to an .npz file."""
+        np.savez(path, **self.static_geometry())
+
+    def write(self):
+        """Write the model's current state as the next frame; return its slot."""
+        arrays = self.arrays
+        header = arrays["header"]
+        slot = int(header[0]) % self.ring
+        slots = arrays["slots"]
+        slots[slot, 0] = -1  # Being written
+        ids, types, xz = arrays["ids"][slot], arrays["types"][slot], arrays["xz"][slot]
+        codes = self._type_codes
+        count = 0
+        for i, agent in enumerate(self.agents):
+            pos = agent.pos
+            if pos is None:
+                continue  # Removed from the grid
+            ids[count] = i
+            types[count] = codes[type(agent)]
+            xz[count, 0] = pos[0]
+            xz[count, 1] = pos[1]
+            count += 1
+        lights = arrays["lights"][slot]
+        for i, light in enumerate(self.lights):
+            lights[i] = light.state
+        slots[slot, 1] = count
+        slots[slot, 0] = self.model.step_count
+        header[0] += 1
+        return slot
+
+    def close(self):
+        """Release the buffer (and unlink the shared block, if any)."""
+        if self.register in self.model.vehicle_listeners:
+            self.model.vehicle_listeners.remove(self.register)
+        self.arrays = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class FrameReader:
+    """Maps a FrameExporter ring (shared memory name or buffer) and reads frames without copying."""
+
+    def __init__(self, source):
+        if isinstance(source, str):
+            self._shm = shared_memory.SharedMemory(name=source)
+            buffer = self._shm.buf
+        else:
+            self._shm = None
+            buffer = source
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        self.ring, self.capacity, self.n_lights = (int(v) for v in header[1:4])
+        self.width, self.height = int(header[4]), int(header[5])
+        self.layout, _ = _layout(self.ring, self.capacity, self.n_lights)
+        self.arrays = _views(buffer, self.layout)
+
+    @property
+    def frames_written(self):
+        return int(self.arrays["header"][0])
+
+    @property
+    def static_version(self):
+        return int(self.arrays["header"][6])
+
+    @property
+    def moved(self):
+        """True once the exporter grew into a new buffer; reopen it (same shared memory name)."""
+        return bool(self.arrays["header"][7])
+
+    def frame(self, slot):
+        """Return (tick, ids, types, xz, lights) views of a slot; tick is -1 if empty or being written."""
+        tick, count = (int(v) for v in self.arrays["slots"][slot])
+        count = max(count, 0)
+        return (
+            tick,
+            self.arrays["ids"][slot, :count],
+            self.arrays["types"][slot, :count],
+            self.arrays["xz"][slot, :count],
+            self.arrays["lights"][slot, : self.n_lights],
+        )
+
+    def latest(self):
+        """Views of the newest complete frame, or None if nothing was written yet."""
+        seq = self.frames_written
+        if seq == 0:
+            return None
+        return self.frame((seq - 1) % self.ring)
+
+    def close(self):
+        self.arrays = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
@@ -0,0 +1,277 @@
+"""Array-backed traffic KPIs for Evidencia1.TrafficModel.
+
+``TrafficMetrics`` samples the model every ``sample_every`` ticks and keeps
+only running aggregates, so its memory does not grow with the length of
+the run:
+
+* per vehicle (one slot per tracked vehicle, NumPy arrays): start tick of
+  the current trip, ticks moving and ticks stopped;
+* per completed trip: travel time, delay over free flow (route length
+  divided by the vehicle's speed) and stopped time, as Welford running
+  mean / variance plus a tick histogram for percentiles;
+* per traffic light: vehicles that drove through its cell (throughput) and
+  the queue of stopped vehicles whose next light within ``queue_reach``
+  cells is this one (running mean and maximum);
+* network wide: running mean of vehicles moving, stopped and queued.
+
+Enable it with ``model.enable_metrics(sample_every=...)``; ``summary()``
+returns plain numbers. Everything is exact with sample_every=1. With a
+longer interval moving / stopped time is counted per interval (a vehicle
+that moved at all counts as moving for the whole interval) and the end of
+a trip is seen at the next sample, except for demand cars, which report
+their arrival when the DemandGenerator retires them. Throughput is always
+exact, because it is derived from the route cursors.
+"""
+import numpy as np
+
+
+class Welford:
+    """Running count, mean, variance, min and max of a stream of numbers."""
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def as_dict(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.mean, "std": self.variance ** 0.5,
+                "min": self.min, "max": self.max}
+
+
+class VectorWelford:
+    """Welford aggregates of a fixed-length vector sampled repeatedly (one per light)."""
+
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.max = np.zeros(size)
+
+    def add(self, values):
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+        np.maximum(self.max, values, out=self.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
+
+
+class TickHistogram:
+    """Counts of non-negative integer values (ticks); values >= limit share the last bin."""
+
+    def __init__(self, limit=4096):
+        self.limit = limit
+        self.counts = np.zeros(limit + 1, dtype=np.int64)
+
+    def add(self, value):
+        self.counts[min(int(value), self.limit)] += 1
+
+    def percentile(self, q):
+        """Smallest value with at least q percent of the samples at or below it (None if empty)."""
+        total = int(self.counts.sum())
+        if not total:
+            return None
+        rank = max(1, int(np.ceil(q / 100 * total)))
+        return int(np.searchsorted(np.cumsum(self.counts), rank))
+
+
+class TrafficMetrics:
+    """Samples an Evidencia1.TrafficModel; see the module docstring."""
+
+    def __init__(self, model, sample_every=1, queue_reach=5, histogram_limit=4096, percentiles=(50, 90, 99)):
+        from Evidencia1 import AggressiveDriverAgent, BusAgent, CarAgent, EmergencyVehicleAgent
+
+        self.model = model
+        self.sample_every = sample_every
+        self.queue_reach = queue_reach
+        self.percentiles = percentiles
+        self.vehicle_types = (CarAgent, BusAgent, AggressiveDriverAgent, EmergencyVehicleAgent)
+        self.bus_type = BusAgent  # Buses loop over their stops and never finish a trip
+        self.fast_types = (AggressiveDriverAgent, EmergencyVehicleAgent)  # 2 cells per tick
+        self.n_lights = model.green_for.shape[0] - 1
+        self.last_sample = model.step_count
+
+        # Per-vehicle slots, grown by doubling
+        self.slots = {}  # agent -> slot
+        self.agents = []  # slot -> agent
+        self.active = {}  # agent -> slot, vehicles on a trip
+        capacity = 16
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.moving = np.zeros(capacity, dtype=np.int64)
+        self.stopped = np.zeros(capacity, dtype=np.int64)
+        self.trip_stopped = np.zeros(capacity, dtype=np.int64)
+        self.free_flow = np.zeros(capacity, dtype=np.int64)
+        self.cursor = np.zeros(capacity, dtype=np.int64)
+        self.routes = [None] * capacity
+
+        # Completed trips
+        self.travel_time = Welford()
+        self.delay = Welford()
+        self.stopped_time = Welford()
+        self.travel_hist = TickHistogram(histogram_limit)
+        self.delay_hist = TickHistogram(histogram_limit)
+
+        # Lights and network
+        self.throughput = np.zeros(self.n_lights, dtype=np.int64)
+        self.queue = VectorWelford(self.n_lights)
+        self.network = {name: Welford() for name in ("moving", "stopped", "queued")}
+        self.samples = 0
+
+        for agent in model.schedule.agents:
+            if isinstance(agent, self.vehicle_types):
+                self.register(agent)
+
+    def _grow(self):
+        capacity = 2 * len(self.start)
+        for name in ("start", "moving", "stopped", "trip_stopped", "free_flow", "cursor"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+        self.routes.extend([None] * (capacity - len(self.routes)))
+
+    def register(self, agent):
+        """Start tracking a trip of agent from its current route position (new or reused vehicle)."""
+        slot = self.slots.get(agent)
+        if slot is None:
+            slot = len(self.agents)
+            if slot == len(self.start):
+                self._grow()
+            self.slots[agent] = slot
+            self.agents.append(agent)
+        self._start_trip(slot, agent)
+        self.active[agent] = slot
+
+    def _start_trip(self, slot, agent):
+        route = agent.route
+        speed = 2 if isinstance(agent, self.fast_types) else 1
+        self.start[slot] = self.model.step_count
+        self.trip_stopped[slot] = 0
+        self.free_flow[slot] = -(-max(route.remaining(), 0) // speed)
+        self.cursor[slot] = route.cursor
+        self.routes[slot] = route
+
+    def step(self):
+        """Call once per model tick; samples every sample_every ticks."""
+        tick = self.model.step_count
+        if tick - self.last_sample < self.sample_every:
+            return
+        interval = tick - self.last_sample
+        self.last_sample = tick
+        self.sample(interval)
+
+    def sample(self, interval):
+        tick = self.model.step_count
+        queue = np.zeros(self.n_lights, dtype=np.int64)
+        reach = self.queue_reach
+        moving = stopped = 0
+        finished = []
+        for agent, slot in self.active.items():
+            route = agent.route
+            if agent.pos is None:
+                finished.append(agent)  # Removed from the grid (e.g. teleported)
+                continue
+            if route is not self.routes[slot]:
+                # New route (buses between stops): finish the old one, count on the new one
+                self._credit(slot)
+                self.routes[slot] = route
+                self.cursor[slot] = 0
+            if self._credit(slot):
+                self.moving[slot] += interval
+                moving += 1
+            elif route.remaining() > 0:
+                self.stopped[slot] += interval
+                self.trip_stopped[slot] += interval
+                stopped += 1
+                now = route.cursor
+                ahead = route.lights[now:now + reach]
+                ahead = ahead[ahead >= 0]
+                if len(ahead):
+                    queue[ahead[0]] += 1
+            if route.remaining() <= 0 and not isinstance(agent, self.bus_type):
+                finished.append(agent)
+        for agent in finished:
+            self.end_trip(agent, tick if agent.pos is not None else None)
+        self.queue.add(queue)
+        self.network["moving"].add(moving)
+        self.network["stopped"].add(stopped)
+        self.network["queued"].add(int(queue.sum()))
+        self.samples += 1
+
+    def _credit(self, slot):
+        """Add the lights passed since the last look at slot to the throughput; True if it moved."""
+        route = self.routes[slot]
+        last, now = int(self.cursor[slot]), route.cursor
+        if now == last:
+            return False
+        passed = route.lights[last:now]
+        self.throughput[passed[passed >= 0]] += 1
+        self.cursor[slot] = now
+        return True
+
+    def end_trip(self, agent, tick):
+        """Close the trip of agent, arrived at tick; tick=None drops it (did not arrive)."""
+        slot = self.active.pop(agent, None)
+        if slot is None:
+            return
+        self._credit(slot)
+        if tick is None:
+            return
+        travel = tick - int(self.start[slot])
+        delay = max(travel - int(self.free_flow[slot]), 0)
+        self.travel_time.add(travel)
+        self.delay.add(delay)
+        self.stopped_time.add(int(self.trip_stopped[slot]))
+        self.travel_hist.add(travel)
+        self.delay_hist.add(delay)
+
+    def vehicle_table(self):
+        """Per-vehicle arrays (unique_id, moving ticks, stopped ticks) for every tracked vehicle."""
+        n = len(self.agents)
+        return {
+            "unique_id": [agent.unique_id for agent in self.agents],
+            "moving": self.moving[:n].copy(),
+            "stopped": self.stopped[:n].copy(),
+        }
+
+    def summary(self):
+        """KPIs so far as plain Python numbers."""
+        def percentiles(hist):
+            return {f"p{q}": hist.percentile(q) for q in self.percentiles}
+
+        return {
+            "tick": self.model.step_count,
+            "samples": self.samples,
+            "vehicles": len(self.agents),
+            "on_trip": len(self.active),
+            "travel_time": {**self.travel_time.as_dict(), **percentiles(self.travel_hist)},
+            "delay": {**self.delay.as_dict(), **percentiles(self.delay_hist)},
+            "stopped_time": self.stopped_time.as_dict(),
+            "network": {name: stat.as_dict() for name, stat in self.network.items()},
+            "lights": {
+                "throughput": self.throughput.tolist(),
+                "mean_queue": self.queue.mean.tolist(),
+                "max_queue": self.queue.max.astype(int).tolist(),
+            },
+        }
@@ -0,0 +1,275 @@
+"""Local HTTP/WebSocket service around Evidencia1.TrafficModel.
+
+An external renderer used to call step() and get_positions() once per
+frame. This service decouples the two: the simulation can be advanced many
+ticks per request (or run ahead on its own), and clients only receive the
+vehicles and lights that changed since the last tick they saw.
+
+Endpoints (JSON):
+
+    GET  /static                 map size and layer, lights, vehicle id table
+    POST /advance?ticks=K        step K ticks in one call, returns the new tick
+    GET  /changes?since=T        vehicles / lights that changed after tick T
+    WS   /stream?fps=F&since=T   pushes the changes at most F times per second
+
+Vehicles are reported as [id, x, z] with the compact ids of
+traffic_frames (x = z = -1 once a vehicle leaves the grid); lights as
+[index, state]. Demand cars get new ids as they first appear; every
+change carries static_version, and a client that sees it change fetches
+/static again for the new id table. Malformed query arguments get a 400.
+
+With --sim-rate the simulation runs on its own at that many ticks per
+second, at most --max-ahead ticks ahead of the slowest stream, so frames
+can be paced independently of the simulation. The service listens on
+127.0.0.1 unless --address says otherwise.
+
+Usage: python traffic_service.py [--address 127.0.0.1] [--port 8524] [--seed S] [--sim-rate R] [--max-ahead N]
+"""
+import argparse
+import asyncio
+import json
+import math
+
+import numpy as np
+import tornado.web
+import tornado.websocket
+
+from traffic_frames import FrameExporter
+
+# Ticks stepped between two yields to the event loop in /advance
+ADVANCE_CHUNK = 50
+
+
+class ChangeTracker:
+    """Remembers, per vehicle and per light, the last tick at which it changed."""
+
+    def __init__(self, model):
+        self.model = model
+        self.frames = FrameExporter(model, ring=1)
+        self.agents = self.frames.agents
+        self.lights = self.frames.lights
+        self.xz = np.full((self.frames.capacity, 2), -1, dtype=np.int16)
+        self.vehicle_changed = np.full(self.frames.capacity, -1, dtype=np.int64)
+        self.light_state = np.zeros(len(self.lights), dtype=np.uint8)
+        self.light_changed = np.full(len(self.lights), -1, dtype=np.int64)
+        self.record()
+
+    def _grow(self):
+        """Make room for the vehicles the exporter registered since (demand cars)."""
+        size = max(len(self.agents), 2 * len(self.xz))
+        xz = np.full((size, 2), -1, dtype=np.int16)
+        changed = np.full(size, -1, dtype=np.int64)
+        xz[: len(self.xz)] = self.xz
+        changed[: len(self.vehicle_changed)] = self.vehicle_changed
+        self.xz, self.vehicle_changed = xz, changed
+
+    def record(self):
+        """Compare the model with the last recorded state; call after every step."""
+        if len(self.agents) > len(self.xz):
+            self._grow()
+        tick = self.model.step_count
+        xz, changed = self.xz, self.vehicle_changed
+        for i, agent in enumerate(self.agents):
+            pos = agent.pos if agent.pos is not None else (-1, -1)
+            if xz[i, 0] != pos[0] or xz[i, 1] != pos[1]:
+                xz[i, 0], xz[i, 1] = pos
+                changed[i] = tick
+        for i, light in enumerate(self.lights):
+            if self.light_state[i] != light.state:
+                self.light_state[i] = light.state
+                self.light_changed[i] = tick
+
+    def changes_since(self, since):
+        vehicles = np.flatnonzero(self.vehicle_changed[: len(self.agents)] > since)
+        lights = np.flatnonzero(self.light_changed > since)
+        return {
+            "tick": self.model.step_count,
+            "since": since,
+            "static_version": self.frames.static_version,  # Changed: fetch /static again
+            "vehicles": [[int(i), int(self.xz[i, 0]), int(self.xz[i, 1])] for i in vehicles],
+            "lights": [[int(i), int(self.light_state[i])] for i in lights],
+        }
+
+    def static(self):
+        geometry = self.frames.static_geometry()
+        return {
+            "static_version": self.frames.static_version,
+            "width": self.model.grid.width,
+            "height": self.model.grid.height,
+            "layer": geometry["layer"].tolist(),
+            "lights": [
+                {"index": i, "x": int(x), "z": int(z), "orientation": int(o)}
+                for i, ((x, z), o) in enumerate(zip(geometry["light_xz"], geometry["light_orientation"]))
+            ],
+            "vehicles": [
+                {"id": i, "unique_id": str(uid), "type": int(t)}
+                for i, (uid, t) in enumerate(zip(geometry["agent_unique_id"], geometry["agent_type"]))
+            ],
+        }
+
+
+class TrafficService:
+    """Owns the model; every step goes through here so the tracker stays in sync."""
+
+    def __init__(self, model, sim_rate=None, max_ahead=100):
+        self.model = model
+        self.tracker = ChangeTracker(model)
+        self.sim_rate = sim_rate
+        self.max_ahead = max_ahead
+        self.streams = set()  # Open StreamHandlers, for the run-ahead limit
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def tick(self):
+        return self.model.step_count
+
+    def _step(self):
+        self.model.step()
+        self.tracker.record()
+
+    async def advance(self, ticks):
+        """Step the model ticks times, yielding to the event loop every ADVANCE_CHUNK ticks."""
+        async with self._lock:
+            for done in range(ticks):
+                self._step()
+                if (done + 1) % ADVANCE_CHUNK == 0:
+                    await asyncio.sleep(0)
+        return self.tick
+
+    def ahead(self):
+        """Ticks the simulation is ahead of the slowest open stream."""
+        if not self.streams:
+            return 0
+        return self.tick - min(stream.sent_tick for stream in self.streams)
+
+    async def run_ahead(self):
+        """Free-running simulation at sim_rate ticks/s, paused while too far ahead."""
+        period = 1.0 / self.sim_rate
+        while True:
+            if self.ahead() < self.max_ahead:
+                async with self._lock:
+                    self._step()
+            await asyncio.sleep(period)
+
+    def start(self):
+        if self.sim_rate and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_ahead())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def make_app(self):
+        return tornado.web.Application([
+            (r"/static", StaticHandler, {"service": self}),
+            (r"/advance", AdvanceHandler, {"service": self}),
+            (r"/changes", ChangesHandler, {"service": self}),
+            (r"/stream", StreamHandler, {"service": self}),
+        ])
+
+
+def number_argument(handler, name, default, kind=int):
+    """Query argument name parsed with kind; a malformed value is a 400, not a 500."""
+    value = handler.get_argument(name, default)
+    try:
+        number = kind(value)
+    except ValueError:
+        raise tornado.web.HTTPError(400, f"{name} must be {'an integer' if kind is int else 'a number'}")
+    if kind is float and not math.isfinite(number):
+        raise tornado.web.HTTPError(400, f"{name} must be finite")
+    return number
+
+
+class ServiceHandler(tornado.web.RequestHandler):
+    def initialize(self, service):
+        self.service = service
+
+    def write_json(self, data):
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(data))
+
+
+class StaticHandler(ServiceHandler):
+    def get(self):
+        self.write_json(self.service.tracker.static())
+
+
+class AdvanceHandler(ServiceHandler):
+    async def post(self):
+        ticks = number_argument(self, "ticks", "1")
+        if ticks < 0:
+            raise tornado.web.HTTPError(400, "ticks must be >= 0")
+        tick = await self.service.advance(ticks)
+        self.write_json({"tick": tick})
+
+
+class ChangesHandler(ServiceHandler):
+    def get(self):
+        since = number_argument(self, "since", "-1")
+        self.write_json(self.service.tracker.changes_since(since))
+
+
+class StreamHandler(tornado.websocket.WebSocketHandler):
+    """Pushes changes_since(last sent tick) at most fps times per second."""
+
+    def initialize(self, service):
+        self.service = service
+        self.sent_tick = -1
+        self._task = None
+
+    def prepare(self):
+        # Before the upgrade, so bad arguments get a plain 400
+        self.fps = number_argument(self, "fps", "30", float)
+        if self.fps <= 0:
+            raise tornado.web.HTTPError(400, "fps must be > 0")
+        self.sent_tick = number_argument(self, "since", "-1")
+
+    def open(self):
+        self.service.streams.add(self)
+        self._task = asyncio.get_running_loop().create_task(self.push())
+
+    async def push(self):
+        period = 1.0 / self.fps
+        try:
+            while True:
+                if self.service.tick > self.sent_tick:
+                    changes = self.service.tracker.changes_since(self.sent_tick)
+                    await self.write_message(json.dumps(changes))
+                    self.sent_tick = changes["tick"]
+                await asyncio.sleep(period)
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+    def on_close(self):
+        self.service.streams.discard(self)
+        if self._task is not None:
+            self._task.cancel()
+
+
+async def serve(service, port, address="127.0.0.1"):
+    app = service.make_app()
+    app.listen(port, address=address)
+    service.start()
+    print(f"traffic service on http://{address}:{port} (tick {service.tick})")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/WebSocket service for Evidencia1.TrafficModel")
+    parser.add_argument("--address", default="127.0.0.1", help="interface to listen on (default: local only)")
+    parser.add_argument("--port", type=int, default=8524)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--sim-rate", type=float, help="ticks per second to run on its own")
+    parser.add_argument("--max-ahead", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    from Evidencia1 import TrafficModel
+
+    service = TrafficService(TrafficModel(24, 24, 10, seed=args.seed), args.sim_rate, args.max_ahead)
+    asyncio.run(serve(service, args.port, args.address))
+
+
+if __name__ == "__main__":
+    main()
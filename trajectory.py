@@ -0,0 +1,418 @@
+"""Compact recording of a Mesa model run and replay without re-simulating.
+
+``TrajectoryRecorder`` stores, for every tick it is called on, the cell of
+each scheduled agent plus a few integer attributes (e.g. a light's state,
+a car's mood). Ticks are grouped in chunks; inside a chunk the first frame
+is kept whole and the following ones as per-agent differences:
+
+    key        int16[agents, columns]          first frame (x = -1: not on the grid)
+    deltas     int8[ticks - 1, agents, columns] change since the previous frame
+    exceptions uint32 index + int32 delta      changes that do not fit in an int8
+
+Most agents stand still or move one cell, so the deltas are nearly all 0
+or +-1, and a compressed chunk (zlib, or zstd when the ``zstandard``
+package is installed) costs well under a byte per agent per tick. For a
+LayeredMultiGrid the layer (trash, dirt, buildings) is stored whole at
+the start of every chunk plus the cells that changed on each tick, so
+every chunk decodes on its own.
+
+File layout:
+
+    b"MTRJ", uint32 header length, header JSON
+    chunks      uint32 length + payload, one after the other
+    footer JSON {"chunks": [[offset, first tick, ticks], ...], "agents": [[unique_id, class], ...]}
+    uint64 footer offset, b"MTRJ"
+
+The footer is written by close(); it is what makes the file seekable.
+``TrajectoryReader`` decodes any frame by tick, and ``ReplayModel`` plays
+a file back through the model's own ``agent_portrayal`` (see
+make_replay_server) or its ``get_positions``, at any speed and from any
+tick.
+"""
+import bisect
+import functools
+import importlib
+import json
+import os
+import struct
+import sys
+import zlib
+
+import mesa
+import numpy as np
+from mesa.space import MultiGrid
+from mesa.time import BaseScheduler
+
+from cell_layers import LayeredMultiGrid
+
+MAGIC = b"MTRJ"
+CODECS = (None, "zlib", "zstd")
+ABSENT = -1  # x and y of an agent that is not on the grid
+CHUNK_HEADER = struct.Struct("<qiiiiii")  # first tick, ticks, agents, columns, exceptions, layer changes, layer size
+
+
+def _class_path(cls):
+    module = cls.__module__
+    if module == "__main__":
+        # Run as a script: record the module name it is imported as
+        module = os.path.splitext(os.path.basename(sys.modules["__main__"].__file__))[0]
+    return f"{module}:{cls.__qualname__}"
+
+
+def _load(path):
+    module, _, qualname = path.partition(":")
+    obj = importlib.import_module(module)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _compress(codec, data):
+    if codec is None:
+        return data
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    import zstandard
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _decompress(codec, data):
+    if codec is None:
+        return data
+    if codec == "zlib":
+        return zlib.decompress(data)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+class TrajectoryRecorder:
+    """Appends one frame per record() call to a trajectory file.
+
+    attributes are agent attribute names stored as int16 next to the
+    position (missing attributes are stored as 0). Agents added to the
+    schedule later are picked up when they first appear; agents that left
+    the grid or the schedule are recorded as absent.
+    """
+
+    def __init__(self, model, path, attributes=(), chunk_ticks=256, codec="zlib"):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec {codec!r}")
+        if codec == "zstd":
+            import zstandard  # noqa: F401  Fail now rather than at the first chunk
+        self.model = model
+        self.attributes = tuple(attributes)
+        self.chunk_ticks = chunk_ticks
+        self.codec = codec
+        self.columns = 2 + len(self.attributes)
+        self.slots = {}  # unique_id -> slot
+        self.agents = []  # slot -> [unique_id, class path]
+        self.frames = np.empty((chunk_ticks, 16, self.columns), dtype=np.int16)
+        self.ticks = []
+        self.chunks = []  # [offset, first tick, ticks]
+        grid = model.grid
+        self.layer = getattr(grid, "layer", None)
+        self.layer_key = None
+        self.layer_changes = []  # (tick index, flat cell, code) arrays per tick
+        self.layer_prev = None
+        header = {
+            "model": _class_path(type(model)),
+            "width": grid.width,
+            "height": grid.height,
+            "torus": grid.torus,
+            "columns": ["x", "y", *self.attributes],
+            "codec": codec,
+            "layer": self.layer is not None,
+            "factory": None,
+        }
+        factory = getattr(grid, "factory", None)
+        if getattr(factory, "__self__", None) is model:
+            header["factory"] = factory.__name__  # Rebuilt on the replay model (e.g. make_boundary)
+        data = json.dumps(header).encode()
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(data)) + data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _slot(self, agent):
+        slot = self.slots.get(agent.unique_id)
+        if slot is None:
+            slot = self.slots[agent.unique_id] = len(self.agents)
+            self.agents.append([agent.unique_id, _class_path(type(agent))])
+            if slot == self.frames.shape[1]:
+                grown = np.zeros((self.chunk_ticks, 2 * slot, self.columns), dtype=np.int16)
+                grown[:, slot:, :2] = ABSENT  # Not there in the frames already buffered
+                grown[:, :slot] = self.frames
+                self.frames = grown
+        return slot
+
+    def record(self):
+        """Add the model's current state as a frame."""
+        attributes = self.attributes
+        rows, slots = [], []
+        for agent in self.model.schedule.agents:
+            pos = agent.pos
+            if pos is None:
+                continue
+            slots.append(self._slot(agent))
+            rows.append((pos[0], pos[1], *(int(getattr(agent, name, 0)) for name in attributes)))
+        t = len(self.ticks)
+        frame = self.frames[t]
+        frame[:, :2] = ABSENT
+        frame[:, 2:] = 0
+        if rows:
+            frame[slots] = rows
+        if self.layer is not None:
+            layer = self.layer.ravel()
+            if t == 0:
+                self.layer_key = layer.copy()
+            else:
+                cells = np.flatnonzero(layer != self.layer_prev)
+                if len(cells):
+                    self.layer_changes.append((np.full(len(cells), t, dtype=np.uint32),
+                                               cells.astype(np.uint32), layer[cells]))
+            self.layer_prev = layer.copy()
+        self.ticks.append(self.model.step_count if hasattr(self.model, "step_count") else self.model.schedule.steps)
+        if len(self.ticks) == self.chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames as a chunk."""
+        n_ticks = len(self.ticks)
+        if not n_ticks:
+            return
+        n_agents = len(self.agents)
+        frames = self.frames[:n_ticks, :n_agents].astype(np.int32)
+        deltas = np.diff(frames, axis=0)
+        small = (deltas >= -127) & (deltas <= 127)
+        exceptions = np.flatnonzero(~small).astype(np.uint32)
+        parts = [
+            np.array(self.ticks, dtype=np.int64),
+            frames[0].astype(np.int16),
+            np.where(small, deltas, -128).astype(np.int8),
+            exceptions,
+            deltas.ravel()[exceptions].astype(np.int32),
+        ]
+        n_changes = layer_size = 0
+        if self.layer is not None:
+            changes = self.layer_changes or [(np.empty(0, np.uint32), np.empty(0, np.uint32), np.empty(0, np.uint8))]
+            parts.append(self.layer_key)
+            parts.extend(np.concatenate(column) for column in zip(*changes))
+            n_changes = len(parts[-1])
+            layer_size = len(self.layer_key)
+        header = CHUNK_HEADER.pack(self.ticks[0], n_ticks, n_agents, self.columns,
+                                   len(exceptions), n_changes, layer_size)
+        data = _compress(self.codec, header + b"".join(part.tobytes() for part in parts))
+        self.chunks.append([self.file.tell(), self.ticks[0], n_ticks])
+        self.file.write(struct.pack("<I", len(data)) + data)
+        self.ticks = []
+        self.layer_changes = []
+
+    def close(self):
+        """Flush the last chunk and write the footer; the file is unreadable without it."""
+        if self.file is None:
+            return
+        self.flush()
+        footer = json.dumps({"chunks": self.chunks, "agents": self.agents}).encode()
+        offset = self.file.tell()
+        self.file.write(footer + struct.pack("<Q", offset) + MAGIC)
+        self.file.close()
+        self.file = None
+
+
+class TrajectoryReader:
+    """Random access to the frames of a trajectory file (one decoded chunk is cached)."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(4) != MAGIC:
+                raise ValueError(f"{path} is not a trajectory file")
+            (size,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(size))
+            f.seek(-12, os.SEEK_END)
+            (offset,) = struct.unpack("<Q", f.read(8))
+            if f.read(4) != MAGIC:
+                raise ValueError(f"{path} has no footer (recorder not closed?)")
+            f.seek(offset)
+            footer = json.loads(f.read()[:-12])
+        self.path = path
+        self.codec = self.header["codec"]
+        self.columns = self.header["columns"]
+        self.chunks = footer["chunks"]
+        self.agents = footer["agents"]  # slot -> [unique_id, class path]
+        self.starts = np.cumsum([0] + [n for _, _, n in self.chunks])  # First frame index of each chunk
+        self._cached = None  # (chunk, ticks, frames, layer key, layer changes)
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    @property
+    def first_tick(self):
+        return self.chunks[0][1] if self.chunks else None
+
+    def _chunk(self, c):
+        if self._cached is not None and self._cached[0] == c:
+            return self._cached
+        offset = self.chunks[c][0]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            (size,) = struct.unpack("<I", f.read(4))
+            data = _decompress(self.codec, f.read(size))
+        _, n_ticks, n_agents, n_columns, n_exceptions, n_changes, layer_size = CHUNK_HEADER.unpack_from(data)
+        pos = CHUNK_HEADER.size
+
+        def take(dtype, count):
+            nonlocal pos
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=pos)
+            pos += array.nbytes
+            return array
+
+        ticks = take(np.int64, n_ticks)
+        key = take(np.int16, n_agents * n_columns).reshape(n_agents, n_columns)
+        deltas = take(np.int8, (n_ticks - 1) * n_agents * n_columns).astype(np.int32)
+        index = take(np.uint32, n_exceptions)
+        deltas[index] = take(np.int32, n_exceptions)
+        frames = np.empty((n_ticks, n_agents, n_columns), dtype=np.int32)
+        frames[0] = key
+        frames[1:] = deltas.reshape(n_ticks - 1, n_agents, n_columns)
+        frames = np.cumsum(frames, axis=0).astype(np.int16)
+        layer_key = changes = None
+        if self.header["layer"]:
+            layer_key = take(np.uint8, layer_size)
+            changes = (take(np.uint32, n_changes), take(np.uint32, n_changes), take(np.uint8, n_changes))
+        self._cached = (c, ticks, frames, layer_key, changes)
+        return self._cached
+
+    def index(self, tick):
+        """Index of the last frame recorded at or before tick (0 if tick is before the first)."""
+        c = max(bisect.bisect_right([first for _, first, _ in self.chunks], tick) - 1, 0)
+        ticks = self._chunk(c)[1]
+        return int(self.starts[c]) + max(int(np.searchsorted(ticks, tick, side="right")) - 1, 0)
+
+    def frame(self, i):
+        """(tick, slots, values) of frame i: the agents on the grid and their [x, y, attributes...]."""
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        c = int(np.searchsorted(self.starts, i, side="right")) - 1
+        _, ticks, frames, _, _ = self._chunk(c)
+        t = i - int(self.starts[c])
+        frame = frames[t]
+        slots = np.flatnonzero(frame[:, 0] != ABSENT)
+        return int(ticks[t]), slots, frame[slots]
+
+    def layer(self, i):
+        """The grid layer at frame i (flattened), or None if the grid had none."""
+        if not self.header["layer"]:
+            return None
+        c = int(np.searchsorted(self.starts, i, side="right")) - 1
+        _, _, _, key, (when, cells, codes) = self._chunk(c)
+        layer = key.copy()
+        upto = int(np.searchsorted(when, i - int(self.starts[c]), side="right"))
+        layer[cells[:upto]] = codes[:upto]  # In order: later changes overwrite earlier ones
+        return layer
+
+    def bytes_per_agent_tick(self):
+        """File size over (frames x agents on the grid), a measure of the encoding."""
+        present = sum(len(self.frame(i)[1]) for i in range(len(self)))
+        return os.path.getsize(self.path) / max(present, 1)
+
+
+class ReplayModel(mesa.Model):
+    """Plays a trajectory file back as a Mesa model, for CanvasGrid and get_positions.
+
+    Agents are stand-ins of the recorded classes (built without __init__;
+    slots they do not record are None), so the model's agent_portrayal
+    works unchanged. Each step advances speed frames (negative speeds play
+    backwards); seek(tick) jumps anywhere.
+    """
+
+    def __init__(self, path, speed=1, start=None):
+        super().__init__()
+        self.reader = TrajectoryReader(path)
+        header = self.reader.header
+        self.model_class = _load(header["model"])
+        self.speed = speed
+        if header["layer"] and header["factory"]:
+            factory = functools.partial(getattr(self.model_class, header["factory"]), self)
+            self.grid = LayeredMultiGrid(header["width"], header["height"], header["torus"], factory)
+        else:
+            self.grid = MultiGrid(header["width"], header["height"], header["torus"])
+        self.schedule = BaseScheduler(self)
+        self.proxies = [None] * len(self.reader.agents)
+        self.attributes = header["columns"][2:]
+        self.position = None
+        self.step_count = None
+        self.seek(self.reader.first_tick if start is None else start)
+
+    def _proxy(self, slot):
+        agent = self.proxies[slot]
+        if agent is None:
+            unique_id, path = self.reader.agents[slot]
+            cls = _load(path)
+            agent = cls.__new__(cls)
+            for klass in cls.__mro__:
+                for name in getattr(klass, "__slots__", ()):
+                    if not name.startswith("__"):
+                        setattr(agent, name, None)
+            mesa.Agent.__init__(agent, unique_id, self)
+            self.proxies[slot] = agent
+        return agent
+
+    def show(self, i):
+        """Put the agents (and layer) of frame i on the grid."""
+        tick, slots, values = self.reader.frame(i)
+        present = set(slots.tolist())
+        for slot, agent in enumerate(self.proxies):
+            if agent is not None and agent.pos is not None and slot not in present:
+                self.grid.remove_agent(agent)
+                self.schedule.remove(agent)
+        for slot, row in zip(slots.tolist(), values.tolist()):
+            agent = self._proxy(slot)
+            pos = (row[0], row[1])
+            if agent.pos is None:
+                self.grid.place_agent(agent, pos)
+                self.schedule.add(agent)
+            elif agent.pos != pos:
+                self.grid.move_agent(agent, pos)
+            for name, value in zip(self.attributes, row[2:]):
+                setattr(agent, name, value)
+        layer = self.reader.layer(i)
+        if layer is not None:
+            self.grid.layer[:] = layer.reshape(self.grid.layer.shape)
+        self.position = i
+        self.step_count = tick
+
+    def seek(self, tick):
+        self.show(self.reader.index(tick))
+
+    def step(self):
+        i = self.position + self.speed
+        if not 0 <= i < len(self.reader):
+            i = min(max(i, 0), len(self.reader) - 1)
+            self.running = False
+        self.show(i)
+
+    def get_positions(self):
+        """The recorded model's get_positions() for the current frame."""
+        return self.model_class.get_positions(self)
+
+
+def make_replay_server(path, portrayal, speed=1, start=None, title="Replay", port=None, canvas=600):
+    """ModularServer that plays path back with the given agent_portrayal."""
+    from mesa.visualization.modules import CanvasGrid
+    from mesa.visualization.ModularVisualization import ModularServer
+
+    header = TrajectoryReader(path).header
+    grid = CanvasGrid(portrayal, header["width"], header["height"], canvas, canvas)
+    server = ModularServer(ReplayModel, [grid], title, {"path": path, "speed": speed, "start": start})
+    if port is not None:
+        server.port = port
+    return server
+
+
+if __name__ == "__main__":
+    # python trajectory.py run.trj Evidencia1:agent_portrayal [speed]
+    make_replay_server(sys.argv[1], _load(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 1).launch()